@@ -1,11 +1,12 @@
 """
 Скрипт для очистки директории логов.
-Автономный скрипт, который удаляет все файлы в директории logs.
+Автономный скрипт, который удаляет все файлы в директории logs,
+а также ищет логи по индексу, удаляет их по возрасту/размеру и архивирует старые.
 """
 
+import argparse
 import os
-import shutil
-import sys
+from datetime import datetime
 
 def clear_logs(force=False):
     """
@@ -28,13 +29,17 @@ def clear_logs(force=False):
             print(f"Директория логов не существует: {log_dir}")
             return False
         
-        # Получаем список файлов
+        # Получаем список файлов (включая вложенные директории)
         files = []
         for root, dirs, filenames in os.walk(log_dir):
             for filename in filenames:
                 files.append(os.path.join(root, filename))
         
+        from utils.log_index import clear_index
+        
         if not files:
+            # Индекс может ссылаться на уже удаленные файлы
+            clear_index()
             print("В директории логов нет файлов.")
             return True
         
@@ -64,14 +69,11 @@ def clear_logs(force=False):
         
         print(f"\n✅ Удалено файлов: {deleted_count} из {len(files)}")
         
-        # Проверяем, остались ли файлы
-        remaining_files = []
-        for root, dirs, filenames in os.walk(log_dir):
-            for filename in filenames:
-                remaining_files.append(os.path.join(root, filename))
+        # Удаляем из индекса записи удаленных файлов (архивы и оставшиеся файлы сохраняются)
+        clear_index()
         
-        if remaining_files:
-            print(f"⚠️  Осталось файлов: {len(remaining_files)} (возможно, системные или скрытые)")
+        if deleted_count < len(files):
+            print(f"⚠️  Осталось файлов: {len(files) - deleted_count} (возможно, системные или скрытые)")
             return False
         else:
             print("✅ Директория логов полностью очищена.")
@@ -84,26 +86,80 @@ def clear_logs(force=False):
         print(f"❌ Неизвестная ошибка: {e}")
         return False
 
+def query(args):
+    """Выводит логи, найденные по индексу."""
+    from utils.log_index import query_logs
+    
+    rows = query_logs(session_id=args.session, section=args.section, prefix=args.prefix, limit=args.limit)
+    if not rows:
+        print("Логи не найдены.")
+        return
+    
+    for row in rows:
+        created = datetime.fromtimestamp(row['created_at']).strftime('%Y-%m-%d %H:%M:%S')
+        location = f" (в архиве {os.path.basename(row['archive'])})" if row['archive'] else ""
+        print(f"{created}  {row['prefix']:<24} {row['size']:>9} B  "
+              f"{row['session_id'] or '-'} | {row['section'] or '-'}")
+        print(f"    {row['path']}{location}")
+    print(f"\nНайдено: {len(rows)}")
+
 def main():
     """Основная функция скрипта."""
+    parser = argparse.ArgumentParser(description="Очистка, поиск и архивирование логов AIMetodolog")
+    parser.add_argument('-f', '--force', action='store_true',
+                        help="Принудительная очистка без подтверждения")
+    parser.add_argument('--query', action='store_true', help="Найти логи по индексу")
+    parser.add_argument('--session', help="Фильтр по сессии (для --query)")
+    parser.add_argument('--section', help="Фильтр по разделу (для --query)")
+    parser.add_argument('--prefix', help="Фильтр по префиксу лога (для --query)")
+    parser.add_argument('--limit', type=int, default=50, help="Максимум записей (для --query)")
+    parser.add_argument('--prune', action='store_true',
+                        help="Удалить логи по возрасту (--older-than) и/или размеру (--max-size)")
+    parser.add_argument('--compact', action='store_true',
+                        help="Упаковать логи старше --older-than дней в архив tar.gz")
+    parser.add_argument('--older-than', type=float, help="Возраст логов в днях")
+    parser.add_argument('--max-size', type=float, help="Оставить не более N МБ самых свежих логов")
+    parser.add_argument('--reindex', action='store_true',
+                        help="Добавить в индекс логи, записанные без регистрации")
+    args = parser.parse_args()
+    
     print("\n" + "=" * 60)
-    print("ОЧИСТКА ДИРЕКТОРИИ ЛОГОВ")
+    print("УПРАВЛЕНИЕ ЛОГАМИ" if (args.query or args.prune or args.compact or args.reindex)
+          else "ОЧИСТКА ДИРЕКТОРИИ ЛОГОВ")
     print("=" * 60)
     
-    # Проверяем аргументы командной строки
-    force = False
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ['-f', '--force']:
-            force = True
-            print("Режим принудительной очистки (без подтверждения)")
-        elif sys.argv[1] in ['-h', '--help']:
-            print("Использование: python clear_logs.py [опции]")
-            print("Опции:")
-            print("  -f, --force   Принудительная очистка без подтверждения")
-            print("  -h, --help    Показать эту справку")
-            return
+    import config
+    from utils import log_index
+    
+    if args.reindex:
+        added = log_index.reindex(config.LOG_DIR)
+        print(f"✅ Добавлено в индекс: {added}")
+    
+    if args.query:
+        query(args)
+    
+    if args.compact:
+        if args.older_than is None:
+            print("❌ Для --compact укажите --older-than")
+        else:
+            archive_path = log_index.compact_logs(config.LOG_ARCHIVE_DIR, args.older_than)
+            print(f"📦 Архив: {archive_path}" if archive_path else "Нет логов для архивирования.")
+    
+    if args.prune:
+        if args.older_than is None and args.max_size is None:
+            print("❌ Для --prune укажите --older-than и/или --max-size")
+        else:
+            deleted, freed = log_index.prune_logs(args.older_than, args.max_size)
+            print(f"✅ Удалено файлов: {deleted}, освобождено {freed / 1024 / 1024:.2f} МБ")
+    
+    if args.query or args.prune or args.compact or args.reindex:
+        print("=" * 60)
+        return
+    
+    if args.force:
+        print("Режим принудительной очистки (без подтверждения)")
     
-    success = clear_logs(force=force)
+    success = clear_logs(force=args.force)
     
     if success:
         print("\n✅ Очистка завершена успешно.")
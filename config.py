@@ -45,6 +45,22 @@ else:
     else:
         print("   Установите переменную окружения OPENROUTER_API_KEY")
 
+# Пул API ключей: OPENROUTER_API_KEY, OPENROUTER_API_KEY_2 ... OPENROUTER_API_KEY_10
+# и/или список через запятую в OPENROUTER_API_KEYS (имя ключа -> ключ)
+OPENROUTER_API_KEYS = {}
+if OPENROUTER_API_KEY:
+    OPENROUTER_API_KEYS['OPENROUTER_API_KEY'] = OPENROUTER_API_KEY
+for _i in range(2, 11):
+    _key = get_secret(f"OPENROUTER_API_KEY_{_i}")
+    if _key and _key not in OPENROUTER_API_KEYS.values():
+        OPENROUTER_API_KEYS[f"OPENROUTER_API_KEY_{_i}"] = _key
+for _i, _key in enumerate((get_secret("OPENROUTER_API_KEYS") or "").split(','), 1):
+    _key = _key.strip()
+    if _key and _key not in OPENROUTER_API_KEYS.values():
+        OPENROUTER_API_KEYS[f"OPENROUTER_API_KEYS#{_i}"] = _key
+if len(OPENROUTER_API_KEYS) > 1:
+    print(f"🔑 Пул API ключей: {len(OPENROUTER_API_KEYS)} ключей")
+
 # Модель по умолчанию
 #DEFAULT_MODEL = 'google/gemini-2.5-flash-lite'
 #DEFAULT_MODEL = 'meta-llama/llama-3.3-70b-instruct:free'
@@ -57,6 +73,31 @@ AVAILABLE_MODELS = {
     'llama': 'meta-llama/llama-3.3-70b-instruct:free',
 }
 
+# Возможности моделей: структурированный вывод (response_format)
+# 'json_schema' - ответ по JSON-схеме, 'json_object' - любой валидный JSON,
+# None - только текст (JSON извлекается и чинится после ответа)
+MODEL_CAPABILITIES = {
+    'google/gemini-2.5-flash-lite': {'structured_output': 'json_schema'},
+    'tngtech/deepseek-r1t2-chimera:free': {'structured_output': None},
+    'meta-llama/llama-3.3-70b-instruct:free': {'structured_output': 'json_object'},
+}
+
+# Цены моделей в долларах за 1 млн токенов (запрос / ответ)
+MODEL_PRICES = {
+    'google/gemini-2.5-flash-lite': {'prompt': 0.10, 'completion': 0.40},
+    'tngtech/deepseek-r1t2-chimera:free': {'prompt': 0.0, 'completion': 0.0},
+    'meta-llama/llama-3.3-70b-instruct:free': {'prompt': 0.0, 'completion': 0.0},
+}
+
+# Бюджеты расходов в долларах (None - без ограничения)
+BUDGETS = {
+    'session': None,            # На одно занятие
+    'batch': None,              # На один запуск (курс, пакет занятий)
+    'day': 5.0,                 # На день (учитываются все запуски за день)
+    'on_exhausted': 'downgrade',  # 'downgrade' - перейти на бесплатную модель, 'stop' - остановить запросы
+    'fallback_model': 'tngtech/deepseek-r1t2-chimera:free',
+}
+
 # Настройки OpenRouter API
 OPENROUTER_CONFIG = {
     'base_url': 'https://openrouter.ai/api/v1',
@@ -67,6 +108,17 @@ OPENROUTER_CONFIG = {
     }
 }
 
+# Распределение запросов по ключам пула
+KEY_POOL_PARAMS = {
+    'requests_per_minute': 20,      # Лимит запросов в минуту на ключ
+    'requests_per_day': None,       # Лимит запросов в сутки на ключ (None - без лимита)
+    'quarantine_seconds': 60,       # Карантин ключа после ошибки квоты (402/429), удваивается при повторах
+    'max_quarantine_seconds': 900,  # Максимальный карантин
+    'wait_timeout': 120,            # Сколько ждать освобождения квоты ключа (сек.)
+    'tenants': {},                  # Арендатор -> имена ключей, например {'school_a': ['OPENROUTER_API_KEY_2']}
+    'default_tenant': None,         # Арендатор по умолчанию (None - все ключи)
+}
+
 # ============================================================================
 # 2. НАСТРОЙКИ ГЕНЕРАЦИИ
 # ============================================================================
@@ -75,12 +127,22 @@ OPENROUTER_CONFIG = {
 MODES = {
     'full': 'Генерация занятия целиком',
     'sections': 'По разделам 1 уровня',
-    'subsections': 'По подразделам'
+    'subsections': 'По подразделам',
+    'hybrid': 'Группы мелких подразделов одним запросом',
+    'auto': 'Автовыбор режима по прогнозу времени и стоимости'
 }
 
-# Режим по умолчанию
+# Режим по умолчанию ('auto' включается явно)
 DEFAULT_GENERATION_MODE = 'sections'
 
+# Шаблоны промптов: prompts/<специалист>/<имя>.txt (недостающие берутся из prompts/default)
+PROMPT_PARAMS = {
+    'prompts_dir': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompts'),
+    'specialist': 'default',    # Специалист (набор шаблонов)
+    'hot_reload': True,         # Перечитывать измененные файлы шаблонов без перезапуска
+    'reload_interval': 2.0,     # Как часто проверять изменения файлов (сек.)
+}
+
 # Параметры генерации
 GENERATION_PARAMS = {
     'temperature': 0.7,
@@ -88,6 +150,103 @@ GENERATION_PARAMS = {
     'top_p': 0.9,
 }
 
+# Два уровня качества: черновик быстрой моделью сразу, затем фоновое улучшение
+# разделов сильной моделью с заменой в сохраненном ноутбуке
+REFINEMENT_PARAMS = {
+    'enabled': False,
+    'draft_model': AVAILABLE_MODELS['gemini'],  # Быстрая модель черновика
+    'draft_temperature': 0.7,
+    'draft_workers': 4,         # Разделов черновика одновременно
+    'refine_model': DEFAULT_MODEL,  # Сильная модель улучшения (None - без улучшения)
+    'refine_temperature': 0.5,
+    'refine_workers': 2,        # Разделов улучшения одновременно
+}
+
+# Лимиты токенов: продолжение оборванных ответов и адаптивный max_tokens
+TOKEN_LIMIT_PARAMS = {
+    'max_continuations': 2,  # Сколько раз продолжать ответ, оборванный по finish_reason == "length"
+    'adaptive': True,        # Подбирать max_tokens по наблюдаемой длине ответов модели
+    'min_samples': 5,        # Минимум наблюдений для адаптивного лимита
+    'percentile': 0.95,      # Перцентиль длины ответа, берущийся за основу
+    'headroom': 1.25,        # Запас сверх перцентиля
+    'min_tokens': 1000,      # Нижняя граница адаптивного лимита
+    'max_tokens': 16000,     # Верхняя граница адаптивного лимита
+    'window': 50,            # Сколько последних наблюдений хранится на модель и режим
+}
+
+# Автовыбор режима генерации (режим 'auto')
+MODE_OPTIMIZER_PARAMS = {
+    'default_minutes': 45,          # Продолжительность занятия, если ее нет в ответах
+    'tokens_per_minute': 120,       # Токенов материала на минуту занятия
+    'max_call_tokens': 6000,        # Ограничение качества: максимум токенов ответа на один запрос
+    'full_max_targets': 8,          # Ограничение качества: 'full' только для занятий до N подразделов
+    'base_prompt_tokens': 400,      # Токены общих правил промпта раздела
+    'default_overhead': 4.0,        # Накладные расходы на запрос (сек.), пока нет истории
+    'default_tokens_per_sec': 40,   # Скорость генерации (токенов/сек.), пока нет истории
+    'truncation_risk': 0.04,        # Вероятность обрыва или невалидного JSON на 1000 токенов ответа
+    'model_output_limits': {        # Лимиты токенов ответа моделей
+        'google/gemini-2.5-flash-lite': 65000,
+        'tngtech/deepseek-r1t2-chimera:free': 16000,
+        'meta-llama/llama-3.3-70b-instruct:free': 8000,
+    },
+}
+
+# Хеджирование запросов разделов: дубль на другую модель, если основная отвечает дольше обычного
+HEDGING_PARAMS = {
+    'enabled': True,
+    'percentile': 0.9,          # Перцентиль времени ответа модели, после которого отправляется дубль
+    # Задержки меньше таймаута запроса: дубль после таймаута основного запроса бесполезен
+    'default_delay': OPENROUTER_CONFIG['timeout'] * 0.4,  # Задержка перед дублем (сек.), пока нет истории ответов модели
+    'min_delay': 15,            # Минимальная задержка перед дублем (сек.)
+    'max_delay': OPENROUTER_CONFIG['timeout'] * 0.5,      # Максимальная задержка перед дублем (сек.)
+    'alternates': [],           # Модели для дублей по порядку (пусто - AVAILABLE_MODELS)
+    'max_hedge_ratio': 0.25,    # Максимальная доля запросов с дублем
+    'max_extra_cost': 0.50,     # Максимальные доп. расходы на дубли за запуск ($)
+}
+
+# Починка невалидного JSON короткими дозапросами вместо повторной генерации раздела
+REPAIR_PARAMS = {
+    'max_followups': 1,          # Сколько дозапросов "продолжи/исправь JSON" допускается на раздел
+    'continue_max_tokens': 2000, # Лимит токенов для продолжения оборванного JSON
+    'fix_max_tokens': 4000,      # Лимит токенов для исправления синтаксиса JSON
+}
+
+# Проверка ноутбуков выполнением ячеек кода после сборки
+EXECUTION_PARAMS = {
+    'enabled': False,           # Выполнять ли ячейки кода после сборки ноутбука
+    'cell_timeout': 30,         # Тайм-аут на одну ячейку (сек.)
+    'memory_limit_mb': 1024,    # Ограничение памяти процесса-ядра (МБ)
+    'max_workers': os.cpu_count() or 2,  # Сколько ноутбуков выполняется одновременно
+}
+
+# Проверка фактов в сгенерированных разделах (идет параллельно с генерацией)
+FACT_CHECK_PARAMS = {
+    'enabled': False,                       # Проверять ли факты в markdown-ячейках
+    'model': AVAILABLE_MODELS['gemini'],    # Дешевая модель для проверки
+    'max_claims': 8,                        # Максимум утверждений на ячейку
+    'use_corpus': True,                     # Передавать модели связанный фрагмент корпуса (RAG)
+    'corpus_min_score': 5.0,                # Минимальная оценка BM25 связанного фрагмента
+    'corpus_passage_chars': 600,            # Длина фрагмента, передаваемого модели
+    'max_workers': 2,                       # Количество одновременных проверок
+}
+
+# Параметры генерации курса (много занятий за один запуск)
+COURSE_PARAMS = {
+    'default_lessons': 10,      # Количество занятий в плане курса по умолчанию
+    'max_workers': 4,           # Сколько занятий генерируется одновременно
+    'output_format': 'notebooks',  # 'notebooks' - ноутбук на занятие, 'bundle' - общий архив
+}
+
+# Конвейер пакетной генерации (заявки из выгрузки формы): обработчики этапов
+# и размер очередей между ними (медленный этап притормаживает предыдущие)
+PIPELINE_PARAMS = {
+    'queue_size': 8,            # Элементов в очереди перед каждым этапом
+    'structure_workers': 2,     # Одновременных запросов структуры занятий
+    'llm_workers': 4,           # Одновременных запросов разделов к LLM
+    'parse_workers': None,      # Процессов извлечения и починки JSON (None - по числу ядер)
+    'validate_workers': 2,      # Обработчиков проверки (включая дозапросы исправления JSON)
+}
+
 # ============================================================================
 # 3. НАСТРОЙКИ ПУТЕЙ И ФАЙЛОВ
 # ============================================================================
@@ -101,6 +260,9 @@ else:
 
 LOG_DIR = os.path.join(BASE_DIR, 'logs')
 OUTPUT_DIR = os.path.join(BASE_DIR, 'output')
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+LOG_INDEX_FILE = os.path.join(CACHE_DIR, 'log_index.sqlite')
+LOG_ARCHIVE_DIR = os.path.join(BASE_DIR, 'logs_archive')
 PROJECT_DIR = os.path.join(BASE_DIR, 'aimetodolog')
 PROJECT_ROOT = PROJECT_DIR
 PROJECT_NAME = 'aimetodolog'
@@ -113,6 +275,75 @@ else:
 
 VERSION_PREFIX = 'aimetodolog_v'
 
+# Локальный поиск по учебным материалам (RAG)
+RAG_PARAMS = {
+    'enabled': False,                                   # Добавлять ли найденные фрагменты в промпты разделов
+    'materials_dir': os.path.join(BASE_DIR, 'materials'),  # Папка с материалами курса (txt/md/pdf)
+    'index_dir': os.path.join(CACHE_DIR, 'rag_index'),  # Папка индекса
+    'chunk_words': 200,       # Размер фрагмента (слов)
+    'chunk_overlap': 40,      # Перекрытие фрагментов (слов)
+    'top_k': 4,               # Сколько фрагментов искать на раздел
+    'token_budget': 800,      # Бюджет токенов на справочные материалы в промпте
+    'chars_per_token': 3,     # Оценка числа символов на токен
+    'bm25_k1': 1.5,
+    'bm25_b': 0.75,
+    'max_df_ratio': 0.5,      # Более частые термы не учитываются, если в запросе есть более редкие
+}
+
+# Хранилище готовых разделов: повторное использование между сессиями и запусками
+SECTION_STORE_PARAMS = {
+    'enabled': True,
+    'db_file': os.path.join(CACHE_DIR, 'sections.sqlite'),
+}
+
+# Корпус сырых ответов LLM: запись пар запрос/ответ и воспроизведение без сети
+# (регрессионные проверки обработки: python -m llm.response_corpus check)
+CORPUS_PARAMS = {
+    'record': False,            # Дописывать ответы модели в корпус
+    'replay': False,            # Отвечать из корпуса вместо запросов к модели
+    'path': os.path.join(CACHE_DIR, 'responses.corpus'),  # Файл корпуса (индекс - .idx рядом)
+}
+
+# Автоматические выключатели моделей: после серии сбоев (таймаут, соединение, 5xx)
+# запросы к модели сразу идут на резервную, а не ждут таймаут (состояние общее для процессов)
+CIRCUIT_BREAKER_PARAMS = {
+    'enabled': True,
+    'failure_threshold': 3,     # Сбоев подряд до размыкания цепи
+    'open_seconds': 30,         # Пауза до пробного запроса (сек.)
+    'max_open_seconds': 600,    # Максимальная пауза при повторных неудачных пробах (сек.)
+    'probe_timeout': 90,        # Через сколько секунд зависшая проба заменяется новой
+    'reroute': True,            # Направлять запросы на резервную модель
+    'fallbacks': [],            # Резервные модели по порядку (пусто - AVAILABLE_MODELS)
+    'db_file': os.path.join(CACHE_DIR, 'circuit_breakers.sqlite'),
+}
+
+# Профилирование этапов конвейера (также включается ключом --profile)
+PROFILING_PARAMS = {
+    'enabled': False,                 # Замерять время этапов (полное, CPU и ожидание ввода-вывода)
+    'cprofile': False,                # Сохранять профиль cProfile за запуск (.prof)
+    'sampling': False,                # Сохранять семплы стеков для флейм-графа (.folded)
+    'sampling_interval': 0.005,       # Интервал семплирования (сек.)
+    'output_dir': os.path.join(LOG_DIR, 'profiles'),  # Папка файлов профиля
+}
+
+# Экспорт занятий: промежуточный файл .lesson.jsonl записывается один раз,
+# затем экспортируется в выходные форматы (повторно: python -m utils.exporters)
+EXPORT_PARAMS = {
+    'formats': ['ipynb'],       # Форматы: 'ipynb', 'md', 'html' (html оформлен для печати в PDF)
+    'max_workers': None,        # Процессов для экспорта каталога (None - по числу ядер)
+}
+
+# Авторская подпись ноутбуков: невидимый водяной знак и подпись в метаданных
+# (проверка: python -m utils.signing verify output/)
+SIGNING_PARAMS = {
+    'enabled': True,
+    'author': get_secret("AIMETODOLOG_AUTHOR", "AIMetodolog"),  # Автор в подписи и водяном знаке
+    'key': get_secret("AIMETODOLOG_SIGNING_KEY"),  # Ключ HMAC (без ключа - SHA-256 с пометкой integrity_only:
+                                                   # только целостность, авторство не подтверждается)
+    'watermark': True,          # Водяной знак в первой ячейке markdown
+    'max_workers': None,        # Процессов проверки каталога (None - по числу ядер)
+}
+
 # ============================================================================
 # 4. НАСТРОЙКИ ФОРМАТИРОВАНИЯ
 # ============================================================================
@@ -138,6 +369,7 @@ def set_api_key(api_key):
     """Устанавливает API ключ вручную."""
     global OPENROUTER_API_KEY
     OPENROUTER_API_KEY = api_key
+    OPENROUTER_API_KEYS['OPENROUTER_API_KEY'] = api_key
     os.environ['OPENROUTER_API_KEY'] = api_key
     print(f"✅ API ключ установлен вручную ({len(api_key)} символов)")
 
@@ -1,6 +1,17 @@
 # Обновите aimetodolog/core/__init__.py
 
+from . import cell
+from . import answers
 from . import session_manager
+from . import prompt_registry
+from . import section_store
 from . import prompt_factory
+from . import mode_optimizer
+from . import lesson_generator
+from . import course_manager
+from . import fact_checker
+from . import async_api
+from . import pipeline
+from . import refinement
 
-__all__ = ['session_manager', 'prompt_factory']
+__all__ = ['cell', 'answers', 'session_manager', 'prompt_registry', 'section_store', 'prompt_factory', 'mode_optimizer', 'lesson_generator', 'course_manager', 'fact_checker', 'async_api', 'pipeline', 'refinement']
@@ -0,0 +1,285 @@
+"""
+Ответы преподавателя о занятии: типизированная модель, нормализация
+к спискам вариантов и загрузка заявок пачкой из выгрузок форм (CSV, XLSX).
+
+Ответы передаются в промпты компактным блоком "Поле: значение" вместо
+текста вопросов и ответов диалога.
+"""
+
+import csv
+import difflib
+import os
+import re
+from dataclasses import asdict, dataclass
+
+# Поля ответов: вопрос диалога, подпись в контексте, варианты ответа
+# (первый вариант или default - ответ по умолчанию в диалоге)
+ANSWER_FIELDS = {
+    'topic': {
+        'question': "Какая у Вас будет основная тема занятия?",
+        'label': "Тема",
+        'options': (),
+        'default': "Общая тема: Физика; тема занятия: Закон Архимеда",
+    },
+    'level': {
+        'question': "Какой у Вас уровень подготовки?",
+        'label': "Уровень",
+        'options': ("начинающий", "средний", "продвинутый", "начальный (5-7 класс)",
+                    "средний (8-9 класс)", "продвинутый (10-11 класс)", "университетский"),
+    },
+    'duration': {
+        'question': "Какая предполагается продолжительность занятия?",
+        'label': "Продолжительность",
+        'options': ("15 минут", "45 минут", "1 час", "2 часа"),
+    },
+    'prior_knowledge': {
+        'question': "Какими предварительными знаниями и навыками обладают обучаемые в данной теме?",
+        'label': "Предварительные знания",
+        'options': ("никакими", "начальными", "работаю в данной сфере", "являюсь специалистом"),
+    },
+    'goal': {
+        'question': "С какой целью хотите изучить занятие?",
+        'label': "Цель",
+        'options': ("урок в школе", "занятие факультатива", "лекция на курсе",
+                    "для самостоятельного самообразования", "для профессиональной подготовки",
+                    "для совершенствования в профессии"),
+    },
+    'wishes': {
+        'question': "Укажите дополнительные пожелания к занятию:",
+        'label': "Пожелания",
+        'options': (),
+    },
+}
+
+# Распознавание столбцов выгрузки: ключевые слова заголовка по полям.
+# Порядок важен: вопрос о знаниях содержит слово "теме", поэтому тема проверяется последней
+_HEADER_KEYWORDS = (
+    ('prior_knowledge', ('prior_knowledge', 'знани')),
+    ('level', ('level', 'уровень', 'уровн')),
+    ('duration', ('duration', 'продолжительн', 'длительн')),
+    ('goal', ('goal', 'цель', 'целью')),
+    ('wishes', ('wishes', 'пожелан')),
+    ('topic', ('topic', 'тема', 'теме')),
+)
+
+# Номер класса -> вариант уровня
+_GRADE_LEVELS = ((range(5, 8), "начальный (5-7 класс)"), (range(8, 10), "средний (8-9 класс)"),
+                 (range(10, 12), "продвинутый (10-11 класс)"))
+
+_GRADE_RE = re.compile(r'(\d{1,2})\s*(?:-?\s*(?:й|ый|ой))?\s*класс', re.IGNORECASE)
+_HOURS_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*(?:час|ч\b|h\b)', re.IGNORECASE)
+_MINUTES_RE = re.compile(r'(\d+)')
+
+
+def default_answer(name):
+    """Ответ по умолчанию для поля (default или первый вариант)."""
+    field = ANSWER_FIELDS[name]
+    return field.get('default') or (field['options'][0] if field['options'] else "")
+
+
+def normalize_option(value, options):
+    """
+    Приводит ответ к варианту из списка.
+
+    Сравнение без учета регистра; затем однозначное начало варианта;
+    затем вариант, слова которого начинаются со всех слов ответа
+    ("проф подготовка" -> "для профессиональной подготовки"); затем
+    ближайший вариант при опечатках.
+
+    Args:
+        value: Ответ
+        options: Варианты ответа
+
+    Returns:
+        tuple: (вариант или исходный ответ, найден ли вариант)
+    """
+    text = ' '.join(str(value or '').split())
+    if not options or not text:
+        return text, not options
+
+    lowered = text.lower()
+    by_lower = {option.lower(): option for option in options}
+    if lowered in by_lower:
+        return by_lower[lowered], True
+
+    prefixed = [option for option in options if option.lower().startswith(lowered)]
+    if len(prefixed) == 1:
+        return prefixed[0], True
+
+    words = [word[:max(3, len(word) - 2)] for word in re.findall(r'\w+', lowered)]
+    by_words = [option for option in options
+                if all(any(part.startswith(word) for part in option.lower().split()) for word in words)]
+    if words and len(by_words) == 1:
+        return by_words[0], True
+
+    close = difflib.get_close_matches(lowered, by_lower, n=1, cutoff=0.8)
+    if close:
+        return by_lower[close[0]], True
+    return text, False
+
+
+def parse_minutes(value):
+    """
+    Продолжительность в минутах из ответа ("45 минут", "1 час", "1,5 ч", "90").
+
+    Returns:
+        int: Минуты или None, если число не найдено
+    """
+    text = str(value or '')
+    minutes = 0.0
+    hours = _HOURS_RE.search(text)
+    if hours:
+        minutes += float(hours.group(1).replace(',', '.')) * 60
+        text = text[hours.end():]
+    extra = _MINUTES_RE.search(text)
+    if extra:
+        minutes += int(extra.group(1))
+    return int(minutes) if minutes > 0 else None
+
+
+@dataclass
+class LessonAnswers:
+    """
+    Ответы преподавателя о занятии.
+    """
+
+    topic: str
+    level: str = ""
+    duration_minutes: int = None
+    prior_knowledge: str = ""
+    goal: str = ""
+    wishes: str = ""
+
+    @classmethod
+    def parse(cls, values):
+        """
+        Создает ответы из словаря, проверяет и нормализует их.
+
+        Args:
+            values: Словарь {поле: ответ} (поля ANSWER_FIELDS; продолжительность - текстом или числом)
+
+        Returns:
+            tuple: (LessonAnswers или None, если нет темы; список замечаний)
+        """
+        problems = []
+        topic = ' '.join(str(values.get('topic') or '').split())
+        if not topic:
+            return None, ["не указана тема занятия"]
+
+        fields = {}
+        for name in ('level', 'prior_knowledge', 'goal'):
+            value, matched = normalize_option(values.get(name), ANSWER_FIELDS[name]['options'])
+            if name == 'level' and not matched:
+                grade = _GRADE_RE.search(value)
+                if grade:
+                    number = int(grade.group(1))
+                    value, matched = next(((level, True) for grades, level in _GRADE_LEVELS
+                                           if number in grades), (value, False))
+            if value and not matched:
+                problems.append(f"{ANSWER_FIELDS[name]['label']}: '{value}' нет в списке вариантов")
+            fields[name] = value
+
+        duration = values.get('duration')
+        minutes = duration if isinstance(duration, int) else parse_minutes(duration)
+        if duration and minutes is None:
+            problems.append(f"Продолжительность: не удалось распознать '{duration}'")
+
+        wishes = ' '.join(str(values.get('wishes') or '').split())
+        return cls(topic=topic, duration_minutes=minutes, wishes=wishes, **fields), problems
+
+    @property
+    def duration_text(self):
+        """Продолжительность для текста промпта."""
+        if not self.duration_minutes:
+            return ""
+        hours, minutes = divmod(self.duration_minutes, 60)
+        if hours and minutes:
+            return f"{hours} ч {minutes} мин"
+        return f"{hours} ч" if hours else f"{minutes} мин"
+
+    def to_context(self):
+        """
+        Компактный блок ответов для промптов (пустые поля опускаются).
+
+        Returns:
+            str: Строки "Поле: значение"
+        """
+        values = {
+            'topic': self.topic, 'level': self.level, 'duration': self.duration_text,
+            'prior_knowledge': self.prior_knowledge, 'goal': self.goal, 'wishes': self.wishes,
+        }
+        return '\n'.join(f"{ANSWER_FIELDS[name]['label']}: {value}"
+                         for name, value in values.items() if value)
+
+    def to_dict(self):
+        """Словарь полей (для сохранения сессии)."""
+        return asdict(self)
+
+
+def match_columns(headers):
+    """
+    Сопоставляет столбцы выгрузки полям ответов по заголовкам
+    (имена полей, короткие подписи или полный текст вопросов формы).
+
+    Args:
+        headers: Заголовки столбцов
+
+    Returns:
+        dict: Поле -> заголовок столбца
+    """
+    columns = {}
+    for header in headers:
+        lowered = (header or '').strip().lower()
+        for name, keywords in _HEADER_KEYWORDS:
+            if name not in columns and any(keyword in lowered for keyword in keywords):
+                columns[name] = header
+                break
+    return columns
+
+
+def _read_rows(path):
+    """Строки выгрузки как словари {заголовок: значение}."""
+    if path.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportError("Для чтения .xlsx установите openpyxl или сохраните выгрузку в CSV")
+        sheet = load_workbook(path, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        headers = [str(header or '') for header in next(rows, ())]
+        return [dict(zip(headers, row)) for row in rows]
+
+    # utf-8-sig убирает BOM выгрузок Excel; разделитель определяется по первой строке
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        sample = f.readline()
+        f.seek(0)
+        delimiter = max(';,\t', key=sample.count)
+        return list(csv.DictReader(f, delimiter=delimiter))
+
+
+def load_answers(path):
+    """
+    Загружает заявки преподавателей из выгрузки формы (CSV/TSV или XLSX).
+
+    Args:
+        path: Путь к файлу выгрузки
+
+    Returns:
+        tuple: (список LessonAnswers, список замечаний с номерами строк)
+    """
+    rows = _read_rows(path)
+    columns = match_columns(rows[0].keys() if rows else [])
+    if 'topic' not in columns:
+        return [], [f"{os.path.basename(path)}: нет столбца с темой занятия"]
+
+    answers = []
+    problems = []
+    for line, row in enumerate(rows, 2):
+        values = {name: row.get(header) for name, header in columns.items()}
+        if not any(values.values()):
+            continue
+        parsed, row_problems = LessonAnswers.parse(values)
+        problems.extend(f"строка {line}: {problem}" for problem in row_problems)
+        if parsed is not None:
+            answers.append(parsed)
+    return answers, problems
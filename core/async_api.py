@@ -0,0 +1,295 @@
+"""
+Асинхронный API генерации занятия для Jupyter/Colab.
+
+Запросы к LLM выполняются в рабочих потоках, поэтому ядро ноутбука остается
+отзывчивым: в работающем цикле событий можно вызвать
+``await generate_lesson(spec)`` или запустить генерацию задачей
+``asyncio.ensure_future(...)`` и продолжать работу. Прогресс показывается
+виджетами по разделам, готовые ячейки выводятся в ноутбук по мере генерации,
+генерацию можно отменить кнопкой или методом ``task.cancel()``.
+
+Фоновая задача продолжает работать, когда выполняются уже другие ячейки,
+поэтому вывод идет в виджет Output, созданный в ячейке запуска: иначе
+виджеты и ячейки занятия появлялись бы под той ячейкой, что выполняется сейчас.
+"""
+
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from core.answers import ANSWER_FIELDS, LessonAnswers
+from core.lesson_generator import generate_structure, generate_section, get_generation_targets
+from core.mode_optimizer import resolve_auto_mode
+from core.prompt_factory import PromptFactory
+from core.session_manager import SessionManager
+from utils.log_index import log_context
+from utils.exporters import export_lesson
+from utils.lesson_format import LESSON_EXTENSION, save_lesson
+
+
+def format_answers(answers):
+    """
+    Формирует текст диалога из ответов в том же виде, что и консольный диалог.
+
+    Args:
+        answers: Словарь {вопрос: ответ} или список пар (вопрос, ответ)
+
+    Returns:
+        str: История диалога
+    """
+    items = answers.items() if isinstance(answers, dict) else answers
+    return ''.join(f"Вопрос {i}: {question}\n\nОтвет: {answer}\n\n"
+                   for i, (question, answer) in enumerate(items, 1))
+
+
+def create_output(enabled=True):
+    """
+    Создает и показывает в текущей ячейке область вывода для фоновой генерации.
+
+    Returns:
+        ipywidgets.Output или None, если виджеты недоступны
+    """
+    if not enabled:
+        return None
+    try:
+        import ipywidgets
+        from IPython.display import display
+    except ImportError:
+        return None
+    output = ipywidgets.Output()
+    display(output)
+    return output
+
+
+class SectionProgress:
+    """
+    Индикатор прогресса по разделам: виджеты ipywidgets или вывод в консоль.
+    """
+
+    STATUS_ICONS = {'wait': '⏳', 'run': '🔨', 'done': '✅', 'error': '❌', 'cancel': '⛔'}
+
+    def __init__(self, targets, on_cancel=None, enabled=True, output=None):
+        """
+        Создает индикатор.
+
+        Args:
+            targets: Список разделов
+            on_cancel: Функция, вызываемая кнопкой отмены
+            enabled: Показывать ли виджеты (иначе только печать)
+            output: Область вывода ячейки запуска (ipywidgets.Output);
+                без нее виджеты не показываются
+        """
+        self.targets = [target or "ВЕСЬ УРОК" for target in targets]
+        self.widgets = None
+
+        if not enabled or output is None:
+            return
+        import ipywidgets
+        from IPython.display import display
+
+        self.bar = ipywidgets.IntProgress(value=0, min=0, max=len(self.targets),
+                                          description='Разделы:')
+        self.labels = [ipywidgets.HTML(f"{self.STATUS_ICONS['wait']} {target}") for target in self.targets]
+        self.cancel_button = ipywidgets.Button(description='Отменить', button_style='danger', icon='stop')
+        if on_cancel is not None:
+            self.cancel_button.on_click(lambda _: on_cancel())
+        self.widgets = ipywidgets.VBox([ipywidgets.HBox([self.bar, self.cancel_button])] + self.labels)
+        with output:
+            display(self.widgets)
+
+    def update(self, index, status, details=""):
+        """
+        Обновляет состояние раздела.
+
+        Args:
+            index: Номер раздела (с 0)
+            status: 'wait', 'run', 'done', 'error' или 'cancel'
+            details: Дополнительный текст
+        """
+        text = f"{self.STATUS_ICONS[status]} {self.targets[index]}"
+        if details:
+            text += f" — {details}"
+
+        if self.widgets is None:
+            print(f"   {text}")
+            return
+
+        self.labels[index].value = text
+        if status in ('done', 'error'):
+            self.bar.value += 1
+
+    def close(self, status='done'):
+        """Блокирует кнопку отмены по завершении генерации."""
+        if self.widgets is not None:
+            self.cancel_button.disabled = True
+            self.bar.bar_style = 'success' if status == 'done' else 'danger'
+
+
+def _discard_cells(session, position):
+    """Удаляет из сессии ячейки начиная с позиции и пересчитывает счетчики типов."""
+    del session.cells[position:]
+    session.cell_type_counts = {}
+    for cell in session.cells:
+        session.cell_type_counts[cell.cell_type] = session.cell_type_counts.get(cell.cell_type, 0) + 1
+
+
+def render_cells(cells, output):
+    """
+    Выводит ячейки в область вывода: markdown как текст, код с подсветкой.
+
+    Args:
+        cells: Список объектов Cell
+        output: Область вывода ячейки запуска (ipywidgets.Output или None)
+    """
+    if output is None:
+        return
+    from IPython.display import Code, Markdown, display
+
+    with output:
+        for cell in cells:
+            if cell.cell_type == 'markdown':
+                display(Markdown(cell.source))
+            elif cell.cell_type == 'code':
+                display(Code(cell.source, language='python'))
+
+
+async def generate_lesson(spec, model=None, cache=None, retriever=None, progress=True, render=True,
+                          output=None, on_cancel=None):
+    """
+    Асинхронно генерирует занятие без блокировки ядра ноутбука.
+
+    Args:
+        spec: Параметры занятия (словарь):
+            answers - ответы: LessonAnswers, словарь {поле: ответ} с полями ANSWER_FIELDS
+                или {вопрос: ответ}; либо dialog - готовый текст диалога;
+            structure - готовая структура (опционально, иначе генерируется);
+            mode - режим генерации (по умолчанию из конфига);
+            title - тема занятия; filename - имя итоговых файлов занятия (опционально,
+                экспортируются в форматы из EXPORT_PARAMS)
+        model: Имя модели (если None, берется из конфига)
+        cache: Общий кэш ответов LLM (опционально)
+        retriever: Поиск по локальным материалам (опционально)
+        progress: Показывать виджеты прогресса
+        render: Выводить ячейки в ноутбук по мере генерации
+        output: Область вывода (ipywidgets.Output); по умолчанию создается
+            в текущей ячейке
+        on_cancel: Функция, которой при отмене передается сессия с уже
+            готовыми разделами
+
+    Returns:
+        SessionManager: Сессия с ячейками
+
+    Raises:
+        asyncio.CancelledError: генерация отменена
+    """
+    model = model or config.DEFAULT_MODEL
+    if output is None:
+        output = create_output(progress or render)
+    session = SessionManager(generation_mode=spec.get('mode') or config.DEFAULT_GENERATION_MODE)
+    session.lesson_title = spec.get('title', "")
+
+    answers = spec.get('answers') or {}
+    if isinstance(answers, dict) and answers and set(answers) <= set(ANSWER_FIELDS):
+        answers, problems = LessonAnswers.parse(answers)
+        for problem in problems:
+            print(f"⚠️  {problem}")
+    if isinstance(answers, LessonAnswers):
+        session.answers = answers
+        session.lesson_title = session.lesson_title or answers.topic
+        session.summarized_dialog = spec.get('dialog') or answers.to_context()
+    else:
+        session.summarized_dialog = spec.get('dialog') or format_answers(answers or {})
+
+    # Отдельный поток на занятие: запросы идут последовательно, цикл событий свободен
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    def run_in_thread(func, *args):
+        """Запускает функцию в потоке занятия с текущими сессией и разделом логов."""
+        context = contextvars.copy_context()
+        return executor.submit(context.run, func, *args)
+
+    indicator = None
+    index = 0
+    position = 0
+    pending = None
+    try:
+        # Структура: готовая из параметров или сгенерированная в рабочем потоке
+        if spec.get('structure'):
+            session.lesson_structure = spec['structure']
+        else:
+            print("🧠 Генерация структуры занятия...")
+            pending = run_in_thread(generate_structure, session, model, cache)
+            _, structure_time = await asyncio.wrap_future(pending)
+            print(f"✅ Структура сгенерирована за {structure_time:.2f} сек.")
+
+        pending = run_in_thread(resolve_auto_mode, session, model)
+        await asyncio.wrap_future(pending)
+        targets = get_generation_targets(session)
+        factory = PromptFactory(session, retriever=retriever)
+        session.clear_cells()
+
+        task = asyncio.current_task()
+        indicator = SectionProgress(targets, on_cancel=task.cancel if task else None, enabled=progress,
+                                    output=output)
+
+        for index, target in enumerate(targets):
+            indicator.update(index, 'run')
+            position = len(session.cells)
+
+            with log_context(session_id=session.session_id, section=target or "ВЕСЬ УРОК"):
+                pending = run_in_thread(generate_section, session, factory, target, index + 1, model, cache)
+            cell_types = await asyncio.wrap_future(pending)
+
+            new_cells = session.cells[position:]
+            if cell_types:
+                indicator.update(index, 'done', f"{len(new_cells)} ячеек")
+            else:
+                indicator.update(index, 'error', "нет ячеек")
+            if render:
+                render_cells(new_cells, output)
+
+    except asyncio.CancelledError:
+        # Идущий запрос к LLM дорабатывает в своем потоке; добавленные им
+        # ячейки удаляются, чтобы сессия содержала только готовые разделы
+        if pending is not None and not pending.done():
+            pending.add_done_callback(lambda _: _discard_cells(session, position))
+        if indicator is not None:
+            indicator.update(index, 'cancel', "отменено")
+            indicator.close('cancel')
+        print(f"⛔ Генерация отменена, готово разделов: {index}")
+        if on_cancel is not None:
+            on_cancel(session)
+        raise
+
+    finally:
+        executor.shutdown(wait=False)
+
+    indicator.close()
+
+    filename = spec.get('filename')
+    if filename and session.cells:
+        lesson_path = os.path.join(session.output_dir, f"{filename}{LESSON_EXTENSION}")
+        await asyncio.to_thread(save_lesson, session, lesson_path, model)
+        await asyncio.to_thread(export_lesson, lesson_path)
+    return session
+
+
+def start_lesson(spec, **kwargs):
+    """
+    Запускает генерацию фоновой задачей в текущем цикле событий.
+
+    Пример в ноутбуке:
+        partial = []
+        task = start_lesson({'answers': {...}, 'filename': 'lesson'}, on_cancel=partial.append)
+        ...
+        session = await task   # или task.cancel(), готовые разделы - partial[0]
+
+    Returns:
+        asyncio.Task: Задача генерации
+    """
+    # Область вывода создается сейчас, пока выполняется ячейка запуска
+    if kwargs.get('output') is None:
+        kwargs['output'] = create_output(kwargs.get('progress', True) or kwargs.get('render', True))
+    return asyncio.ensure_future(generate_lesson(spec, **kwargs))
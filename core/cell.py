@@ -0,0 +1,93 @@
+"""
+Компактное представление ячейки ноутбука в памяти.
+"""
+
+import sys
+
+# Допустимые типы ячеек nbformat v4 (интернированные строки)
+CELL_TYPES = tuple(sys.intern(t) for t in ('markdown', 'code', 'raw'))
+
+
+class Cell:
+    """
+    Ячейка ноутбука с минимальным расходом памяти.
+
+    Вместо словаря с полем source в виде списка мелких строк хранит
+    интернированный тип ячейки и единый буфер исходного текста.
+    Преобразование в словарь nbformat выполняется только при сохранении.
+    """
+
+    __slots__ = ('cell_type', 'source', 'metadata', 'execution_count', 'outputs')
+
+    def __init__(self, cell_type='markdown', source='', metadata=None,
+                 execution_count=None, outputs=None):
+        """
+        Инициализация ячейки.
+
+        Args:
+            cell_type: Тип ячейки (markdown/code/raw)
+            source: Исходный текст (строка или список строк)
+            metadata: Метаданные ячейки (None, если пусты)
+            execution_count: Номер выполнения (только для code)
+            outputs: Выводы ячейки (только для code)
+        """
+        self.cell_type = sys.intern(str(cell_type))
+        self.source = source if isinstance(source, str) else ''.join(map(str, source))
+        self.metadata = metadata or None
+        self.execution_count = execution_count
+        self.outputs = outputs or None
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Создает ячейку из словаря, полученного от LLM.
+
+        Args:
+            data: Словарь ячейки в формате nbformat
+
+        Returns:
+            Cell: Компактная ячейка
+        """
+        if isinstance(data, cls):
+            return data
+        return cls(
+            cell_type=data.get('cell_type', 'markdown'),
+            source=data.get('source', ''),
+            metadata=data.get('metadata'),
+            execution_count=data.get('execution_count'),
+            outputs=data.get('outputs'),
+        )
+
+    def to_dict(self):
+        """
+        Преобразует ячейку в словарь nbformat v4.
+
+        Returns:
+            dict: Ячейка с source в виде списка строк
+        """
+        cell = {
+            "cell_type": self.cell_type,
+            "metadata": dict(self.metadata) if self.metadata else {},
+            "source": self.source.splitlines(keepends=True),
+        }
+        if self.cell_type == 'code':
+            cell["execution_count"] = self.execution_count
+            cell["outputs"] = list(self.outputs) if self.outputs else []
+        return cell
+
+    def __repr__(self):
+        preview = self.source[:40].replace('\n', ' ')
+        return f"Cell({self.cell_type!r}, {preview!r})"
+
+
+def cells_to_dicts(cells):
+    """
+    Преобразует список ячеек (Cell или словарей) в словари nbformat.
+
+    Args:
+        cells: Список ячеек
+
+    Returns:
+        list: Список словарей ячеек
+    """
+    return [cell.to_dict() if isinstance(cell, Cell) else cell for cell in cells]
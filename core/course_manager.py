@@ -0,0 +1,291 @@
+"""
+Менеджер курса: генерация плана курса и параллельная генерация занятий.
+"""
+
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from core.session_manager import SessionManager
+from core.lesson_generator import generate_structure, generate_lesson_content
+from core.fact_checker import FactChecker
+from core.section_store import get_section_store
+from llm.client import get_llm_response
+from llm.key_pool import current_tenant, tenant_context
+from llm.ledger import get_ledger
+from llm.response_cache import ResponseCache
+from utils.helpers import log_to_file
+from utils.exporters import export_catalog
+from utils.lesson_format import LESSON_EXTENSION, save_lesson
+from utils.notebook_builder import build_notebook
+from utils.structure_parser import parse_course_outline
+
+# Промпт для генерации плана курса
+COURSE_OUTLINE_SYSTEM_PROMPT = """Ты опытный методист и создатель учебных курсов.
+Ты должен проанализировать ответы пользователя и составить план курса из отдельных занятий.
+Выведи план в формате:
+1. [тема занятия]
+2. [тема занятия]
+3. [тема занятия]
+
+Не добавляй никаких дополнительных пояснений, только список занятий."""
+
+
+class CourseManager:
+    """
+    Управляет генерацией курса: план курса и набор сессий занятий.
+
+    Все занятия используют общий контекст курса (одинаковый префикс промпта),
+    общий пул клиентов LLM и общий кэш ответов.
+    """
+
+    def __init__(self, course_dialog, generation_mode=None, model=None,
+                 max_workers=None, cache=None, retriever=None, tenant=None):
+        """
+        Инициализация менеджера курса.
+
+        Args:
+            course_dialog: Форматированный диалог с описанием курса
+            generation_mode: Режим генерации занятий (full/sections/subsections)
+            model: Имя модели (если None, берется из конфига)
+            max_workers: Сколько занятий генерировать одновременно
+            cache: Общий кэш ответов LLM (если None, создается новый)
+            retriever: Общий поиск по локальным материалам (опционально)
+            tenant: Арендатор, ключи которого используются для запросов (опционально)
+        """
+        import config
+
+        self.course_dialog = course_dialog
+        self.generation_mode = generation_mode or config.DEFAULT_GENERATION_MODE
+        self.model = model or config.DEFAULT_MODEL
+        self.max_workers = max_workers or config.COURSE_PARAMS['max_workers']
+        self.cache = cache if cache is not None else ResponseCache()
+        self.retriever = retriever
+        # Арендатор фиксируется при создании: потоки занятий не наследуют контекст вызывающего
+        self.tenant = tenant or current_tenant()
+
+        self.course_outline = ""
+        self.lesson_titles = []
+        self.lessons = []
+
+        self.output_dir = config.OUTPUT_DIR
+        self.created_at = datetime.now()
+        self.course_id = f"course_{self.created_at.strftime('%Y%m%d_%H%M%S')}"
+
+    @property
+    def course_context(self):
+        """Общий контекст курса: одинаков для всех занятий."""
+        return f"{self.course_dialog.strip()}\n\nПЛАН КУРСА:\n{self.course_outline.strip()}"
+
+    def generate_outline(self, lessons_count=None):
+        """
+        Генерирует план курса (список тем занятий).
+
+        Args:
+            lessons_count: Желаемое количество занятий
+
+        Returns:
+            list: Список тем занятий
+        """
+        import config
+
+        lessons_count = lessons_count or config.COURSE_PARAMS['default_lessons']
+
+        messages = [
+            {"role": "system", "content": COURSE_OUTLINE_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Ответы пользователя: {self.course_dialog}\n\n"
+                                        f"Составь план курса из {lessons_count} занятий."}
+        ]
+
+        print(f"🧠 Генерация плана курса ({lessons_count} занятий)...")
+        with tenant_context(self.tenant):
+            outline, outline_time, _ = get_llm_response(
+                messages=messages,
+                model=self.model,
+                max_tokens=2000,
+                cache=self.cache,
+                kind='course_outline'
+            )
+
+        self.course_outline = outline
+        self.lesson_titles = parse_course_outline(outline)[:lessons_count]
+        log_to_file(outline, f"{self.course_id}_outline")
+
+        print(f"✅ План курса сгенерирован за {outline_time:.2f} сек.: {len(self.lesson_titles)} занятий")
+        return self.lesson_titles
+
+    def _build_lesson(self, index, title):
+        """
+        Генерирует одно занятие курса в отдельной сессии.
+
+        Args:
+            index: Номер занятия (с 1)
+            title: Тема занятия
+
+        Returns:
+            SessionManager: Сессия с готовыми ячейками
+        """
+        import config
+
+        session = SessionManager(
+            generation_mode=self.generation_mode,
+            course_context=self.course_context,
+            log_prefix=f"{self.course_id}_lesson_{index}_"
+        )
+        session.session_id = f"{self.course_id}_lesson_{index}"
+        session.lesson_title = title
+        session.summarized_dialog = f"Занятие {index} из {len(self.lesson_titles)}: {title}"
+
+        # Проверка фактов параллельно с генерацией разделов (если включена в конфиге)
+        fact_checker = None
+        if config.FACT_CHECK_PARAMS['enabled']:
+            fact_checker = FactChecker(retriever=self.retriever)
+
+        with tenant_context(self.tenant):
+            generate_structure(session, model=self.model, cache=self.cache)
+            generate_lesson_content(session, model=self.model, cache=self.cache, retriever=self.retriever,
+                                    fact_checker=fact_checker)
+            if fact_checker is not None:
+                flagged = fact_checker.collect(session)
+                if flagged:
+                    print(f"🔍 Занятие {index}: ячеек с сомнительными утверждениями: {flagged}")
+        return session
+
+    def generate_lessons(self):
+        """
+        Генерирует все занятия курса с ограниченной параллельностью.
+
+        Returns:
+            list: Сессии занятий в порядке плана курса (None для неудавшихся)
+        """
+        if not self.lesson_titles:
+            raise ValueError("План курса пуст. Сначала вызовите generate_outline().")
+
+        total = len(self.lesson_titles)
+        results = [None] * total
+        print(f"🚀 Генерация {total} занятий (одновременно: {self.max_workers})")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._build_lesson, i, title): i
+                for i, title in enumerate(self.lesson_titles, 1)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index - 1] = future.result()
+                    print(f"✅ Занятие {index}/{total} готово: {self.lesson_titles[index - 1]}")
+                except Exception as e:
+                    print(f"❌ Ошибка генерации занятия {index}: {e}")
+
+        self.lessons = results
+        print(f"📦 Кэш ответов: попаданий {self.cache.hits}, промахов {self.cache.misses}")
+        store = get_section_store()
+        if store is not None:
+            print(f"♻️  Хранилище разделов: взято готовых {store.hits}, сгенерировано {store.misses}")
+        get_ledger().print_report()
+        return results
+
+    def _lesson_stem(self, index):
+        """Имя файлов занятия без расширения."""
+        return f"{self.course_id}_lesson_{index:02d}"
+
+    def _lesson_filename(self, index):
+        """Имя файла ноутбука для занятия."""
+        return f"{self._lesson_stem(index)}.ipynb"
+
+    def save_lessons(self, output_dir=None):
+        """
+        Сохраняет занятия в промежуточном формате (.lesson.jsonl).
+
+        Returns:
+            list: Пути к файлам занятий
+        """
+        output_dir = output_dir or os.path.join(self.output_dir, self.course_id)
+        paths = []
+
+        for index, session in enumerate(self.lessons, 1):
+            if session is None or not session.cells:
+                print(f"⚠️  Занятие {index} пропущено: нет ячеек")
+                continue
+            path = os.path.join(output_dir, f"{self._lesson_stem(index)}{LESSON_EXTENSION}")
+            paths.append(save_lesson(session, path, model=self.model))
+        return paths
+
+    def save_notebooks(self, output_dir=None, formats=None):
+        """
+        Сохраняет занятия в промежуточном формате и параллельно экспортирует
+        их в ноутбуки и другие форматы из конфигурации.
+
+        Args:
+            output_dir: Папка курса (по умолчанию output/<course_id>)
+            formats: Форматы экспорта (по умолчанию из конфига)
+
+        Returns:
+            list: Пути к экспортированным файлам
+        """
+        output_dir = output_dir or os.path.join(self.output_dir, self.course_id)
+        lesson_paths = self.save_lessons(output_dir)
+        results = export_catalog(lesson_paths, formats, output_dir)
+        paths = sorted(path for path in results.values() if path)
+
+        print(f"💾 Сохранено файлов: {len(paths)} в {output_dir}")
+        return paths
+
+    def save_bundle(self, filename=None):
+        """
+        Сохраняет курс одним архивом: ноутбуки занятий и манифест course.json.
+
+        Returns:
+            str: Путь к архиву или None при ошибке
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        filepath = os.path.join(self.output_dir, filename or f"{self.course_id}.zip")
+
+        manifest = {
+            "course_id": self.course_id,
+            "created_at": self.created_at.isoformat(),
+            "generation_mode": self.generation_mode,
+            "model": self.model,
+            "outline": self.course_outline,
+            "lessons": []
+        }
+
+        try:
+            with zipfile.ZipFile(filepath, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+                for index, session in enumerate(self.lessons, 1):
+                    if session is None or not session.cells:
+                        continue
+                    notebook_name = self._lesson_filename(index)
+                    notebook = build_notebook(session.cells)
+                    bundle.writestr(notebook_name, json.dumps(notebook, ensure_ascii=False))
+                    manifest["lessons"].append({
+                        "index": index,
+                        "title": session.lesson_title,
+                        "notebook": notebook_name,
+                        "cells_count": len(session.cells)
+                    })
+                bundle.writestr("course.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+
+            print(f"📦 Архив курса сохранен: {filepath}")
+            return filepath
+
+        except Exception as e:
+            print(f"❌ Ошибка сохранения архива курса: {e}")
+            return None
+
+    def save(self, output_format=None):
+        """
+        Сохраняет курс в формате из конфигурации ('notebooks' или 'bundle').
+
+        Returns:
+            list или str: Пути к ноутбукам или путь к архиву
+        """
+        import config
+
+        output_format = output_format or config.COURSE_PARAMS['output_format']
+        if output_format == 'bundle':
+            return self.save_bundle()
+        return self.save_notebooks()
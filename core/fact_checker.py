@@ -0,0 +1,199 @@
+"""
+Проверка фактов в сгенерированных разделах.
+
+Проверка раздела запускается в фоне сразу после его генерации и идет
+параллельно с генерацией следующих разделов. Для каждого утверждения ищется
+связанный фрагмент локального корпуса материалов; вердикт выносит дешевая
+модель, которой вместе с утверждением передается найденный фрагмент
+(совпадение слов по BM25 само по себе не подтверждает утверждение).
+Результаты записываются в метаданные ячеек ноутбука.
+"""
+
+import contextvars
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from llm.client import get_llm_response
+from llm.output_processor import extract_json_str
+
+# Промпт проверки утверждений второй моделью
+FACT_CHECK_SYSTEM_PROMPT = """Ты эксперт, проверяющий учебные материалы на достоверность.
+Для каждого пронумерованного утверждения определи вердикт: "верно", "неверно" или "сомнительно".
+Если к утверждению приложен фрагмент учебных материалов, сверь утверждение с ним.
+Ответь ТОЛЬКО JSON-массивом вида:
+[{"id": 1, "verdict": "верно", "comment": "краткое пояснение"}]"""
+
+# Признаки фактических утверждений: числа, годы, единицы измерения, определения
+_FACT_MARKERS = re.compile(
+    r'\d|\b(?:является|называется|равн[аоы]?|открыл[аи]?|изобрел[аи]?|составляет|'
+    r'измеряется|был[аио]?|год[ау]?|век[ае]?)\b',
+    re.IGNORECASE
+)
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+_MARKDOWN_NOISE = re.compile(r'[#*_`>|]+')
+
+
+def extract_claims(text, max_claims):
+    """
+    Извлекает фактические утверждения из текста markdown.
+
+    Args:
+        text: Текст ячейки markdown
+        max_claims: Максимальное количество утверждений
+
+    Returns:
+        list: Список утверждений (предложений)
+    """
+    claims = []
+    for line in text.split('\n'):
+        line = _MARKDOWN_NOISE.sub(' ', line).strip(' -')
+        for sentence in _SENTENCE_SPLIT.split(line):
+            sentence = ' '.join(sentence.split())
+            if len(sentence) >= 25 and _FACT_MARKERS.search(sentence):
+                claims.append(sentence)
+                if len(claims) >= max_claims:
+                    return claims
+    return claims
+
+
+class FactChecker:
+    """
+    Фоновая проверка фактов по разделам занятия.
+    """
+
+    def __init__(self, model=None, retriever=None, max_workers=None):
+        """
+        Инициализация проверки фактов.
+
+        Args:
+            model: Модель для проверки (по умолчанию дешевая модель из конфига)
+            retriever: Поиск по локальному корпусу материалов (опционально)
+            max_workers: Количество одновременных проверок
+        """
+        self.params = config.FACT_CHECK_PARAMS
+        self.model = model or self.params['model']
+        self.retriever = retriever
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or self.params['max_workers'])
+        self._futures = []
+
+    def submit_section(self, section, cells):
+        """
+        Ставит раздел в очередь проверки, не дожидаясь результата.
+
+        Args:
+            section: Название раздела
+            cells: Список пар (позиция ячейки в сессии, Cell) для раздела
+        """
+        # Передаем в поток только тексты markdown-ячеек
+        texts = [(position, cell.source) for position, cell in cells if cell.cell_type == 'markdown']
+        if texts:
+            # Копия контекста сохраняет сессию и раздел для логов и учета расходов
+            context = contextvars.copy_context()
+            self._futures.append(self._executor.submit(context.run, self._check_section, section, texts))
+
+    def _find_passage(self, claim):
+        """
+        Ищет в локальном корпусе фрагмент, связанный с утверждением.
+
+        Returns:
+            tuple: (текст фрагмента, файл-источник) или None
+        """
+        if self.retriever is None or not self.params['use_corpus']:
+            return None
+        results = self.retriever.search(claim, top_k=1)
+        if results and results[0][0] >= self.params['corpus_min_score']:
+            _, text, source = results[0]
+            return text[:self.params['corpus_passage_chars']], source
+        return None
+
+    def _check_with_model(self, claims, passages):
+        """Проверяет утверждения (с найденными фрагментами корпуса) одним запросом к модели."""
+        numbered = '\n'.join(
+            f"{i}. {claim}" + (f"\n   Фрагмент материалов: {' '.join(passage.split())}" if passage else "")
+            for i, (claim, passage) in enumerate(zip(claims, passages), 1)
+        )
+        messages = [
+            {"role": "system", "content": FACT_CHECK_SYSTEM_PROMPT},
+            {"role": "user", "content": numbered}
+        ]
+        answer, _, _ = get_llm_response(messages=messages, model=self.model, temperature=0.0,
+                                        max_tokens=1500, kind='fact_check')
+
+        verdicts = {}
+        try:
+            for item in json.loads(extract_json_str(answer)):
+                verdicts[int(item['id'])] = {"verdict": item.get('verdict', 'сомнительно'),
+                                             "comment": item.get('comment', '')}
+        except Exception:
+            print(f"⚠️  Не удалось разобрать ответ проверки фактов")
+        return verdicts
+
+    def _check_section(self, section, texts):
+        """
+        Проверяет утверждения раздела.
+
+        Returns:
+            dict: Позиция ячейки -> результат проверки
+        """
+        results = {}
+        pending = []
+
+        for position, text in texts:
+            claims = extract_claims(text, self.params['max_claims'])
+            results[position] = []
+            for claim in claims:
+                checked = {"claim": claim, "verdict": "не проверено"}
+                found = self._find_passage(claim)
+                passage = None
+                if found is not None:
+                    passage, checked["source"] = found
+                    # Без модели известно только, что в материалах есть фрагмент на ту же тему
+                    checked["verdict"] = "найден связанный фрагмент"
+                pending.append((position, len(results[position]), passage))
+                results[position].append(checked)
+
+        if pending and self.model:
+            claims = [results[position][i]['claim'] for position, i, _ in pending]
+            verdicts = self._check_with_model(claims, [passage for _, _, passage in pending])
+            for number, (position, i, _) in enumerate(pending, 1):
+                if number in verdicts:
+                    results[position][i].update(verdicts[number])
+
+        return results
+
+    def collect(self, session):
+        """
+        Дожидается всех проверок и записывает результаты в метаданные ячеек.
+
+        Args:
+            session: Экземпляр SessionManager
+
+        Returns:
+            int: Количество ячеек с сомнительными или неверными утверждениями
+        """
+        flagged = 0
+        for future in self._futures:
+            try:
+                section_results = future.result()
+            except Exception as e:
+                print(f"⚠️  Ошибка проверки фактов: {e}")
+                continue
+
+            for position, claims in section_results.items():
+                if not claims or position >= len(session.cells):
+                    continue
+                bad = [c for c in claims if c.get('verdict') in ('неверно', 'сомнительно')]
+                cell = session.cells[position]
+                if cell.metadata is None:
+                    cell.metadata = {}
+                cell.metadata.setdefault('aimetodolog', {})['fact_check'] = {
+                    "status": "flagged" if bad else "ok",
+                    "claims": claims
+                }
+                flagged += bool(bad)
+
+        self._futures = []
+        self._executor.shutdown(wait=True)
+        return flagged
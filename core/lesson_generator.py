@@ -0,0 +1,412 @@
+"""
+Генерация содержимого занятия: структура и ячейки по разделам.
+Используется как консольным рабочим процессом, так и менеджером курса.
+"""
+
+import config
+from core.mode_optimizer import call_token_limit, resolve_auto_mode
+from core.prompt_factory import PromptFactory
+from core.prompt_registry import get_registry
+from core.section_store import get_section_store
+from llm.client import get_llm_response, structured_output_mode
+from llm.hedging import hedged_llm_response
+from llm.output_processor import (
+    NOTEBOOK_CELLS_SCHEMA, extract_and_repair_json, try_extract_json, validate_notebook_cells,
+    is_error_output, looks_truncated
+)
+from utils.helpers import log_to_file
+from utils.log_index import log_context
+from utils.profiling import profile_stage
+from utils.structure_parser import parse_structure
+
+# Промпты структуры и починки JSON хранятся в шаблонах prompts/<специалист>/
+# (structure_*, update_*, json_*) и берутся из реестра шаблонов
+
+
+@profile_stage('generate_structure')
+def generate_structure(session, model=None, cache=None):
+    """
+    Генерирует структуру занятия по диалогу сессии.
+
+    Args:
+        session: Экземпляр SessionManager
+        model: Имя модели (если None, берется из конфига)
+        cache: Общий кэш ответов LLM (опционально)
+
+    Returns:
+        tuple: (структура занятия, время генерации)
+    """
+    registry = get_registry()
+    course_block = f"Контекст курса: {session.course_context}\n\n" if session.course_context else ""
+
+    messages = [
+        {"role": "system", "content": registry.render('structure_system')},
+        {"role": "user", "content": registry.render('structure_user', course_block=course_block,
+                                                    dialog=session.summarized_dialog)}
+    ]
+
+    with log_context(session_id=session.session_id, section="structure"):
+        structure, structure_time, _ = get_llm_response(
+            messages=messages,
+            model=model or config.DEFAULT_MODEL,
+            max_tokens=2000,
+            cache=cache,
+            kind='structure',
+            prompt_version=registry.version('structure_system', 'structure_user')
+        )
+
+        session.lesson_structure = structure
+        log_to_file(structure, f"{session.log_prefix}lesson_structure")
+    return structure, structure_time
+
+
+@profile_stage('update_structure')
+def update_structure(session, changes, model=None, cache=None):
+    """
+    Обновляет структуру занятия с учетом пожеланий пользователя.
+
+    Args:
+        session: Экземпляр SessionManager
+        changes: Описание изменений
+        model: Имя модели (если None, берется из конфига)
+        cache: Общий кэш ответов LLM (опционально)
+
+    Returns:
+        tuple: (обновленная структура, время генерации)
+    """
+    registry = get_registry()
+    messages = [
+        {"role": "system", "content": registry.render('update_system')},
+        {"role": "user", "content": registry.render('update_user', structure=session.lesson_structure,
+                                                    changes=changes)}
+    ]
+
+    with log_context(session_id=session.session_id, section="structure"):
+        structure, update_time, _ = get_llm_response(
+            messages=messages,
+            model=model or config.DEFAULT_MODEL,
+            max_tokens=2000,
+            cache=cache,
+            kind='structure',
+            prompt_version=registry.version('update_system', 'update_user')
+        )
+
+    session.lesson_structure = structure
+    return structure, update_time
+
+
+def get_generation_targets(session):
+    """
+    Определяет цели генерации в зависимости от режима сессии.
+
+    Args:
+        session: Экземпляр SessionManager
+
+    Returns:
+        list: Список разделов ([None] для режима 'full')
+    """
+    if session.generation_mode == 'full':
+        # None означает "весь урок"
+        return [None]
+    if session.generation_mode == 'hybrid' and session.generation_plan:
+        # Группы подразделов, выбранные автовыбором режима
+        return session.generation_plan['targets']
+    return parse_structure(session.lesson_structure)
+
+
+@profile_stage('request_json_fix')
+def request_json_fix(messages, raw_output, model=None):
+    """
+    Чинит невалидный ответ коротким дозапросом вместо повторной генерации раздела.
+
+    Оборванный JSON продолжается с места обрыва, синтаксически неверный -
+    отправляется модели на исправление.
+
+    Args:
+        messages: Исходные сообщения запроса раздела
+        raw_output: Невалидный ответ LLM
+        model: Имя модели (если None, берется из конфига)
+
+    Returns:
+        dict: {"cells": [...]} или None, если починить не удалось
+    """
+    params = config.REPAIR_PARAMS
+    registry = get_registry()
+    output = raw_output
+
+    for attempt in range(1, params['max_followups'] + 1):
+        if looks_truncated(output):
+            print(f"   🔧 JSON оборван, дозапрос продолжения ({attempt}/{params['max_followups']})")
+            fix_messages = messages + [
+                {"role": "assistant", "content": output},
+                {"role": "user", "content": registry.render('json_continue')}
+            ]
+            continuation, fix_time, _ = get_llm_response(
+                messages=fix_messages,
+                model=model or config.DEFAULT_MODEL,
+                temperature=0.0,
+                max_tokens=params['continue_max_tokens'],
+                kind='json_fix'
+            )
+            if is_error_output(continuation):
+                return None
+            output = output + continuation
+        else:
+            print(f"   🔧 JSON невалиден, дозапрос исправления ({attempt}/{params['max_followups']})")
+            fix_messages = [
+                {"role": "system", "content": registry.render('json_fix_system')},
+                {"role": "user", "content": output}
+            ]
+            output, fix_time, _ = get_llm_response(
+                messages=fix_messages,
+                model=model or config.DEFAULT_MODEL,
+                temperature=0.0,
+                max_tokens=params['fix_max_tokens'],
+                kind='json_fix',
+                response_schema=NOTEBOOK_CELLS_SCHEMA
+            )
+
+        print(f"   ⏱️  Время дозапроса: {fix_time:.2f} сек.")
+        result = try_extract_json(output)
+        if result is not None:
+            return result
+
+    return None
+
+
+def lookup_section(session, factory, target, index, model=None):
+    """
+    Ищет готовый раздел в хранилище разделов.
+
+    Args:
+        session: Экземпляр SessionManager
+        factory: Экземпляр PromptFactory
+        target: Название раздела (None для режима 'full')
+        index: Порядковый номер раздела
+        model: Имя модели (если None, берется из конфига)
+
+    Returns:
+        list: Ячейки раздела с метками раздела или None
+    """
+    store = get_section_store()
+    if store is None:
+        return None
+    stored_cells = store.get(store.make_key(session, target, model or config.DEFAULT_MODEL, factory.prompt_version,
+                                            factory.get_references(target)))
+    if not stored_cells:
+        return None
+    section_meta = {"section": target or "ВЕСЬ УРОК", "section_index": index}
+    for cell in stored_cells:
+        cell['metadata'].setdefault('aimetodolog', {}).update(section_meta)
+    print(f"   ♻️  Раздел взят из хранилища: {len(stored_cells)} ячеек")
+    return stored_cells
+
+
+def request_section(session, factory, target, index, model=None, cache=None, temperature=0.7, cancel_event=None):
+    """
+    Запрашивает у LLM сырой ответ для раздела (этап ввода-вывода).
+
+    Args:
+        cancel_event: threading.Event, прерывающий запрос (опционально)
+
+    Returns:
+        tuple: (сообщения запроса, сырой ответ, модель, давшая ответ)
+    """
+    model = model or config.DEFAULT_MODEL
+    system_prompt, user_prompt = factory.get_prompt(target)
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+    current_max_tokens = call_token_limit(model, session.generation_mode)
+    current_temperature = temperature
+
+    print(f"   Параметры: max_tokens={current_max_tokens}, temperature={current_temperature}, "
+          f"формат ответа: {structured_output_mode(model) or 'текст'}")
+    # Если модель отвечает дольше обычного, запрос дублируется на другую модель
+    raw_output, gen_time, _, model = hedged_llm_response(
+        messages=messages,
+        model=model,
+        validate=lambda output: try_extract_json(output) is not None,
+        temperature=current_temperature,
+        max_tokens=current_max_tokens,
+        cache=cache,
+        kind=session.generation_mode,
+        prompt_version=factory.prompt_version,
+        response_schema=NOTEBOOK_CELLS_SCHEMA,
+        cancel_event=cancel_event
+    )
+
+    print(f"   ⏱️  Время генерации: {gen_time:.2f} сек.")
+
+    # Логируем сырой ответ
+    log_prefix = "full_lesson" if session.generation_mode == 'full' else f"section_{index}"
+    log_to_file(raw_output, f"{session.log_prefix}{log_prefix}")
+    return messages, raw_output, model
+
+
+def parse_section_output(raw_output):
+    """
+    Извлекает и проверяет ячейки из сырого ответа (этап без ввода-вывода;
+    функция уровня модуля, чтобы выполняться в пуле процессов).
+
+    Returns:
+        tuple: (ячейки или None, если JSON извлечь не удалось; список проблем)
+    """
+    json_content = try_extract_json(raw_output)
+    if json_content is None:
+        return None, []
+    # Проверяем ячейки по схеме nbformat v4 и исправляем простые ошибки
+    return validate_notebook_cells(json_content['cells'])
+
+
+def finish_section(session, factory, target, index, messages, raw_output, model, parsed, allow_stub=True,
+                   requested_model=None):
+    """
+    Завершает раздел: чинит невалидный ответ дозапросом, сохраняет раздел
+    в хранилище и помечает ячейки разделом.
+
+    Args:
+        session: Экземпляр SessionManager
+        factory: Экземпляр PromptFactory
+        target: Название раздела (None для режима 'full')
+        index: Порядковый номер раздела
+        messages: Сообщения запроса раздела
+        raw_output: Сырой ответ LLM
+        model: Модель, давшая ответ
+        parsed: Результат parse_section_output
+        allow_stub: Заменять невалидный ответ заглушкой (False - вернуть None)
+        requested_model: Модель, запрошенная для раздела (если ответила резервная
+            модель или дубль хеджа, раздел сохраняется и под ней)
+
+    Returns:
+        list: Ячейки раздела (словари nbformat) или None
+    """
+    cells, problems = parsed
+
+    # Неисправимый локально ответ чиним коротким дозапросом
+    if cells is None and not is_error_output(raw_output):
+        json_content = request_json_fix(messages, raw_output, model=model)
+        if json_content is not None:
+            cells, problems = validate_notebook_cells(json_content['cells'])
+
+    is_stub = cells is None
+    if is_stub and not allow_stub:
+        return None
+    if is_stub:
+        print(f"   ⚠️  Не удалось получить валидный JSON, раздел заменен заглушкой")
+        cells, problems = validate_notebook_cells(extract_and_repair_json(raw_output)['cells'])
+
+    if problems:
+        print(f"   🩹 Исправлено проблем в ячейках: {len(problems)}")
+        log_to_file("\n".join(problems), f"{session.log_prefix}validation_{index}")
+
+    # Сохраняем раздел для повторного использования под моделью, давшей ответ,
+    # и под запрошенной: поиск идет по запрошенной модели (заглушки не сохраняются)
+    store = get_section_store()
+    if store is not None and cells and not is_stub:
+        references = factory.get_references(target)
+        for key_model in dict.fromkeys([model, requested_model or model]):
+            store.put(store.make_key(session, target, key_model, factory.prompt_version, references),
+                      cells, session, target, model, factory.prompt_version)
+
+    # Помечаем ячейки разделом, чтобы их можно было найти и перегенерировать
+    section_meta = {"section": target or "ВЕСЬ УРОК", "section_index": index}
+    for cell in cells:
+        cell['metadata'].setdefault('aimetodolog', {}).update(section_meta)
+    return cells
+
+
+@profile_stage('generate_section')
+def generate_section(session, factory, target, index, model=None, cache=None, reuse=True):
+    """
+    Генерирует ячейки для одного раздела и добавляет их в сессию.
+
+    Раздел с тем же ключом (тема, уровень, раздел, модель, версия промптов,
+    контекст занятия) берется из хранилища разделов без запроса к LLM.
+
+    Args:
+        session: Экземпляр SessionManager
+        factory: Экземпляр PromptFactory
+        target: Название раздела (None для режима 'full')
+        index: Порядковый номер раздела (для логов)
+        model: Имя модели (если None, берется из конфига)
+        cache: Общий кэш ответов LLM (опционально)
+        reuse: Брать готовый раздел из хранилища (False - сгенерировать заново)
+
+    Returns:
+        dict: Количество добавленных ячеек по типам
+    """
+    stored_cells = lookup_section(session, factory, target, index, model) if reuse else None
+    if stored_cells:
+        return session.add_cells(stored_cells)
+
+    requested_model = model or config.DEFAULT_MODEL
+    messages, raw_output, model = request_section(session, factory, target, index, requested_model, cache)
+
+    # Обрабатываем вывод LLM (извлекаем JSON)
+    try:
+        cells = finish_section(session, factory, target, index, messages, raw_output, model,
+                               parse_section_output(raw_output), requested_model=requested_model)
+        if cells:
+            # Счетчики типов ведутся сессией при добавлении ячеек
+            cell_types = session.add_cells(cells)
+            cell_count = sum(cell_types.values())
+            print(f"   ✅ Добавлено {cell_count} ячеек")
+            print(f"   📊 Типы ячеек: {cell_types}")
+            return cell_types
+
+        print(f"   ⚠️  В ответе нет ячеек (cells)")
+
+    except Exception as e:
+        print(f"   ❌ Ошибка обработки JSON: {e}")
+
+    return {}
+
+
+def generate_lesson_content(session, model=None, cache=None, retriever=None, fact_checker=None):
+    """
+    Генерирует все ячейки занятия по структуре сессии.
+
+    Args:
+        session: Экземпляр SessionManager с заполненной структурой
+        model: Имя модели (если None, берется из конфига)
+        cache: Общий кэш ответов LLM (опционально)
+        retriever: Поиск по локальным материалам (опционально)
+        fact_checker: Фоновая проверка фактов (FactChecker); результаты
+            собираются вызовом fact_checker.collect(session)
+
+    Returns:
+        list: Список целей генерации (разделов)
+    """
+    # Режим 'auto' заменяется выбранным по прогнозу времени и стоимости
+    resolve_auto_mode(session, model)
+
+    factory = PromptFactory(session, retriever=retriever)
+    generation_targets = get_generation_targets(session)
+
+    if session.generation_mode != 'full':
+        print(f"   Будет сгенерировано {len(generation_targets)} разделов")
+
+    # Начинаем с чистого листа
+    session.clear_cells()
+
+    for i, target in enumerate(generation_targets, 1):
+        if session.generation_mode == 'full':
+            print(f"\n🔨 Генерация ВСЕГО занятия (запрос {i}/{len(generation_targets)})")
+        else:
+            print(f"\n🔨 Генерация раздела {i}/{len(generation_targets)}: {target}")
+
+        first_position = len(session.cells)
+        with log_context(session_id=session.session_id, section=target or "ВЕСЬ УРОК"):
+            generate_section(session, factory, target, i, model=model, cache=cache)
+
+        # Проверка фактов раздела идет в фоне, пока генерируются следующие разделы
+        if fact_checker is not None:
+            new_cells = list(enumerate(session.cells[first_position:], first_position))
+            fact_checker.submit_section(target or "ВЕСЬ УРОК", new_cells)
+
+    return generation_targets
+
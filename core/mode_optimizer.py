@@ -0,0 +1,239 @@
+"""
+Автовыбор режима генерации по прогнозу времени и стоимости.
+
+Объем занятия оценивается по ответу о продолжительности, задержка модели -
+по истории запросов (накладные расходы + время на токен). Прогноз учитывает
+лимит токенов ответа одного запроса (длинный ответ дописывается
+продолжениями) и риск обрыва, который растет с длиной ответа: сломанный
+ответ генерируется заново. Из допустимых по качеству планов (весь урок одним
+запросом, по подразделам, группы мелких подразделов) выбирается план
+с наименьшим прогнозируемым временем.
+"""
+
+import math
+import re
+
+import config
+from llm.ledger import CostLedger
+from llm.token_stats import latency_model, suggest_max_tokens, typical_completion_tokens
+from utils.structure_parser import parse_structure
+
+# Разделитель названий подразделов в цели гибридного режима
+HYBRID_SEPARATOR = "; "
+
+# Ответ на вопрос о продолжительности занятия в тексте диалога
+# (или строка "Продолжительность: ..." компактного блока ответов)
+_DURATION_ANSWER_RE = re.compile(r'продолжительност(?:ь:|.*?Ответ:)\s*(.+?)(?:\n\s*\n|\n(?=\w+:)|$)',
+                                 re.IGNORECASE | re.DOTALL)
+_HOURS_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*(?:час|ч\b)', re.IGNORECASE)
+_MINUTES_RE = re.compile(r'(\d+)')
+
+
+def estimate_lesson_minutes(dialog_text, default=None):
+    """
+    Извлекает продолжительность занятия (в минутах) из ответов пользователя.
+
+    Args:
+        dialog_text: Текст диалога (вопросы и ответы)
+        default: Значение, если продолжительность не найдена
+
+    Returns:
+        int: Продолжительность в минутах
+    """
+    default = default or config.MODE_OPTIMIZER_PARAMS['default_minutes']
+    match = _DURATION_ANSWER_RE.search(dialog_text or "")
+    if not match:
+        return default
+
+    answer = match.group(1)
+    minutes = 0.0
+    hours = _HOURS_RE.search(answer)
+    if hours:
+        minutes += float(hours.group(1).replace(',', '.')) * 60
+        answer = answer[hours.end():]
+    extra = _MINUTES_RE.search(answer)
+    if extra:
+        minutes += int(extra.group(1))
+
+    return int(minutes) if minutes > 0 else default
+
+
+def call_token_limit(model, mode):
+    """
+    Лимит токенов ответа одного запроса раздела в режиме генерации.
+
+    Returns:
+        int: max_tokens запроса
+    """
+    # Для полной генерации лимит больше; при наличии статистики он подбирается
+    # по наблюдаемой длине ответов модели в этом режиме
+    default = 8000 if mode in ('full', 'hybrid') else 4000
+    return suggest_max_tokens(model, mode, default)
+
+
+def _top_section(target):
+    """Номер раздела 1 уровня для подраздела вида "2.3. ..."."""
+    return target.split('.', 1)[0].strip()
+
+
+def group_targets(targets, target_tokens, max_call_tokens):
+    """
+    Объединяет соседние подразделы одного раздела в группы для одного запроса.
+
+    Подразделы разных разделов 1 уровня (теория, практика, домашнее задание)
+    не смешиваются. Подраздел крупнее лимита идет отдельным запросом.
+
+    Args:
+        targets: Список подразделов
+        target_tokens: Оценка токенов ответа на один подраздел
+        max_call_tokens: Лимит токенов ответа на один запрос
+
+    Returns:
+        list: Список групп (списков подразделов)
+    """
+    groups = []
+    current = []
+    for target in targets:
+        fits = (len(current) + 1) * target_tokens <= max_call_tokens
+        if current and (not fits or _top_section(current[0]) != _top_section(target)):
+            groups.append(current)
+            current = []
+        current.append(target)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _predict(calls, prompt_tokens, model, call_limit):
+    """
+    Прогноз времени и стоимости плана (запросы выполняются последовательно).
+
+    Ответ длиннее лимита запроса дописывается продолжениями: каждое - отдельный
+    запрос с накладными расходами и промптом, включающим уже полученный ответ.
+    Ожидаемые время и стоимость запроса увеличиваются на вероятность обрыва
+    ответа, после которого раздел генерируется заново.
+
+    Args:
+        calls: Оценки токенов ответа по запросам
+        prompt_tokens: Оценка токенов промпта одного запроса
+        model: Имя модели
+        call_limit: Лимит токенов ответа одного запроса
+
+    Returns:
+        tuple: (время в секундах, стоимость в долларах, останется ли ответ
+            оборванным после допустимого числа продолжений)
+    """
+    params = config.MODE_OPTIMIZER_PARAMS
+    overhead, sec_per_token = latency_model(model, params['default_overhead'],
+                                            params['default_tokens_per_sec'])
+    max_requests = 1 + config.TOKEN_LIMIT_PARAMS['max_continuations']
+    predicted_time = 0.0
+    predicted_cost = 0.0
+    truncated = False
+    for tokens in calls:
+        requests = max(1, math.ceil(tokens / call_limit))
+        truncated = truncated or requests > max_requests
+        requests = min(requests, max_requests)
+        risk = 1 - (1 - params['truncation_risk']) ** (tokens / 1000)
+        call_prompt = prompt_tokens * requests + call_limit * requests * (requests - 1) // 2
+        predicted_time += (overhead * requests + tokens * sec_per_token) * (1 + risk)
+        predicted_cost += CostLedger.price(model, call_prompt, tokens) * (1 + risk)
+    return predicted_time, predicted_cost, truncated
+
+
+def choose_generation_plan(session, model=None):
+    """
+    Выбирает режим генерации и цели запросов для занятия.
+
+    Args:
+        session: Экземпляр SessionManager с заполненной структурой
+        model: Имя модели (если None, берется из конфига)
+
+    Returns:
+        dict: План: mode, targets, calls, predicted_time, predicted_cost, candidates
+    """
+    params = config.MODE_OPTIMIZER_PARAMS
+    model = model or config.DEFAULT_MODEL
+    targets = parse_structure(session.lesson_structure)
+
+    # Объем занятия: по продолжительности, но не меньше наблюдаемой длины ответов модели
+    answers = getattr(session, 'answers', None)
+    if answers is not None and answers.duration_minutes:
+        minutes = answers.duration_minutes
+    else:
+        minutes = estimate_lesson_minutes(session.summarized_dialog)
+    lesson_tokens = minutes * params['tokens_per_minute']
+    target_tokens = lesson_tokens / len(targets)
+    history = typical_completion_tokens(model, 'sections') or typical_completion_tokens(model, 'subsections')
+    if history:
+        target_tokens = max(target_tokens, history)
+    lesson_tokens = target_tokens * len(targets)
+
+    # Ограничение качества: длинные ответы чаще обрываются и теряют детальность
+    max_call_tokens = min(params['max_call_tokens'],
+                          params['model_output_limits'].get(model, config.TOKEN_LIMIT_PARAMS['max_tokens']))
+    prompt_tokens = params['base_prompt_tokens'] + (len(session.summarized_dialog)
+                                                    + len(session.lesson_structure)) // 4
+
+    candidates = {}
+    if len(targets) <= params['full_max_targets'] and lesson_tokens <= max_call_tokens:
+        candidates['full'] = ([None], [lesson_tokens])
+
+    candidates['sections'] = (targets, [target_tokens] * len(targets))
+
+    groups = group_targets(targets, target_tokens, max_call_tokens)
+    if len(groups) < len(targets):
+        candidates['hybrid'] = ([HYBRID_SEPARATOR.join(group) for group in groups],
+                                [target_tokens * len(group) for group in groups])
+
+    summary = {}
+    for mode, (mode_targets, calls) in candidates.items():
+        predicted_time, predicted_cost, truncated = _predict(calls, prompt_tokens, model,
+                                                             call_token_limit(model, mode))
+        # Режим по разделам остается запасным, даже если его ответы не уложатся в лимит
+        if truncated and mode != 'sections':
+            continue
+        summary[mode] = {"calls": len(calls), "predicted_time": predicted_time,
+                         "predicted_cost": predicted_cost}
+
+    # Меньше время, затем меньше стоимость, затем меньше запросов
+    best = min(summary, key=lambda mode: (round(summary[mode]['predicted_time'], 1),
+                                          summary[mode]['predicted_cost'],
+                                          summary[mode]['calls']))
+
+    return {
+        "mode": best,
+        "targets": candidates[best][0],
+        "calls": summary[best]['calls'],
+        "predicted_time": summary[best]['predicted_time'],
+        "predicted_cost": summary[best]['predicted_cost'],
+        "lesson_minutes": minutes,
+        "target_tokens": int(target_tokens),
+        "candidates": summary,
+    }
+
+
+def resolve_auto_mode(session, model=None):
+    """
+    Заменяет режим 'auto' сессии выбранным режимом.
+
+    Args:
+        session: Экземпляр SessionManager
+        model: Имя модели (если None, берется из конфига)
+
+    Returns:
+        dict: Выбранный план или None, если режим сессии задан явно
+    """
+    if session.generation_mode != 'auto':
+        return None
+
+    plan = choose_generation_plan(session, model)
+    session.generation_mode = plan['mode']
+    session.generation_plan = plan
+
+    print(f"🧮 Автовыбор режима: '{plan['mode']}' ({plan['calls']} запр., "
+          f"прогноз {plan['predicted_time']:.0f} сек., ${plan['predicted_cost']:.4f})")
+    for mode, info in plan['candidates'].items():
+        print(f"   {mode}: {info['calls']} запр., {info['predicted_time']:.0f} сек., "
+              f"${info['predicted_cost']:.4f}")
+    return plan
@@ -0,0 +1,357 @@
+"""
+Конвейер генерации с ограниченными очередями между этапами.
+
+Этапы (структура -> запрос к LLM -> извлечение JSON -> проверка -> запись)
+соединены очередями ограниченного размера, у каждого этапа свое число
+обработчиков. Запросы к LLM выполняются потоками, извлечение и починка JSON -
+в пуле процессов. Медленный этап не дает очередям расти: предыдущий этап
+ждет свободного места (обратное давление), поэтому память ограничена при
+любом числе заявок, а сеть и ядра загружены одновременно.
+"""
+
+import contextvars
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+
+# Признак конца потока элементов
+_STOP = object()
+
+
+class Stage:
+    """
+    Этап конвейера.
+    """
+
+    def __init__(self, name, func, workers=1, processes=False, fan_out=False, on_error=None):
+        """
+        Args:
+            name: Имя этапа (для статистики)
+            func: Обработчик элемента; результат None отбрасывается
+            workers: Число обработчиков
+            processes: Выполнять обработчик в пуле процессов (func и элементы
+                должны сериализоваться pickle)
+            fan_out: Обработчик возвращает список элементов для следующего этапа
+            on_error: Результат вместо ошибки обработчика: (элемент, ошибка) -> результат;
+                без него (или при ошибке в нем самом) элемент с ошибкой отбрасывается
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers or 1)
+        self.processes = processes
+        self.fan_out = fan_out
+        self.on_error = on_error
+        self.processed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.blocked_time = 0.0
+
+
+class Pipeline:
+    """
+    Набор этапов, соединенных ограниченными очередями.
+    """
+
+    def __init__(self, stages, queue_size=None):
+        """
+        Args:
+            stages: Список Stage в порядке обработки
+            queue_size: Размер очереди перед каждым этапом (по умолчанию из конфига)
+        """
+        self.stages = stages
+        self.queue_size = queue_size or config.PIPELINE_PARAMS['queue_size']
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def _put(self, stage, target_queue, item):
+        """Передает элемент следующему этапу, ожидая места в очереди."""
+        start_time = time.time()
+        target_queue.put(item)
+        stage.blocked_time += time.time() - start_time
+
+    def _worker(self, position, queues, results, finished, pool):
+        """Обработчик этапа: берет элементы из своей очереди до признака конца."""
+        stage = self.stages[position]
+        input_queue = queues[position]
+        output_queue = queues[position + 1] if position + 1 < len(queues) else None
+
+        while True:
+            item = input_queue.get()
+            if item is _STOP:
+                break
+
+            start_time = time.time()
+            try:
+                if pool is not None:
+                    result = pool.submit(stage.func, item).result()
+                else:
+                    result = stage.func(item)
+            except Exception as e:
+                with self._lock:
+                    stage.failed += 1
+                    self.errors.append((stage.name, item, e))
+                print(f"❌ Ошибка этапа '{stage.name}': {e}")
+                if stage.on_error is None:
+                    continue
+                try:
+                    result = stage.on_error(item, e)
+                except Exception as error:
+                    # Обработчик продолжает работу: иначе этап не передаст признак конца
+                    with self._lock:
+                        self.errors.append((stage.name, item, error))
+                    print(f"❌ Ошибка обработки сбоя этапа '{stage.name}': {error}")
+                    continue
+            finally:
+                with self._lock:
+                    stage.busy_time += time.time() - start_time
+
+            with self._lock:
+                stage.processed += 1
+            outputs = (result or []) if stage.fan_out else ([] if result is None else [result])
+            for output in outputs:
+                if output_queue is None:
+                    with self._lock:
+                        results.append(output)
+                else:
+                    self._put(stage, output_queue, output)
+
+        # Последний завершившийся обработчик передает признак конца следующему этапу
+        with self._lock:
+            finished[position] += 1
+            is_last = finished[position] == stage.workers
+        if is_last and output_queue is not None:
+            for _ in range(self.stages[position + 1].workers):
+                output_queue.put(_STOP)
+
+    def run(self, items):
+        """
+        Пропускает элементы через все этапы.
+
+        Args:
+            items: Итерируемые входные элементы (читаются по мере освобождения очереди)
+
+        Returns:
+            list: Результаты последнего этапа (в порядке завершения)
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results = []
+        finished = [0] * len(self.stages)
+        # Процессы запускаются через spawn: fork процесса с работающими потоками
+        # может унаследовать захваченные блокировки
+        spawn = multiprocessing.get_context('spawn')
+        pools = [ProcessPoolExecutor(max_workers=stage.workers, mp_context=spawn)
+                 if stage.processes and stage.workers > 1 else None
+                 for stage in self.stages]
+
+        threads = []
+        try:
+            for position, stage in enumerate(self.stages):
+                for number in range(stage.workers):
+                    # Обработчики наследуют контекст (сессия для логов, арендатор ключей)
+                    context = contextvars.copy_context()
+                    thread = threading.Thread(
+                        target=context.run,
+                        args=(self._worker, position, queues, results, finished, pools[position]),
+                        name=f"pipeline-{stage.name}-{number}", daemon=True
+                    )
+                    thread.start()
+                    threads.append(thread)
+
+            # Входные элементы подаются с ожиданием места в первой очереди
+            for item in items:
+                queues[0].put(item)
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_STOP)
+
+            for thread in threads:
+                thread.join()
+        finally:
+            for pool in pools:
+                if pool is not None:
+                    pool.shutdown()
+        return results
+
+    def print_report(self):
+        """Выводит статистику этапов: обработано, ошибки, занятость и ожидание очереди."""
+        print("🏭 Этапы конвейера:")
+        for stage in self.stages:
+            kind = "процессы" if stage.processes else "потоки"
+            print(f"   {stage.name:<10} {kind:<9} x{stage.workers}: обработано {stage.processed}, "
+                  f"ошибок {stage.failed}, в работе {stage.busy_time:.1f} сек., "
+                  f"ожидание очереди {stage.blocked_time:.1f} сек.")
+
+
+class _SectionTask:
+    """
+    Раздел занятия, проходящий через конвейер.
+    """
+
+    def __init__(self, lesson, target, index):
+        self.lesson = lesson
+        self.target = target
+        self.index = index
+        self.messages = None
+        self.raw_output = None
+        self.model = None
+        self.cells = None
+
+
+class _LessonJob:
+    """
+    Занятие конвейера: сессия, фабрика промптов и готовые разделы.
+    """
+
+    def __init__(self, number, session, factory, targets):
+        self.number = number
+        self.session = session
+        self.factory = factory
+        self.total = len(targets)
+        self.sections = {}
+
+
+def _parse_item(item):
+    """Извлечение ячеек из ответа в процессе пула: (номер задачи, ответ) -> (номер, результат)."""
+    from core.lesson_generator import parse_section_output
+
+    task_id, raw_output = item
+    if raw_output is None:
+        return task_id, None
+    try:
+        return task_id, parse_section_output(raw_output)
+    except Exception:
+        # Ответ, который не удалось разобрать, чинится дозапросом на этапе проверки
+        return task_id, (None, [])
+
+
+def _parse_failed(item, error):
+    """Сбой пула процессов: раздел чинится дозапросом на этапе проверки, как неразобранный ответ."""
+    task_id, _ = item
+    return task_id, (None, [])
+
+
+def generate_batch(answers_list, output_dir, batch_id, model=None, cache=None, retriever=None):
+    """
+    Генерирует занятия по заявкам конвейером и сохраняет их в промежуточном формате.
+
+    Разделы всех заявок обрабатываются вперемешку: пока одни ждут ответа
+    модели, ответы других разбираются на остальных ядрах.
+
+    Args:
+        answers_list: Список LessonAnswers
+        output_dir: Папка файлов занятий
+        batch_id: Идентификатор пакета (для сессий и логов)
+        model: Имя модели (если None, берется из конфига)
+        cache: Общий кэш ответов LLM (опционально)
+        retriever: Поиск по локальным материалам (опционально)
+
+    Returns:
+        tuple: (пути сохраненных занятий, конвейер со статистикой)
+    """
+    from core.lesson_generator import (
+        finish_section, generate_structure, get_generation_targets, lookup_section, request_section
+    )
+    from core.mode_optimizer import resolve_auto_mode
+    from core.prompt_factory import PromptFactory
+    from core.session_manager import SessionManager
+    from utils.lesson_format import LESSON_EXTENSION, save_lesson
+    from utils.log_index import log_context
+
+    model = model or config.DEFAULT_MODEL
+    params = config.PIPELINE_PARAMS
+    tasks = {}
+    task_ids = itertools.count()
+    tasks_lock = threading.Lock()
+
+    def plan_lesson(item):
+        """Структура занятия и разбиение на разделы."""
+        number, answers = item
+        session = SessionManager(generation_mode=config.DEFAULT_GENERATION_MODE,
+                                 log_prefix=f"{batch_id}_{number}_")
+        session.session_id = f"{batch_id}_{number:03d}"
+        session.answers = answers
+        session.lesson_title = answers.topic
+        session.summarized_dialog = answers.to_context()
+
+        generate_structure(session, model=model, cache=cache)
+        resolve_auto_mode(session, model)
+        targets = get_generation_targets(session)
+        if not targets:
+            raise RuntimeError(f"заявка {number}: в структуре нет разделов")
+        session.clear_cells()
+
+        lesson = _LessonJob(number, session, PromptFactory(session, retriever=retriever), targets)
+        return [_SectionTask(lesson, target, index) for index, target in enumerate(targets, 1)]
+
+    def request(task):
+        """Готовый раздел из хранилища или сырой ответ LLM."""
+        session = task.lesson.session
+        with log_context(session_id=session.session_id, section=task.target or "ВЕСЬ УРОК"):
+            task.cells = lookup_section(session, task.lesson.factory, task.target, task.index, model)
+            if task.cells is None:
+                task.messages, task.raw_output, task.model = request_section(
+                    session, task.lesson.factory, task.target, task.index, model, cache)
+        return register(task)
+
+    def request_failed(task, error):
+        """Раздел с неудачным запросом идет дальше без ячеек, иначе занятие не соберется."""
+        task.cells, task.raw_output = [], None
+        return register(task)
+
+    def register(task):
+        """Запоминает раздел под номером задачи для этапа проверки."""
+        with tasks_lock:
+            task_id = next(task_ids)
+            tasks[task_id] = task
+        # В пул процессов передается только текст ответа
+        return task_id, task.raw_output
+
+    def validate(item):
+        """Дозапрос исправления, хранилище разделов и метки ячеек."""
+        task_id, parsed = item
+        with tasks_lock:
+            task = tasks.pop(task_id)
+        if task.cells is None:
+            session = task.lesson.session
+            with log_context(session_id=session.session_id, section=task.target or "ВЕСЬ УРОК"):
+                try:
+                    task.cells = finish_section(session, task.lesson.factory, task.target, task.index,
+                                                task.messages, task.raw_output, task.model, parsed,
+                                                requested_model=model)
+                except Exception as e:
+                    # Раздел без ячеек не задерживает сборку занятия
+                    print(f"   ❌ Ошибка обработки JSON: {e}")
+                    task.cells = []
+        return task
+
+    def write(task):
+        """Собирает разделы занятия по порядку и сохраняет готовое занятие."""
+        lesson = task.lesson
+        lesson.sections[task.index] = task.cells or []
+        if len(lesson.sections) < lesson.total:
+            return None
+        for index in sorted(lesson.sections):
+            lesson.session.add_cells(lesson.sections[index])
+        if not lesson.session.cells:
+            raise RuntimeError(f"заявка {lesson.number}: нет ячеек")
+        path = save_lesson(lesson.session,
+                           os.path.join(output_dir, f"{lesson.session.session_id}{LESSON_EXTENSION}"), model)
+        print(f"✅ Заявка {lesson.number}/{len(answers_list)} готова: {lesson.session.lesson_title}")
+        return path
+
+    pipeline = Pipeline([
+        Stage('structure', plan_lesson, params['structure_workers'], fan_out=True),
+        Stage('llm', request, params['llm_workers'], on_error=request_failed),
+        Stage('parse', _parse_item, params['parse_workers'] or os.cpu_count(), processes=True,
+              on_error=_parse_failed),
+        Stage('validate', validate, params['validate_workers']),
+        # Один обработчик записи: сессии занятий изменяются только в нем
+        Stage('write', write, 1),
+    ])
+    lesson_paths = pipeline.run(enumerate(answers_list, 1))
+    return lesson_paths, pipeline
@@ -2,6 +2,10 @@
 Фабрика промптов для разных режимов генерации.
 """
 
+from core.prompt_registry import get_registry
+from utils.profiling import profile_stage
+
+
 class PromptFactory:
     """
     Создает промпты для LLM в зависимости от режима генерации.
@@ -10,18 +14,49 @@ class PromptFactory:
     MODES = {
         'full': 'Генерация занятия целиком',
         'sections': 'По разделам 1 уровня',
-        'subsections': 'По подразделам'
+        'subsections': 'По подразделам',
+        'hybrid': 'Группы мелких подразделов одним запросом'
     }
     
-    def __init__(self, session_manager):
+    def __init__(self, session_manager, retriever=None, registry=None):
         """
         Инициализация фабрики промптов.
         
         Args:
             session_manager: Экземпляр SessionManager
+            retriever: Поиск по локальным материалам (LocalRetriever) или None
+            registry: Реестр шаблонов промптов (по умолчанию общий реестр из конфига)
         """
         self.session = session_manager
+        self.retriever = retriever
+        self.registry = registry or get_registry()
+        # Найденные справочные материалы по разделам (поиск выполняется один раз)
+        self._references = {}
     
+    @property
+    def prompt_version(self):
+        """Версия шаблонов промпта текущего режима (входит в ключи кэша)."""
+        mode = self.session.generation_mode
+        return self.registry.version('section_system', f'section_instruction_{mode}', f'section_user_{mode}')
+    
+    def get_references(self, target_section=None):
+        """
+        Справочные материалы из локального индекса для раздела.
+        
+        Args:
+            target_section: Название раздела (None для режима 'full')
+        
+        Returns:
+            str: Найденные фрагменты или пустая строка
+        """
+        if self.retriever is None:
+            return ""
+        if target_section not in self._references:
+            query = f"{target_section or self.session.lesson_structure} {getattr(self.session, 'lesson_title', '')}"
+            self._references[target_section] = self.retriever.get_context(query) or ""
+        return self._references[target_section]
+    
+    @profile_stage('get_prompt')
     def get_prompt(self, target_section=None):
         """
         Возвращает system_prompt и user_prompt для заданного раздела.
@@ -36,52 +71,36 @@ class PromptFactory:
         
         if mode not in self.MODES:
             raise ValueError(f"Неизвестный режим: {mode}. Допустимо: {list(self.MODES.keys())}")
-        
-        # Базовый system_prompt
-        base_system = """Ты — опытный создатель уроков по теме занятия для Google Colab.
-Твоя задача — создать качественный, практический и понятный материал.
-
-ВАЖНЫЕ ПРАВИЛА:
-1. ВСЕГДА создавай подробные комментарии к каждой строке кода.
-2. Код на Python размещай ТОЛЬКО в ячейках типа "code".
-3. Вывод должен быть ТОЛЬКО в виде валидного JSON для .ipynb файла.
-
-КОНТЕКСТ УРОКА:
-{context}
-
-СТРУКТУРА ВСЕГО ЗАНЯТИЯ:
-{structure}
-
-{instruction}"""
+        if mode != 'full' and not target_section:
+            raise ValueError(f"Для режима '{mode}' необходимо указать target_section")
         
         # Подготавливаем контекст (ограничиваем длину)
         context = self.session.summarized_dialog[:800] + ("..." if len(self.session.summarized_dialog) > 800 else "")
         structure = self.session.lesson_structure[:400] + ("..." if len(self.session.lesson_structure) > 400 else "")
         
-        # Инструкция в зависимости от режима
-        if mode == 'full':
-            instruction = "ИНСТРУКЦИЯ: Сгенерируй ВЕСЬ материал занятия одним JSON-объектом. Включи все разделы из структуры выше."
-            user_prompt = "Сгенерируй полный Jupyter Notebook для всего занятия, включая все разделы из структуры."
-            
-        elif mode == 'sections':
-            if not target_section:
-                raise ValueError("Для режима 'sections' необходимо указать target_section")
-            
-            instruction = f"ИНСТРУКЦИЯ: Сгенерируй материал ТОЛЬКО для РАЗДЕЛА: '{target_section}'. Не затрагивай другие разделы."
-            user_prompt = f"Сгенерируй материал для раздела: '{target_section}'."
-            
-        elif mode == 'subsections':
-            if not target_section:
-                raise ValueError("Для режима 'subsections' необходимо указать target_section")
-            
-            instruction = f"ИНСТРУКЦИЯ: Сгенерируй материал ТОЛЬКО для ПОДРАЗДЕЛА: '{target_section}'. Будь максимально детальным."
-            user_prompt = f"Сгенерируй детализированный материал для подраздела: '{target_section}'."
+        # Контекст курса идет сразу после общих правил: у всех занятий курса
+        # начало system_prompt совпадает, что позволяет кэшировать префикс промпта
+        course_context = getattr(self.session, 'course_context', '')
+        course_block = f"\nКОНТЕКСТ КУРСА:\n{course_context}\n" if course_context else ""
+        
+        # Инструкция и запрос пользователя берутся из шаблонов режима
+        instruction = self.registry.render(f'section_instruction_{mode}', target=target_section)
+        user_prompt = self.registry.render(f'section_user_{mode}', target=target_section)
+        
+        # Справочные материалы из локального индекса (RAG)
+        references_block = ""
+        references = self.get_references(target_section)
+        if references:
+            references_block = f"\nСПРАВОЧНЫЕ МАТЕРИАЛЫ (используй как источник фактов):\n{references}\n"
         
         # Собираем финальный промпт
-        system_prompt = base_system.format(
+        system_prompt = self.registry.render(
+            'section_system',
+            course_block=course_block,
             context=context,
             structure=structure,
+            references_block=references_block,
             instruction=instruction
         )
         
-        return system_prompt, user_prompt
\ No newline at end of file
+        return system_prompt, user_prompt
@@ -0,0 +1,233 @@
+"""
+Реестр шаблонов промптов.
+
+Шаблоны хранятся в файлах prompts/<специалист>/<имя>.txt, переменные
+записываются как ${имя}. Специалист может переопределять только часть
+шаблонов: недостающие берутся из prompts/default. Шаблоны разбираются и
+проверяются один раз при загрузке, подстановка сводится к склейке готовых
+фрагментов. Измененные файлы перечитываются без перезапуска, а версия
+(хеш содержимого) входит в ключи кэшей, поэтому кэши не отдают ответы
+на устаревшие промпты.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+
+# Специалист по умолчанию (полный набор шаблонов)
+DEFAULT_SPECIALIST = 'default'
+
+# Переменные шаблонов: (обязательные, необязательные)
+TEMPLATE_VARIABLES = {
+    'section_system': ({'context', 'structure', 'instruction'}, {'course_block', 'references_block'}),
+    'section_instruction_full': (set(), set()),
+    'section_user_full': (set(), set()),
+    'section_instruction_sections': ({'target'}, set()),
+    'section_user_sections': ({'target'}, set()),
+    'section_instruction_subsections': ({'target'}, set()),
+    'section_user_subsections': ({'target'}, set()),
+    'section_instruction_hybrid': ({'target'}, set()),
+    'section_user_hybrid': ({'target'}, set()),
+    'structure_system': (set(), set()),
+    'structure_user': ({'dialog'}, {'course_block'}),
+    'update_system': (set(), set()),
+    'update_user': ({'structure', 'changes'}, set()),
+    'json_continue': (set(), set()),
+    'json_fix_system': (set(), set()),
+}
+
+_VARIABLE_RE = re.compile(r'\$\{(\w+)\}')
+
+
+class PromptTemplate:
+    """
+    Разобранный шаблон: чередование текста и имен переменных.
+    """
+
+    __slots__ = ('name', 'path', 'mtime', 'version', 'variables', '_parts')
+
+    def __init__(self, name, source, path=None, mtime=None):
+        """
+        Разбирает и проверяет шаблон.
+
+        Args:
+            name: Имя шаблона
+            source: Текст шаблона
+            path: Путь к файлу шаблона
+            mtime: Время изменения файла
+
+        Raises:
+            ValueError: нет обязательной или есть неизвестная переменная
+        """
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.version = hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]
+
+        # Нечетные элементы - имена переменных, четные - текст между ними
+        self._parts = _VARIABLE_RE.split(source)
+        self.variables = set(self._parts[1::2])
+
+        required, optional = TEMPLATE_VARIABLES.get(name, (set(), None))
+        missing = required - self.variables
+        if missing:
+            raise ValueError(f"Шаблон '{name}': нет обязательных переменных {sorted(missing)}")
+        if optional is not None:
+            unknown = self.variables - required - optional
+            if unknown:
+                raise ValueError(f"Шаблон '{name}': неизвестные переменные {sorted(unknown)}")
+
+    def render(self, **values):
+        """
+        Подставляет значения переменных.
+
+        Returns:
+            str: Готовый текст промпта
+        """
+        parts = self._parts[:]
+        for i in range(1, len(parts), 2):
+            parts[i] = str(values.get(parts[i], ''))
+        return ''.join(parts)
+
+
+class PromptRegistry:
+    """
+    Набор шаблонов специалиста с горячей перезагрузкой измененных файлов.
+    """
+
+    def __init__(self, prompts_dir=None, specialist=None):
+        """
+        Загружает и проверяет все шаблоны.
+
+        Args:
+            prompts_dir: Папка шаблонов (по умолчанию из конфига)
+            specialist: Специалист (подпапка; по умолчанию из конфига)
+        """
+        import config
+
+        self.params = config.PROMPT_PARAMS
+        self.prompts_dir = prompts_dir or self.params['prompts_dir']
+        self.specialist = specialist or self.params['specialist']
+        self._templates = {}
+        self._rejected = {}
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._load_all()
+
+    def _resolve_path(self, name):
+        """Файл шаблона: у специалиста, иначе из набора по умолчанию."""
+        for specialist in (self.specialist, DEFAULT_SPECIALIST):
+            path = os.path.join(self.prompts_dir, specialist, f"{name}.txt")
+            if os.path.exists(path):
+                return path
+        raise FileNotFoundError(f"Шаблон '{name}' не найден в {self.prompts_dir}")
+
+    def _load(self, name):
+        """Читает и разбирает один шаблон."""
+        path = self._resolve_path(name)
+        mtime = os.path.getmtime(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        # Завершающий перевод строки файла не является частью промпта
+        if source.endswith('\n'):
+            source = source[:-1]
+        return PromptTemplate(name, source, path, mtime)
+
+    def _load_all(self):
+        """Загружает все известные шаблоны (ошибки выявляются при старте)."""
+        names = set(TEMPLATE_VARIABLES)
+        specialist_dir = os.path.join(self.prompts_dir, self.specialist)
+        if os.path.isdir(specialist_dir):
+            names.update(os.path.splitext(f)[0] for f in os.listdir(specialist_dir) if f.endswith('.txt'))
+        self._templates = {name: self._load(name) for name in sorted(names)}
+        self._checked_at = time.monotonic()
+
+    def _reload_changed(self):
+        """Перечитывает шаблоны, файлы которых изменились (не чаще заданного интервала)."""
+        now = time.monotonic()
+        if now - self._checked_at < self.params['reload_interval']:
+            return
+        self._checked_at = now
+
+        for name, template in list(self._templates.items()):
+            state = None
+            try:
+                path = self._resolve_path(name)
+                state = (path, os.path.getmtime(path))
+                if state == (template.path, template.mtime) or state == self._rejected.get(name):
+                    continue
+                self._templates[name] = self._load(name)
+                self._rejected.pop(name, None)
+                print(f"🔄 Шаблон промпта '{name}' перезагружен (версия {self._templates[name].version})")
+            except Exception as e:
+                # Ошибочный шаблон не заменяет рабочий; повторно проверяется после следующего изменения файла
+                self._rejected[name] = state
+                print(f"⚠️ Шаблон '{name}' не перезагружен: {e}")
+
+    def get(self, name):
+        """
+        Возвращает разобранный шаблон.
+
+        Returns:
+            PromptTemplate: Шаблон
+        """
+        with self._lock:
+            if self.params['hot_reload']:
+                self._reload_changed()
+            template = self._templates.get(name)
+            if template is None:
+                template = self._templates[name] = self._load(name)
+            return template
+
+    def render(self, name, **values):
+        """
+        Подставляет значения в шаблон.
+
+        Returns:
+            str: Готовый текст промпта
+        """
+        return self.get(name).render(**values)
+
+    def version(self, *names):
+        """
+        Версия набора шаблонов (для ключей кэша).
+
+        Args:
+            names: Имена шаблонов (по умолчанию все)
+
+        Returns:
+            str: Хеш версий шаблонов
+        """
+        names = names or sorted(self._templates)
+        combined = '|'.join(f"{name}:{self.get(name).version}" for name in names)
+        return hashlib.sha256(combined.encode('utf-8')).hexdigest()[:12]
+
+    def specialists(self):
+        """Список доступных специалистов (подпапок с шаблонами)."""
+        return sorted(entry.name for entry in os.scandir(self.prompts_dir) if entry.is_dir())
+
+
+_REGISTRIES = {}
+_REGISTRIES_LOCK = threading.Lock()
+
+
+def get_registry(specialist=None):
+    """
+    Возвращает реестр шаблонов специалиста (загружается один раз за процесс).
+
+    Args:
+        specialist: Специалист (по умолчанию из конфига)
+
+    Returns:
+        PromptRegistry: Реестр
+    """
+    import config
+
+    specialist = specialist or config.PROMPT_PARAMS['specialist']
+    with _REGISTRIES_LOCK:
+        registry = _REGISTRIES.get(specialist)
+        if registry is None:
+            registry = _REGISTRIES[specialist] = PromptRegistry(specialist=specialist)
+        return registry
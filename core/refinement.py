@@ -0,0 +1,218 @@
+"""
+Генерация занятия в два уровня качества: быстрый черновик и фоновое улучшение.
+
+Быстрая модель параллельно пишет черновики всех разделов, и занятие
+(.lesson.jsonl и экспорт в форматы из EXPORT_PARAMS) сохраняется сразу.
+Затем в фоне более сильная модель заново генерирует разделы; каждый готовый
+раздел заменяет черновик, и файлы занятия перезаписываются атомарно (запись
+во временную папку и замена), поэтому открытый преподавателем файл всегда
+целый. Отмена прерывает и запросы, которые уже выполняются.
+"""
+
+import contextvars
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from core.lesson_generator import (
+    finish_section, get_generation_targets, lookup_section, parse_section_output, request_section
+)
+from core.mode_optimizer import resolve_auto_mode
+from core.prompt_factory import PromptFactory
+from utils.exporters import export_lesson
+from utils.lesson_format import LESSON_EXTENSION, lesson_meta, write_lesson
+from utils.log_index import log_context
+
+
+def _generate_cells(session, factory, target, index, model, temperature, cache, tier, allow_stub=True,
+                    cancel_event=None):
+    """
+    Генерирует ячейки одного раздела, не добавляя их в сессию.
+
+    Returns:
+        list: Ячейки раздела с метками уровня и модели или None (в том числе при отмене)
+    """
+    with log_context(session_id=session.session_id, section=target or "ВЕСЬ УРОК"):
+        cells = lookup_section(session, factory, target, index, model)
+        if cells is None:
+            requested_model = model
+            messages, raw_output, model = request_section(session, factory, target, index, model, cache,
+                                                          temperature=temperature, cancel_event=cancel_event)
+            # Прерванный ответ не чинится дозапросами
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            cells = finish_section(session, factory, target, index, messages, raw_output, model,
+                                   parse_section_output(raw_output), allow_stub=allow_stub,
+                                   requested_model=requested_model)
+    if cells:
+        for cell in cells:
+            cell['metadata'].setdefault('aimetodolog', {}).update(tier=tier, model=model)
+    return cells
+
+
+class RefinementJob:
+    """
+    Занятие с черновиком и фоновым улучшением разделов.
+    """
+
+    def __init__(self, session, factory, targets, lesson_path, formats=None, cache=None):
+        self.session = session
+        self.factory = factory
+        self.targets = targets
+        self.lesson_path = lesson_path
+        self.formats = formats or ['ipynb']
+        self.exported = {}
+        self.cache = cache
+        self.sections = {}
+        self.refined = 0
+        self.failed = 0
+        self.model = None
+        self._write_lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._executor = None
+
+    @property
+    def notebook_path(self):
+        """Путь к ноутбуку занятия (None, если ноутбук не экспортирован)."""
+        return self.exported.get('ipynb')
+
+    def write(self):
+        """Собирает разделы по порядку и атомарно перезаписывает занятие и его экспорты."""
+        with self._write_lock:
+            cells = [cell for index in sorted(self.sections) for cell in self.sections[index]]
+            self.session.set_cells(cells)
+
+            # Занятие и экспорты пишутся во временную папку и заменяют прежние файлы целиком
+            directory, name = os.path.split(self.lesson_path)
+            staging_dir = os.path.join(directory, f".{name}.tmp")
+            staged_path = os.path.join(staging_dir, name)
+            try:
+                write_lesson(staged_path, lesson_meta(self.session, self.model), cells)
+                for fmt, path in export_lesson(staged_path, self.formats).items():
+                    if path:
+                        target_path = os.path.join(directory, os.path.basename(path))
+                        os.replace(path, target_path)
+                        self.exported[fmt] = target_path
+                os.replace(staged_path, self.lesson_path)
+            finally:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _refine(self, index, target, params):
+        """Улучшает один раздел и заменяет его черновик."""
+        if self._cancelled.is_set():
+            return
+        cells = _generate_cells(self.session, self.factory, target, index, params['refine_model'],
+                                params['refine_temperature'], self.cache, 'refined', allow_stub=False,
+                                cancel_event=self._cancelled)
+        # Отмена или неудачное улучшение: остается черновик
+        if self._cancelled.is_set():
+            return
+        if not cells:
+            with self._write_lock:
+                self.failed += 1
+            return
+        with self._write_lock:
+            self.sections[index] = cells
+        self.write()
+        with self._write_lock:
+            self.refined += 1
+        print(f"✨ Раздел {index}/{len(self.targets)} улучшен: {target or 'ВЕСЬ УРОК'}")
+
+    def start(self):
+        """Запускает фоновое улучшение разделов (если задана отдельная сильная модель)."""
+        params = config.REFINEMENT_PARAMS
+        if not params['refine_model'] or params['refine_model'] == self.model:
+            self._done.set()
+            return
+        print(f"🔄 Улучшение разделов моделью {params['refine_model']} в фоне")
+        self._executor = ThreadPoolExecutor(max_workers=params['refine_workers'])
+        futures = []
+        for index, target in enumerate(self.targets, 1):
+            # Копия контекста сохраняет арендатора ключей и сессию для логов
+            context = contextvars.copy_context()
+            futures.append(self._executor.submit(context.run, self._refine, index, target, params))
+
+        def finish():
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    with self._write_lock:
+                        self.failed += 1
+                    print(f"❌ Ошибка улучшения раздела: {e}")
+            # Все разделы улучшены: занятие помечается сильной моделью
+            if self.refined == len(self.targets):
+                self.model = params['refine_model']
+                self.write()
+            self._executor.shutdown()
+            self._done.set()
+
+        threading.Thread(target=finish, name="refinement", daemon=True).start()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Ждет завершения улучшения.
+
+        Returns:
+            bool: Завершено ли улучшение
+        """
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        """
+        Отменяет улучшение: идущие запросы прерываются, оставшиеся разделы
+        не запрашиваются (готовые замены сохраняются).
+        """
+        self._cancelled.set()
+
+
+def generate_tiered(session, name, output_dir=None, cache=None, retriever=None):
+    """
+    Генерирует черновик занятия быстрой моделью, сохраняет его и запускает
+    фоновое улучшение разделов сильной моделью.
+
+    Args:
+        session: Экземпляр SessionManager с заполненной структурой
+        name: Имя файлов занятия (без расширения)
+        output_dir: Папка результатов (по умолчанию папка сессии)
+        cache: Общий кэш ответов LLM (опционально)
+        retriever: Поиск по локальным материалам (опционально)
+
+    Returns:
+        RefinementJob: Занятие с путями файлов и фоновым улучшением
+    """
+    params = config.REFINEMENT_PARAMS
+    formats = ['ipynb'] + [fmt for fmt in config.EXPORT_PARAMS['formats'] if fmt != 'ipynb']
+    output_dir = output_dir or session.output_dir
+    resolve_auto_mode(session, params['draft_model'])
+
+    factory = PromptFactory(session, retriever=retriever)
+    targets = get_generation_targets(session)
+    job = RefinementJob(session, factory, targets, os.path.join(output_dir, f"{name}{LESSON_EXTENSION}"),
+                        formats, cache)
+
+    start_time = time.time()
+    print(f"📝 Черновик: {len(targets)} разделов моделью {params['draft_model']}")
+    with ThreadPoolExecutor(max_workers=params['draft_workers']) as executor:
+        futures = {}
+        for index, target in enumerate(targets, 1):
+            context = contextvars.copy_context()
+            futures[index] = executor.submit(context.run, _generate_cells, session, factory, target, index,
+                                             params['draft_model'], params['draft_temperature'], cache, 'draft')
+        for index, future in futures.items():
+            job.sections[index] = future.result() or []
+
+    job.model = params['draft_model']
+    job.write()
+    print(f"⚡ Черновик готов за {time.time() - start_time:.2f} сек.: {job.notebook_path}")
+
+    job.start()
+    return job
@@ -0,0 +1,248 @@
+"""
+Хранилище готовых разделов занятий в SQLite.
+
+Каждый успешно сгенерированный раздел сохраняется с ключом из темы, уровня,
+названия раздела, режима, модели, версии шаблонов промптов, хеша структуры
+занятия, хеша найденных справочных материалов и хеша контекста занятия
+(ответы преподавателя и контекст курса). Перед запросом к LLM раздел
+ищется по точному совпадению ключа, поэтому повторная генерация курса для
+новой группы не повторяет запросы для неизмененных разделов. Индекс по теме,
+уровню, разделу, модели и версии промптов позволяет просматривать разделы.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    key TEXT PRIMARY KEY,
+    topic TEXT,
+    level TEXT,
+    section TEXT,
+    generation_mode TEXT,
+    model TEXT,
+    prompt_version TEXT,
+    outline_hash TEXT,
+    cells TEXT NOT NULL,
+    created_at REAL,
+    last_used REAL,
+    hits INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_sections_outline ON sections(topic, level, section, model, prompt_version);
+CREATE INDEX IF NOT EXISTS idx_sections_last_used ON sections(last_used);
+"""
+
+
+class SectionStore:
+    """
+    Постоянное хранилище ячеек разделов с поиском по точному ключу.
+    """
+
+    def __init__(self, db_file=None):
+        """
+        Args:
+            db_file: Путь к базе (по умолчанию из конфига)
+        """
+        import config
+
+        self.db_file = db_file or config.SECTION_STORE_PARAMS['db_file']
+        os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+        # WAL: параллельные процессы (курсы, пакеты заявок) читают во время записи
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+        # Базы, созданные до появления хеша структуры
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(sections)")]
+        if 'outline_hash' not in columns:
+            self._connection.execute("ALTER TABLE sections ADD COLUMN outline_hash TEXT")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def outline_fields(session, target):
+        """
+        Поля индекса раздела по сессии.
+
+        Returns:
+            dict: topic, level, section, generation_mode
+        """
+        answers = getattr(session, 'answers', None)
+        return {
+            "topic": answers.topic if answers is not None else session.lesson_title,
+            "level": answers.level if answers is not None else "",
+            "section": target or "ВЕСЬ УРОК",
+            "generation_mode": session.generation_mode,
+        }
+
+    @staticmethod
+    def outline_hash(session, target):
+        """
+        Хеш структуры занятия и раздела: структура входит в промпт раздела,
+        поэтому после ее изменения раздел генерируется заново.
+
+        Returns:
+            str: SHA-256 структуры и раздела
+        """
+        payload = json.dumps([session.lesson_structure, target], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def make_key(session, target, model, prompt_version, references=""):
+        """
+        Ключ раздела: поля индекса, модель, версия промптов, хеши структуры
+        занятия и справочных материалов, контекст занятия (ответы и контекст
+        курса) - все, что входит в промпт раздела.
+
+        Args:
+            session: Сессия
+            target: Раздел (None для режима 'full')
+            model: Модель
+            prompt_version: Версия шаблонов промптов
+            references: Справочные материалы, найденные для раздела
+
+        Returns:
+            str: SHA-256 ключа
+        """
+        payload = json.dumps([
+            SectionStore.outline_fields(session, target),
+            model,
+            prompt_version,
+            SectionStore.outline_hash(session, target),
+            hashlib.sha256((references or "").encode('utf-8')).hexdigest(),
+            session.summarized_dialog,
+            session.course_context,
+        ], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Возвращает ячейки раздела по ключу.
+
+        Returns:
+            list: Словари ячеек nbformat или None
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT cells FROM sections WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._connection:
+                self._connection.execute("UPDATE sections SET hits = hits + 1, last_used = ? WHERE key = ?",
+                                         (time.time(), key))
+
+        cells = []
+        for cell_type, source, *metadata in json.loads(row[0]):
+            cell = {"cell_type": cell_type, "metadata": metadata[0] if metadata else {},
+                    "source": source.splitlines(keepends=True)}
+            if cell_type == 'code':
+                cell["execution_count"] = None
+                cell["outputs"] = []
+            cells.append(cell)
+        return cells
+
+    def put(self, key, cells, session, target, model, prompt_version):
+        """
+        Сохраняет ячейки раздела (сериализуются сразу, до изменения метаданных).
+
+        Args:
+            key: Ключ раздела (make_key)
+            cells: Проверенные ячейки (словари nbformat)
+            session: Сессия (для полей индекса)
+            target: Раздел (None для режима 'full')
+            model: Модель, сгенерировавшая раздел
+            prompt_version: Версия шаблонов промптов
+        """
+        rows = []
+        for cell in cells:
+            source = cell.get('source', '')
+            row = [cell['cell_type'], source if isinstance(source, str) else ''.join(source)]
+            if cell.get('metadata'):
+                row.append(cell['metadata'])
+            rows.append(row)
+
+        fields = self.outline_fields(session, target)
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sections (key, topic, level, section, generation_mode, model, "
+                "prompt_version, outline_hash, cells, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, fields['topic'], fields['level'], fields['section'], fields['generation_mode'],
+                 model, prompt_version, self.outline_hash(session, target),
+                 json.dumps(rows, ensure_ascii=False, separators=(',', ':')), now, now)
+            )
+
+    def find(self, topic=None, level=None, section=None, model=None, prompt_version=None,
+             outline_hash=None, limit=50):
+        """
+        Ищет разделы по полям индекса.
+
+        Returns:
+            list: Словари с полями индекса, числом использований и временем создания
+        """
+        conditions = []
+        params = []
+        for column, value in (('topic', topic), ('level', level), ('section', section),
+                              ('model', model), ('prompt_version', prompt_version),
+                              ('outline_hash', outline_hash)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._lock:
+            cursor = self._connection.execute(
+                f"SELECT key, topic, level, section, generation_mode, model, prompt_version, outline_hash, "
+                f"hits, created_at "
+                f"FROM sections {where} ORDER BY created_at DESC LIMIT ?", params + [limit]
+            )
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def prune(self, older_than_days):
+        """
+        Удаляет разделы, не использовавшиеся заданное число дней.
+
+        Returns:
+            int: Количество удаленных разделов
+        """
+        with self._lock, self._connection:
+            cursor = self._connection.execute("DELETE FROM sections WHERE last_used < ?",
+                                              (time.time() - older_than_days * 86400,))
+            return cursor.rowcount
+
+    def close(self):
+        """Закрывает соединение с базой."""
+        with self._lock:
+            self._connection.close()
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_section_store():
+    """
+    Возвращает общее хранилище разделов процесса.
+
+    Returns:
+        SectionStore: Хранилище или None, если оно выключено в конфиге или
+            активен демо-режим (шаблонные ответы не должны попадать в хранилище)
+    """
+    import config
+
+    global _STORE
+    is_demo_mode = (config.DEMO_LOCAL or config.DEMO_LOCAL_LLM or
+                    config.DEMO_BIG_LLM or config.DEMO_BIG_LLM_REAL)
+    if not config.SECTION_STORE_PARAMS['enabled'] or is_demo_mode:
+        return None
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = SectionStore()
+        return _STORE
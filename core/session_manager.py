@@ -6,27 +6,37 @@ import json
 import os
 from datetime import datetime
 
+from core.cell import Cell
+
 class SessionManager:
     """
     Управляет состоянием сессии: диалог, структура, ячейки.
     """
     
-    def __init__(self, generation_mode=None):
+    def __init__(self, generation_mode=None, course_context="", log_prefix=""):
         """
         Инициализация менеджера сессии.
         
         Args:
-            generation_mode: Режим генерации (full/sections/subsections)
+            generation_mode: Режим генерации (full/sections/subsections/hybrid/auto)
+            course_context: Общий контекст курса (одинаковый для всех занятий курса)
+            log_prefix: Префикс имен лог-файлов (для параллельных сессий)
         """
         import config
         
         # Основные данные
         self.summarized_dialog = ""
+        self.answers = None  # Ответы преподавателя (LessonAnswers), если заданы формой
         self.lesson_structure = ""
+        self.course_context = course_context
+        self.lesson_title = ""
+        self.log_prefix = log_prefix
         self.generation_mode = generation_mode or config.DEFAULT_GENERATION_MODE
+        self.generation_plan = None  # План генерации, выбранный в режиме 'auto'
         
-        # Накопленные ячейки
+        # Накопленные ячейки (компактные объекты Cell) и счетчики по типам
         self.cells = []
+        self.cell_type_counts = {}
         
         # Директории
         self.output_dir = config.OUTPUT_DIR
@@ -42,17 +52,44 @@ class SessionManager:
         
         Args:
             new_cells: Список или словарь с ячейками
+
+        Returns:
+            dict: Количество добавленных ячеек по типам
         """
-        if isinstance(new_cells, list):
-            self.cells.extend(new_cells)
-            print(f"📝 Добавлено {len(new_cells)} ячеек. Всего: {len(self.cells)}")
-        elif isinstance(new_cells, dict):
-            self.cells.append(new_cells)
+        if isinstance(new_cells, (dict, Cell)):
+            new_cells = [new_cells]
+        elif not isinstance(new_cells, list):
+            return {}
+
+        added_counts = {}
+        for raw_cell in new_cells:
+            cell = Cell.from_dict(raw_cell)
+            self.cells.append(cell)
+            added_counts[cell.cell_type] = added_counts.get(cell.cell_type, 0) + 1
+            self.cell_type_counts[cell.cell_type] = self.cell_type_counts.get(cell.cell_type, 0) + 1
+
+        if len(new_cells) == 1:
             print(f"📝 Добавлена 1 ячейка. Всего: {len(self.cells)}")
+        else:
+            print(f"📝 Добавлено {len(new_cells)} ячеек. Всего: {len(self.cells)}")
+        return added_counts
+    
+    def set_cells(self, cells):
+        """
+        Заменяет все ячейки сессии (без вывода; используется при замене разделов).
+
+        Args:
+            cells: Список ячеек (Cell или словари nbformat)
+        """
+        self.cells = [Cell.from_dict(cell) for cell in cells]
+        self.cell_type_counts = {}
+        for cell in self.cells:
+            self.cell_type_counts[cell.cell_type] = self.cell_type_counts.get(cell.cell_type, 0) + 1
     
     def clear_cells(self):
         """Очищает все ячейки."""
         self.cells = []
+        self.cell_type_counts = {}
         print("🗑️  Все ячейки очищены")
     
     def save_session(self, filename=None):
@@ -69,9 +106,12 @@ class SessionManager:
             "session_id": self.session_id,
             "created_at": self.created_at.isoformat(),
             "generation_mode": self.generation_mode,
+            "generation_plan": self.generation_plan,
             "summarized_dialog": self.summarized_dialog,
+            "answers": self.answers.to_dict() if self.answers is not None else None,
             "lesson_structure": self.lesson_structure,
-            "cells_count": len(self.cells)
+            "cells_count": len(self.cells),
+            "cell_type_counts": dict(self.cell_type_counts)
         }
         
         os.makedirs(self.output_dir, exist_ok=True)
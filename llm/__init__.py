@@ -2,5 +2,12 @@
 
 from . import client
 from . import output_processor
+from . import response_cache
+from . import token_stats
+from . import ledger
+from . import key_pool
+from . import circuit_breaker
+from . import hedging
+from . import response_corpus
 
-__all__ = ['client', 'output_processor']
+__all__ = ['client', 'output_processor', 'response_cache', 'token_stats', 'ledger', 'key_pool', 'circuit_breaker', 'hedging', 'response_corpus']
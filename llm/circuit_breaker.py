@@ -0,0 +1,255 @@
+"""
+Автоматические выключатели (circuit breaker) и состояние моделей.
+
+После нескольких подряд сбоев модели (таймаут, ошибка соединения, ошибка
+сервера 5xx) цепь модели размыкается: запросы к ней не отправляются и сразу
+переводятся на резервную модель или завершаются ошибкой, а не ждут полный
+таймаут. По истечении паузы один пробный запрос проверяет модель
+(полуоткрытое состояние): успех замыкает цепь, сбой размыкает ее снова
+с удвоенной паузой, а ошибка, не связанная с моделью (квота, отмена),
+освобождает пробу без изменения паузы. Состояние хранится в SQLite и общее для всех процессов,
+использующих тот же файл (параллельные пакеты, воркеры).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from openai import APIConnectionError, APIStatusError
+
+# Состояния цепи
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS breakers (
+    model TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'closed',
+    failures INTEGER NOT NULL DEFAULT 0,
+    open_seconds REAL NOT NULL DEFAULT 0,
+    open_until REAL NOT NULL DEFAULT 0,
+    probe_until REAL NOT NULL DEFAULT 0,
+    total_failures INTEGER NOT NULL DEFAULT 0,
+    total_successes INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL
+);
+"""
+
+
+class CircuitOpenError(Exception):
+    """Цепь модели разомкнута, и резервной модели нет."""
+
+
+def is_model_failure(error):
+    """
+    Проверяет, говорит ли ошибка о неисправности модели или провайдера
+    (таймаут, соединение, 408, 5xx). Ошибки ключей, квот и параметров
+    запроса (4xx) цепь не размыкают.
+    """
+    if isinstance(error, APIStatusError):
+        status = getattr(error, 'status_code', None)
+        return status == 408 or (status is not None and status >= 500)
+    return isinstance(error, (APIConnectionError, TimeoutError))
+
+
+class CircuitBreakers:
+    """
+    Выключатели всех моделей с общим состоянием в SQLite.
+    """
+
+    def __init__(self, db_file=None):
+        """
+        Args:
+            db_file: Путь к базе состояния (по умолчанию из конфига)
+        """
+        import config
+
+        self.db_file = db_file or config.CIRCUIT_BREAKER_PARAMS['db_file']
+        os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        # Транзакции задаются явно (BEGIN IMMEDIATE): переходы состояния атомарны между процессами
+        self._connection = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False,
+                                           isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+
+    def _transaction(self, model, update):
+        """
+        Читает состояние модели и применяет изменение в одной транзакции.
+
+        Args:
+            model: Модель
+            update: Функция (строка состояния) -> (новые значения или None, результат)
+
+        Returns:
+            Результат update
+        """
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute("INSERT OR IGNORE INTO breakers (model, updated_at) VALUES (?, ?)",
+                                   (model, time.time()))
+                cursor = connection.execute("SELECT * FROM breakers WHERE model = ?", (model,))
+                row = dict(zip([description[0] for description in cursor.description], cursor.fetchone()))
+                values, result = update(row)
+                if values:
+                    values['updated_at'] = time.time()
+                    assignments = ', '.join(f"{column} = ?" for column in values)
+                    connection.execute(f"UPDATE breakers SET {assignments} WHERE model = ?",
+                                       list(values.values()) + [model])
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return result
+
+    def allow(self, model):
+        """
+        Разрешает ли цепь запрос к модели. Для разомкнутой цепи после паузы
+        разрешается один пробный запрос (остальные получают отказ, пока проба идет).
+
+        Returns:
+            bool: Можно ли отправить запрос
+        """
+        params = _params()
+
+        def update(row):
+            now = time.time()
+            if row['state'] == CLOSED:
+                return None, True
+            if row['state'] == OPEN and now < row['open_until']:
+                return None, False
+            if row['state'] == HALF_OPEN and now < row['probe_until']:
+                return None, False
+            # Пауза истекла или пробный запрос завис: выдаем новую пробу
+            return {'state': HALF_OPEN, 'probe_until': now + params['probe_timeout']}, True
+
+        return self._transaction(model, update)
+
+    def is_available(self, model):
+        """Проверяет без выдачи пробы, не разомкнута ли цепь модели."""
+        with self._lock:
+            row = self._connection.execute("SELECT state, open_until FROM breakers WHERE model = ?",
+                                           (model,)).fetchone()
+        return row is None or row[0] == CLOSED or (row[0] == OPEN and time.time() >= row[1])
+
+    def record_success(self, model):
+        """Успешный ответ замыкает цепь."""
+        def update(row):
+            if row['state'] != CLOSED:
+                print(f"✅ Модель {model} снова отвечает, цепь замкнута")
+            return {'state': CLOSED, 'failures': 0, 'open_seconds': 0,
+                    'total_successes': row['total_successes'] + 1}, None
+
+        self._transaction(model, update)
+
+    def record_failure(self, model, error=None):
+        """
+        Сбой модели: после порога подряд идущих сбоев или при неудачной пробе
+        цепь размыкается (пауза удваивается до максимума).
+        """
+        params = _params()
+
+        def update(row):
+            now = time.time()
+            values = {'failures': row['failures'] + 1, 'total_failures': row['total_failures'] + 1,
+                      'last_error': f"{type(error).__name__}: {error}"[:300] if error else None}
+            if row['state'] == OPEN:
+                # Запрос, отправленный до размыкания: пауза не продлевается
+                return values, None
+            if row['state'] == HALF_OPEN or values['failures'] >= params['failure_threshold']:
+                open_seconds = (min(row['open_seconds'] * 2, params['max_open_seconds'])
+                                if row['state'] == HALF_OPEN else params['open_seconds'])
+                values.update(state=OPEN, open_seconds=open_seconds, open_until=now + open_seconds)
+                print(f"⚡ Цепь модели {model} разомкнута на {open_seconds:.0f} сек. "
+                      f"(сбоев подряд: {values['failures']})")
+            return values, None
+
+        self._transaction(model, update)
+
+    def release(self, model):
+        """
+        Освобождает пробу, завершившуюся ошибкой не по вине модели (квота ключа,
+        отмена запроса): следующий запрос сразу получает новую пробу, а не ждет
+        probe_timeout. Для замкнутой цепи ничего не меняется.
+        """
+        def update(row):
+            if row['state'] != HALF_OPEN:
+                return None, None
+            return {'state': OPEN, 'open_until': time.time(), 'probe_until': 0}, None
+
+        self._transaction(model, update)
+
+    def route(self, model):
+        """
+        Модель для запроса: исходная, если цепь замкнута, иначе резервная.
+        Бесплатная модель (в том числе выбранная при исчерпании бюджета)
+        заменяется только бесплатной: резерв не должен тратить деньги незаметно.
+
+        Raises:
+            CircuitOpenError: цепь разомкнута и резервной модели нет
+        """
+        import config
+        from llm.ledger import CostLedger
+
+        if self.allow(model):
+            return model
+        params = _params()
+        if params['reroute']:
+            free_only = CostLedger.is_free(model)
+            for alternate in params['fallbacks'] or config.AVAILABLE_MODELS.values():
+                if alternate == model or (free_only and not CostLedger.is_free(alternate)):
+                    continue
+                if self.allow(alternate):
+                    print(f"⚡ Модель {model} недоступна, запрос направлен на {alternate}")
+                    return alternate
+        raise CircuitOpenError(f"модель {model} недоступна (цепь разомкнута)")
+
+    def status(self):
+        """
+        Состояние цепей всех моделей.
+
+        Returns:
+            list: Словари по моделям (state, failures, open_until, total_*, last_error)
+        """
+        with self._lock:
+            cursor = self._connection.execute("SELECT * FROM breakers ORDER BY model")
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def reset(self, model=None):
+        """Замыкает цепь модели (или всех моделей)."""
+        with self._lock:
+            if model is None:
+                self._connection.execute("DELETE FROM breakers")
+            else:
+                self._connection.execute("DELETE FROM breakers WHERE model = ?", (model,))
+
+
+def _params():
+    import config
+    return config.CIRCUIT_BREAKER_PARAMS
+
+
+_BREAKERS = None
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breakers():
+    """
+    Возвращает общие выключатели процесса.
+
+    Returns:
+        CircuitBreakers: Выключатели или None, если они выключены в конфиге
+    """
+    global _BREAKERS
+    if not _params()['enabled']:
+        return None
+    with _BREAKERS_LOCK:
+        if _BREAKERS is None:
+            _BREAKERS = CircuitBreakers()
+        return _BREAKERS
@@ -5,10 +5,20 @@
 import os
 import time
 import json
+import threading
 from datetime import datetime
+from types import SimpleNamespace
 from openai import OpenAI
 from openai import APIConnectionError, APIError, RateLimitError, AuthenticationError, APIStatusError
+from llm.circuit_breaker import CircuitOpenError, get_breakers, is_model_failure
+from llm.key_pool import NoAvailableKeyError, current_tenant, get_key_pool
+from llm.ledger import BudgetExceededError, get_ledger
+from llm.response_cache import ResponseCache
+from llm.response_corpus import record_response, replay_response
+from utils.log_index import current_context
+from utils.profiling import profile_stage
 
+@profile_stage('log_to_file')
 def log_to_file(content, prefix="log", log_dir=None):
     """
     Логирует содержимое в файл для отладки.
@@ -26,20 +36,196 @@ def log_to_file(content, prefix="log", log_dir=None):
     try:
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(str(content))
+        
+        # Регистрируем лог в индексе (сессия и раздел берутся из log_context)
+        from utils.log_index import register_log
+        register_log(filename, prefix)
         return filename
     except Exception as e:
         print(f"⚠️ Ошибка записи лога: {e}")
         return None
 
-def get_llm_response(messages, model=None, temperature=0.7, max_tokens=4000):
+# Запрос продолжения ответа, оборванного по лимиту токенов
+CONTINUE_PROMPT = "Продолжи ответ ровно с места обрыва. Не повторяй уже написанный текст и не добавляй пояснений."
+
+# Пул клиентов: один клиент OpenAI (и его пул HTTP-соединений) на API ключ,
+# общий для всех потоков и сессий процесса
+_CLIENT_POOL = {}
+_CLIENT_POOL_LOCK = threading.Lock()
+
+def get_openai_client(api_key):
+    """
+    Возвращает клиент OpenAI для ключа, создавая его при первом обращении.
+    
+    Args:
+        api_key: API ключ OpenRouter
+    
+    Returns:
+        OpenAI: Переиспользуемый клиент
+    """
+    with _CLIENT_POOL_LOCK:
+        client = _CLIENT_POOL.get(api_key)
+        if client is None:
+            import config
+            
+            # Инициализация клиента с конфигурацией из config.py
+            client_config = config.OPENROUTER_CONFIG.copy()
+            client_config['api_key'] = api_key
+            # Удаляем proxies, если он присутствует (вызывает ошибку в openai 1.12.0)
+            client_config.pop('proxies', None)
+            
+            client = OpenAI(**client_config)
+            _CLIENT_POOL[api_key] = client
+        return client
+
+class RequestCancelledError(Exception):
+    """Запрос прерван по сигналу отмены (например, проигравший хеджированный запрос)."""
+
+    def __init__(self, completion_tokens=0):
+        super().__init__("запрос прерван")
+        self.completion_tokens = completion_tokens
+
+def _create_completion(client, cancel_event=None, **request):
+    """
+    Отправляет запрос к модели.
+    
+    При заданном cancel_event ответ читается потоком, и соединение закрывается,
+    как только событие установлено: оплачиваются только уже сгенерированные токены.
+    
+    Returns:
+        Объект ответа (choices[0].message.content, choices[0].finish_reason, usage)
+    """
+    if cancel_event is None:
+        return client.chat.completions.create(stream=False, **request)
+    
+    if cancel_event.is_set():
+        raise RequestCancelledError()
+    
+    stream = client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **request)
+    parts = []
+    finish_reason = None
+    usage = None
+    try:
+        for chunk in stream:
+            if cancel_event.is_set():
+                raise RequestCancelledError(len(''.join(parts)) // 4)
+            if getattr(chunk, 'usage', None):
+                usage = chunk.usage
+            if chunk.choices:
+                choice = chunk.choices[0]
+                if choice.delta and choice.delta.content:
+                    parts.append(choice.delta.content)
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+    finally:
+        stream.close()
+    
+    message = SimpleNamespace(content=''.join(parts))
+    return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=usage)
+
+def _pooled_completion(cancel_event=None, **request):
+    """
+    Отправляет запрос с ключом из пула (наименее загруженный ключ арендатора).
+
+    Ключ с ошибкой аутентификации отключается, с ошибкой квоты - уходит
+    в карантин; запрос повторяется с другим ключом, пока они есть.
+
+    Returns:
+        Объект ответа (как у _create_completion)
+    """
+    pool = get_key_pool()
+    if not len(pool):
+        raise ValueError("API ключ OpenRouter не установлен. Проверьте файл .env или переменные окружения.")
+    tenant = current_tenant()
+
+    breakers = get_breakers()
+
+    for attempt in range(len(pool)):
+        try:
+            key = pool.acquire(tenant)
+        except Exception:
+            # Запрос не отправлен: пробная попытка модели освобождается
+            if breakers is not None:
+                breakers.release(request['model'])
+            raise
+        try:
+            response = _create_completion(get_openai_client(key.api_key), cancel_event, **request)
+        except Exception as e:
+            pool.release(key, error=e)
+            retry = pool.is_key_error(e) and attempt + 1 < len(pool)
+            # Таймауты и ошибки сервера учитываются выключателем модели; другие
+            # ошибки (квота, отмена) освобождают пробную попытку разомкнутой цепи
+            if breakers is not None and is_model_failure(e):
+                breakers.record_failure(request['model'], e)
+            elif breakers is not None and not retry:
+                breakers.release(request['model'])
+            if not retry:
+                raise
+            print(f"🔑 Ключ {key.name} не принят ({type(e).__name__}), повтор с другим ключом")
+            continue
+        pool.release(key)
+        if breakers is not None:
+            breakers.record_success(request['model'])
+        return response
+
+# Модели, отклонившие response_format во время работы (дальше получают обычный запрос)
+_REJECTED_FORMATS = set()
+
+def structured_output_mode(model):
+    """
+    Режим структурированного вывода модели по таблице возможностей.
+
+    Returns:
+        str: 'json_schema', 'json_object' или None (только текст)
+    """
+    import config
+    if model in _REJECTED_FORMATS:
+        return None
+    return config.MODEL_CAPABILITIES.get(model, {}).get('structured_output')
+
+def _names_response_format(error):
+    """Проверяет, что ошибка запроса относится к параметру response_format."""
+    details = f"{getattr(error, 'message', '')} {getattr(error, 'body', '')} {error}".lower()
+    return any(marker in details for marker in ('response_format', 'json_schema', 'structured output'))
+
+def _response_format(model, response_schema):
+    """
+    Параметр response_format для модели или None, если модель его не поддерживает.
+
+    Args:
+        model: Имя модели
+        response_schema: Именованная JSON-схема {"name": ..., "schema": ...}
+    """
+    if response_schema is None:
+        return None
+    mode = structured_output_mode(model)
+    if mode == 'json_schema':
+        return {"type": "json_schema", "json_schema": {"name": response_schema['name'], "strict": True,
+                                                       "schema": response_schema['schema']}}
+    if mode == 'json_object':
+        return {"type": "json_object"}
+    return None
+
+@profile_stage('get_llm_response')
+def get_llm_response(messages, model=None, temperature=0.7, max_tokens=4000, cache=None, kind=None,
+                     cancel_event=None, prompt_version=None, response_schema=None):
     """
     Отправляет запрос к LLM через OpenRouter.
     
+    Если ответ оборван по лимиту токенов (finish_reason == "length"),
+    автоматически запрашивается продолжение, которое дописывается к ответу.
+    
     Args:
         messages: Список сообщений в формате OpenAI
         model: Имя модели (если None, берется из конфига)
         temperature: Температура генерации
         max_tokens: Максимальное количество токенов
+        cache: Общий кэш ответов (ResponseCache) или None
+        kind: Вид запроса для статистики длины ответов (например, режим генерации)
+        cancel_event: threading.Event для прерывания запроса (опционально)
+        prompt_version: Версия шаблонов промпта для ключа кэша (опционально)
+        response_schema: JSON-схема ответа (опционально); если модель поддерживает
+            структурированный вывод, ответ запрашивается сразу валидным JSON
     
     Returns:
         tuple: (текст ответа, время выполнения, объект ответа или None при ошибке)
@@ -134,33 +320,99 @@ def get_llm_response(messages, model=None, temperature=0.7, max_tokens=4000):
             )
             return demo_answer, execution_time, None
         
-        # Проверяем API ключ (только для реального запроса)
-        api_key = config.OPENROUTER_API_KEY
-        if not api_key:
-            raise ValueError("API ключ OpenRouter не установлен. Проверьте файл .env или переменные окружения.")
-        
-        # Инициализация клиента с конфигурацией из config.py
-        # Убираем параметр proxies, так как он не поддерживается в текущей версии openai
-        client_config = config.OPENROUTER_CONFIG.copy()
-        client_config['api_key'] = api_key
-        # Удаляем proxies, если он присутствует (вызывает ошибку в openai 1.12.0)
-        client_config.pop('proxies', None)
-        
-        client = OpenAI(**client_config)
-        
-        # Отправка запроса
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            stream=False
-        )
+        # Ключ запроса (до понижения модели бюджетом): для кэша и корпуса ответов
+        request_key = ResponseCache.make_key(model, messages, temperature, prompt_version)
+        
+        # Воспроизведение из корпуса ответов: запросы к модели не выполняются
+        if config.CORPUS_PARAMS['replay']:
+            replayed_answer = replay_response(request_key)
+            if replayed_answer is None:
+                print("📼 Ответа на запрос нет в корпусе")
+                return json.dumps({"error": "Ответа на запрос нет в корпусе"}, ensure_ascii=False), \
+                    time.time() - start_time, None
+            print("📼 Ответ воспроизведен из корпуса")
+            return replayed_answer, time.time() - start_time, None
+        
+        # Проверяем общий кэш ответов
+        cache_key = None
+        if cache is not None:
+            cache_key = request_key
+            cached_answer = cache.get(cache_key)
+            if cached_answer is not None:
+                print("📦 Ответ взят из кэша")
+                return cached_answer, time.time() - start_time, None
+        
+        # Проверяем бюджет: при исчерпании модель понижается или запрос отменяется
+        ledger = get_ledger()
+        session_id, section = current_context()
+        model = ledger.resolve_model(model, session_id)
+        
+        # Модель с разомкнутой цепью не ждет таймаута: запрос сразу идет на резервную модель
+        # (бесплатная модель, в том числе выбранная по бюджету, заменяется только бесплатной)
+        breakers = get_breakers()
+        if breakers is not None:
+            model = breakers.route(model)
+        
+        request = dict(model=model, messages=messages, temperature=temperature, max_tokens=max_tokens)
+        response_format = _response_format(model, response_schema)
+        if response_format is not None:
+            request['response_format'] = response_format
+            # OpenRouter направляет запрос только провайдерам, поддерживающим response_format
+            request['extra_body'] = {"provider": {"require_parameters": True}}
+        
+        # Отправка запроса (ключ выбирается из пула для каждого вызова)
+        try:
+            response = _pooled_completion(cancel_event, **request)
+        except APIStatusError as e:
+            if response_format is None or getattr(e, 'status_code', None) not in (400, 404, 422):
+                raise
+            # Модель запоминается, только если ошибка называет формат; иначе один повтор без него
+            if _names_response_format(e):
+                print(f"🧩 Модель {model} не поддерживает {response_format['type']}, запрос без структурированного вывода")
+                _REJECTED_FORMATS.add(model)
+            else:
+                print(f"🧩 Запрос с {response_format['type']} отклонен ({e.status_code}), повтор без структурированного вывода")
+            request.pop('response_format')
+            request.pop('extra_body')
+            response = _pooled_completion(cancel_event, **request)
         
         # Извлекаем ответ
-        answer = response.choices[0].message.content
+        answer = response.choices[0].message.content or ""
+        completion_tokens = response.usage.completion_tokens if response.usage else 0
+        prompt_tokens = response.usage.prompt_tokens if response.usage else 0
+        
+        # Продолжаем ответ, оборванный по лимиту токенов (продолжение запрашивается
+        # без response_format: структурированный вывод начал бы новый JSON)
+        continuations = 0
+        while (response.choices[0].finish_reason == "length"
+               and continuations < config.TOKEN_LIMIT_PARAMS['max_continuations']):
+            continuations += 1
+            print(f"✂️  Ответ оборван по лимиту токенов, запрос продолжения ({continuations})")
+            response = _pooled_completion(
+                cancel_event,
+                model=model,
+                messages=messages + [
+                    {"role": "assistant", "content": answer},
+                    {"role": "user", "content": CONTINUE_PROMPT}
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            answer += response.choices[0].message.content or ""
+            completion_tokens += response.usage.completion_tokens if response.usage else 0
+            prompt_tokens += response.usage.prompt_tokens if response.usage else 0
+        
         execution_time = time.time() - start_time
         
+        # Учитываем токены и стоимость запроса
+        ledger.record(model, prompt_tokens, completion_tokens, kind=kind,
+                      session_id=session_id, section=section)
+        
+        # Запоминаем фактическую длину ответа для адаптивного max_tokens
+        if kind:
+            from llm.token_stats import record_completion
+            record_completion(model, kind, completion_tokens or len(answer) // 4, latency=execution_time)
+        
         # Логируем ответ только в демо-режимах
         if is_demo_mode:
             log_to_file(
@@ -169,11 +421,30 @@ def get_llm_response(messages, model=None, temperature=0.7, max_tokens=4000):
                 log_dir=config.LOG_DIR
             )
         
+        if cache_key is not None and answer:
+            cache.set(cache_key, answer)
+        
+        if answer:
+            record_response(request_key, model, kind, messages, answer)
+        
         return answer, execution_time, response
         
     except ValueError as e:
         error_msg = f"Ошибка конфигурации: {e}"
         print(f"❌ {error_msg}")
+    except BudgetExceededError as e:
+        error_msg = f"Запрос отменен: {e}"
+        print(f"💸 {error_msg}")
+    except CircuitOpenError as e:
+        error_msg = f"Запрос не отправлен: {e}"
+        print(f"⚡ {error_msg}")
+    except NoAvailableKeyError as e:
+        error_msg = f"Нет доступного API ключа: {e}"
+        print(f"🔑 {error_msg}")
+    except RequestCancelledError as e:
+        error_msg = "Запрос прерван"
+        # Учитываем токены, сгенерированные до прерывания
+        ledger.record(model, 0, e.completion_tokens, kind=kind, session_id=session_id, section=section)
     except AuthenticationError as e:
         error_msg = f"Ошибка аутентификации OpenRouter: {e}. Проверьте API ключ."
         print(f"❌ {error_msg}")
@@ -0,0 +1,177 @@
+"""
+Хеджированные запросы к LLM для сокращения хвостовых задержек.
+
+Если основная модель не ответила за наблюдаемый p90 своего времени ответа,
+тот же запрос дублируется на альтернативную модель. Используется первый
+валидный ответ, второй запрос прерывается. Дополнительные расходы
+ограничены долей хеджированных запросов и суммой в долларах.
+"""
+
+import contextvars
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+import config
+from llm.circuit_breaker import get_breakers
+from llm.client import get_llm_response
+from llm.ledger import CostLedger
+from llm.token_stats import latency_percentile
+
+
+class HedgeBudget:
+    """
+    Ограничение дополнительных расходов на хеджирование за процесс.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.hedges = 0
+        self.extra_cost = 0.0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        """Учитывает основной запрос."""
+        with self._lock:
+            self.requests += 1
+
+    def try_reserve(self, estimated_cost):
+        """
+        Резервирует хедж, если он укладывается в ограничения.
+
+        Args:
+            estimated_cost: Оценка стоимости хеджа сверху (в долларах)
+
+        Returns:
+            bool: Разрешен ли хедж
+        """
+        params = config.HEDGING_PARAMS
+        with self._lock:
+            if self.hedges >= math.ceil(params['max_hedge_ratio'] * self.requests):
+                return False
+            if self.extra_cost + estimated_cost > params['max_extra_cost']:
+                return False
+            self.hedges += 1
+            self.extra_cost += estimated_cost
+            return True
+
+
+_BUDGET = HedgeBudget()
+
+
+class _LinkedEvent(threading.Event):
+    """Сигнал отмены одного из дублей, срабатывающий и при отмене всего запроса."""
+
+    def __init__(self, parent=None):
+        super().__init__()
+        self.parent = parent
+
+    def is_set(self):
+        return super().is_set() or (self.parent is not None and self.parent.is_set())
+
+
+def get_hedge_delay(model):
+    """
+    Время ожидания основной модели перед хеджем: наблюдаемый перцентиль
+    времени ответа (p90 по умолчанию) в пределах минимальной и максимальной
+    задержки.
+
+    Returns:
+        float: Задержка в секундах
+    """
+    params = config.HEDGING_PARAMS
+    observed = latency_percentile(model, params['percentile'])
+    if observed is None:
+        return params['default_delay']
+    return min(params['max_delay'], max(params['min_delay'], observed))
+
+
+def _pick_alternate(model, messages, max_tokens):
+    """
+    Выбирает альтернативную модель, хедж на которую укладывается в бюджет.
+    Для бесплатной модели подходит только бесплатная альтернатива, как
+    и при переводе запроса выключателем (CircuitBreakers.route).
+
+    Returns:
+        str: Модель или None
+    """
+    prompt_tokens = sum(len(message['content']) for message in messages) // 3
+    breakers = get_breakers()
+    free_only = CostLedger.is_free(model)
+    for alternate in config.HEDGING_PARAMS['alternates'] or config.AVAILABLE_MODELS.values():
+        if alternate == model or (free_only and not CostLedger.is_free(alternate)):
+            continue
+        # Дубль на модель с разомкнутой цепью бесполезен
+        if breakers is not None and not breakers.is_available(alternate):
+            continue
+        if _BUDGET.try_reserve(CostLedger.price(alternate, prompt_tokens, max_tokens)):
+            return alternate
+    return None
+
+
+def hedged_llm_response(messages, model=None, validate=None, cancel_event=None, **kwargs):
+    """
+    Отправляет запрос с хеджированием на альтернативную модель.
+
+    Args:
+        messages: Список сообщений в формате OpenAI
+        model: Основная модель (если None, берется из конфига)
+        validate: Функция проверки ответа (True - ответ годится); по умолчанию любой ответ без ошибки
+        cancel_event: threading.Event, прерывающий основной запрос и дубль (опционально)
+        **kwargs: Параметры get_llm_response (temperature, max_tokens, cache, kind)
+
+    Returns:
+        tuple: (текст ответа, время выполнения, объект ответа, модель, давшая ответ)
+    """
+    model = model or config.DEFAULT_MODEL
+    params = config.HEDGING_PARAMS
+    if not params['enabled']:
+        answer, answer_time, response = get_llm_response(messages, model=model, cancel_event=cancel_event,
+                                                         **kwargs)
+        return answer, answer_time, response, model
+
+    validate = validate or (lambda answer: '"error":' not in answer)
+    _BUDGET.count_request()
+
+    # У каждого запроса свой сигнал отмены: проигравший прерывается
+    cancel_events = {}
+    futures = {}
+    executor = ThreadPoolExecutor(max_workers=2)
+
+    def submit(request_model):
+        cancel_events[request_model] = _LinkedEvent(cancel_event)
+        # Копия контекста сохраняет сессию и раздел для логов и учета расходов
+        context = contextvars.copy_context()
+        future = executor.submit(context.run, get_llm_response, messages, model=request_model,
+                                 cancel_event=cancel_events[request_model], **kwargs)
+        futures[future] = request_model
+
+    submit(model)
+    done, _ = wait(futures, timeout=get_hedge_delay(model))
+
+    if not done and not (cancel_event is not None and cancel_event.is_set()):
+        alternate = _pick_alternate(model, messages, kwargs.get('max_tokens', 4000))
+        if alternate is not None:
+            print(f"🔀 Модель {model} отвечает дольше обычного, дублируем запрос на {alternate}")
+            submit(alternate)
+
+    # Первый валидный ответ; если валидных нет - первый полученный
+    result = None
+    for future in as_completed(list(futures)):
+        answer, answer_time, response = future.result()
+        candidate = (answer, answer_time, response, futures[future])
+        if validate(answer):
+            result = candidate
+            break
+        if result is None:
+            result = candidate
+
+    # Прерываем оставшиеся запросы
+    for request_model, event in cancel_events.items():
+        if request_model != result[3]:
+            event.set()
+    executor.shutdown(wait=False)
+
+    if len(futures) > 1:
+        print(f"   🏁 Ответ получен от {result[3]}")
+    return result
@@ -0,0 +1,243 @@
+"""
+Пул API ключей OpenRouter с распределением нагрузки.
+
+Каждый запрос получает наименее загруженный доступный ключ (с учетом
+запросов в работе и лимита запросов в минуту). Ключ, отклоненный по
+аутентификации, отключается; ключ с ошибкой квоты уходит в карантин.
+Арендаторам (tenant) можно закрепить собственные ключи.
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import date
+
+# Текущий арендатор (свой для каждого потока/задачи)
+_tenant_var = contextvars.ContextVar('key_pool_tenant', default=None)
+
+# Коды ответа для исключений без status_code
+_STATUS_BY_ERROR = {'AuthenticationError': 401, 'PermissionDeniedError': 403, 'RateLimitError': 429}
+
+
+class NoAvailableKeyError(Exception):
+    """Нет ключа, доступного для запроса (все отключены, в карантине или исчерпали квоту)."""
+
+
+@contextmanager
+def tenant_context(tenant):
+    """
+    Задает арендатора для запросов внутри блока. Задачи asyncio и потоки,
+    запущенные с копией контекста, наследуют арендатора.
+
+    Args:
+        tenant: Имя арендатора из KEY_POOL_PARAMS['tenants']
+    """
+    token = _tenant_var.set(tenant)
+    try:
+        yield
+    finally:
+        _tenant_var.reset(token)
+
+
+def current_tenant():
+    """Текущий арендатор или арендатор по умолчанию из конфига."""
+    import config
+    return _tenant_var.get() or config.KEY_POOL_PARAMS['default_tenant']
+
+
+class KeyState:
+    """
+    Состояние ключа: нагрузка, квота и карантин.
+    """
+
+    __slots__ = ('name', 'api_key', 'in_flight', 'recent', 'day', 'day_count',
+                 'quarantined_until', 'strikes', 'disabled', 'last_used')
+
+    def __init__(self, name, api_key):
+        self.name = name
+        self.api_key = api_key
+        self.in_flight = 0
+        self.recent = deque()       # Время запросов за последнюю минуту
+        self.day = date.today()
+        self.day_count = 0
+        self.quarantined_until = 0.0
+        self.strikes = 0            # Ошибки квоты подряд (для удвоения карантина)
+        self.disabled = None        # Причина отключения
+        self.last_used = 0.0
+
+    def masked(self):
+        """Имя ключа с последними символами для логов."""
+        return f"{self.name} (...{self.api_key[-4:]})"
+
+
+class KeyPool:
+    """
+    Пул ключей с выбором наименее загруженного ключа.
+    """
+
+    def __init__(self, keys=None):
+        """
+        Args:
+            keys: Словарь {имя: ключ} (по умолчанию config.OPENROUTER_API_KEYS)
+        """
+        import config
+
+        self.params = config.KEY_POOL_PARAMS
+        self._states = {}
+        self._cond = threading.Condition()
+        self.sync(keys if keys is not None else config.OPENROUTER_API_KEYS)
+
+    def __len__(self):
+        return len(self._states)
+
+    def sync(self, keys):
+        """Добавляет новые и обновляет измененные ключи."""
+        with self._cond:
+            for name, api_key in keys.items():
+                state = self._states.get(name)
+                if api_key and (state is None or state.api_key != api_key):
+                    self._states[name] = KeyState(name, api_key)
+            self._cond.notify_all()
+
+    def _candidates(self, tenant):
+        """Ключи, закрепленные за арендатором (или все ключи)."""
+        names = self.params['tenants'].get(tenant) if tenant else None
+        if names:
+            return [self._states[name] for name in names if name in self._states]
+        return list(self._states.values())
+
+    def _usable(self, state, now):
+        """Доступен ли ключ сейчас. Возвращает (доступен, когда освободится)."""
+        if state.disabled:
+            return False, None
+        if state.quarantined_until > now:
+            return False, state.quarantined_until
+
+        if state.day != date.today():
+            state.day, state.day_count = date.today(), 0
+        per_day = self.params['requests_per_day']
+        if per_day is not None and state.day_count >= per_day:
+            return False, None
+
+        while state.recent and now - state.recent[0] >= 60:
+            state.recent.popleft()
+        if len(state.recent) >= self.params['requests_per_minute']:
+            return False, state.recent[0] + 60
+        return True, now
+
+    def acquire(self, tenant=None):
+        """
+        Выдает наименее загруженный доступный ключ, при необходимости ожидая
+        освобождения квоты.
+
+        Args:
+            tenant: Арендатор (None - все ключи)
+
+        Returns:
+            KeyState: Ключ (вернуть вызовом release)
+
+        Raises:
+            NoAvailableKeyError: нет ключей или они не освободятся за время ожидания
+        """
+        deadline = time.monotonic() + self.params['wait_timeout']
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                candidates = self._candidates(tenant)
+                if not candidates:
+                    raise NoAvailableKeyError(f"нет API ключей для арендатора {tenant!r}")
+
+                usable = []
+                wake_at = []
+                for state in candidates:
+                    ok, ready_at = self._usable(state, now)
+                    if ok:
+                        usable.append(state)
+                    elif ready_at is not None:
+                        wake_at.append(ready_at)
+
+                if usable:
+                    rpm = self.params['requests_per_minute']
+                    state = min(usable, key=lambda s: (s.in_flight + len(s.recent) / rpm, s.last_used))
+                    state.in_flight += 1
+                    state.recent.append(now)
+                    state.day_count += 1
+                    state.last_used = now
+                    return state
+
+                if not wake_at or min(wake_at) > deadline:
+                    raise NoAvailableKeyError("все API ключи отключены, в карантине или исчерпали квоту")
+                self._cond.wait(timeout=max(0.05, min(wake_at) - now))
+
+    def release(self, state, error=None):
+        """
+        Возвращает ключ в пул и учитывает ошибку запроса.
+
+        Args:
+            state: Ключ, выданный acquire
+            error: Исключение запроса (если был ошибочный ответ)
+        """
+        with self._cond:
+            state.in_flight -= 1
+            status = getattr(error, 'status_code', None) or _STATUS_BY_ERROR.get(type(error).__name__)
+
+            if status in (401, 403):
+                state.disabled = f"ошибка аутентификации ({status})"
+                print(f"🔑 Ключ {state.masked()} отключен: {state.disabled}")
+            elif status in (402, 429):
+                state.strikes += 1
+                pause = min(self.params['max_quarantine_seconds'],
+                            self.params['quarantine_seconds'] * 2 ** (state.strikes - 1))
+                state.quarantined_until = time.monotonic() + pause
+                print(f"🔑 Ключ {state.masked()} в карантине на {pause:.0f} сек. (код {status})")
+            elif error is None:
+                state.strikes = 0
+
+            self._cond.notify_all()
+
+    def is_key_error(self, error):
+        """Связана ли ошибка с ключом (аутентификация или квота)."""
+        status = getattr(error, 'status_code', None) or _STATUS_BY_ERROR.get(type(error).__name__)
+        return status in (401, 402, 403, 429)
+
+    def stats(self):
+        """
+        Состояние ключей.
+
+        Returns:
+            list: Словари с именем, нагрузкой, квотой и статусом ключей
+        """
+        now = time.monotonic()
+        with self._cond:
+            return [{
+                "name": state.masked(),
+                "in_flight": state.in_flight,
+                "last_minute": len(state.recent),
+                "today": state.day_count,
+                "status": state.disabled or ("карантин" if state.quarantined_until > now else "ok"),
+            } for state in self._states.values()]
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_key_pool():
+    """
+    Возвращает общий пул ключей процесса, синхронизированный с конфигурацией
+    (ключ, заданный через config.set_api_key, подхватывается без перезапуска).
+    """
+    import config
+
+    global _POOL
+    with _POOL_LOCK:
+        keys = dict(config.OPENROUTER_API_KEYS)
+        if config.OPENROUTER_API_KEY and config.OPENROUTER_API_KEY not in keys.values():
+            keys['OPENROUTER_API_KEY'] = config.OPENROUTER_API_KEY
+        if _POOL is None:
+            _POOL = KeyPool(keys)
+        else:
+            _POOL.sync(keys)
+        return _POOL
@@ -0,0 +1,217 @@
+"""
+Учет токенов и стоимости запросов к LLM с бюджетами на сессию, пакет и день.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+
+class BudgetExceededError(Exception):
+    """Бюджет исчерпан, а переход на резервную модель невозможен."""
+
+
+class CostLedger:
+    """
+    Журнал расходов: токены и стоимость каждого запроса.
+
+    Записи за день дописываются в cache/ledger_ГГГГММДД.jsonl, поэтому
+    дневной бюджет учитывает и предыдущие запуски.
+    """
+
+    def __init__(self, ledger_dir=None):
+        """
+        Инициализация журнала.
+
+        Args:
+            ledger_dir: Директория файлов журнала (по умолчанию CACHE_DIR)
+        """
+        import config
+
+        self.ledger_dir = ledger_dir or config.CACHE_DIR
+        self.entries = []
+        self._lock = threading.Lock()
+        self._day = None
+        self._day_cost = 0.0
+        self._load_day()
+
+    def _day_file(self, day):
+        """Путь к файлу журнала за день."""
+        return os.path.join(self.ledger_dir, f"ledger_{day}.jsonl")
+
+    def _load_day(self):
+        """Загружает сумму расходов за текущий день."""
+        self._day = datetime.now().strftime('%Y%m%d')
+        self._day_cost = 0.0
+        path = self._day_file(self._day)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        self._day_cost += json.loads(line).get('cost', 0.0)
+        except Exception as e:
+            print(f"⚠️ Ошибка чтения журнала расходов: {e}")
+
+    @staticmethod
+    def price(model, prompt_tokens, completion_tokens):
+        """
+        Считает стоимость запроса по таблице цен.
+
+        Returns:
+            float: Стоимость в долларах
+        """
+        import config
+
+        prices = config.MODEL_PRICES.get(model, {'prompt': 0.0, 'completion': 0.0})
+        return (prompt_tokens * prices['prompt'] + completion_tokens * prices['completion']) / 1_000_000
+
+    @staticmethod
+    def is_free(model):
+        """Проверяет, бесплатна ли модель по таблице цен."""
+        return CostLedger.price(model, 1_000_000, 1_000_000) == 0
+
+    def record(self, model, prompt_tokens, completion_tokens, kind=None, session_id=None, section=None):
+        """
+        Записывает расход по запросу.
+
+        Args:
+            model: Имя модели
+            prompt_tokens: Токены запроса
+            completion_tokens: Токены ответа
+            kind: Вид запроса (режим генерации, structure, fact_check и т.п.)
+            session_id: Идентификатор сессии (занятия)
+            section: Название раздела
+
+        Returns:
+            dict: Запись журнала
+        """
+        entry = {
+            "time": time.time(),
+            "model": model,
+            "kind": kind or "other",
+            "session_id": session_id,
+            "section": section,
+            "prompt_tokens": int(prompt_tokens or 0),
+            "completion_tokens": int(completion_tokens or 0),
+            "cost": self.price(model, prompt_tokens or 0, completion_tokens or 0),
+        }
+
+        with self._lock:
+            if datetime.now().strftime('%Y%m%d') != self._day:
+                self._load_day()
+            self.entries.append(entry)
+            self._day_cost += entry['cost']
+            try:
+                os.makedirs(self.ledger_dir, exist_ok=True)
+                with open(self._day_file(self._day), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            except Exception as e:
+                print(f"⚠️ Ошибка записи журнала расходов: {e}")
+
+        return entry
+
+    def spent(self, session_id=None):
+        """
+        Возвращает расходы по уровням.
+
+        Returns:
+            dict: {'session': ..., 'batch': ..., 'day': ...}
+        """
+        with self._lock:
+            batch = sum(e['cost'] for e in self.entries)
+            session = sum(e['cost'] for e in self.entries if session_id and e['session_id'] == session_id)
+            return {'session': session, 'batch': batch, 'day': self._day_cost}
+
+    def exhausted_scope(self, session_id=None):
+        """
+        Проверяет бюджеты.
+
+        Returns:
+            str: Исчерпанный уровень ('session', 'batch', 'day') или None
+        """
+        import config
+
+        spent = self.spent(session_id)
+        for scope in ('session', 'batch', 'day'):
+            limit = config.BUDGETS.get(scope)
+            if limit is not None and spent[scope] >= limit:
+                return scope
+        return None
+
+    def resolve_model(self, model, session_id=None):
+        """
+        Выбирает модель с учетом бюджета: при исчерпании переходит на резервную
+        (бесплатную) модель или останавливает генерацию.
+
+        Returns:
+            str: Модель для запроса
+
+        Raises:
+            BudgetExceededError: бюджет исчерпан и переход невозможен
+        """
+        import config
+
+        scope = self.exhausted_scope(session_id)
+        if scope is None:
+            return model
+
+        fallback = config.BUDGETS.get('fallback_model')
+        if config.BUDGETS.get('on_exhausted') == 'downgrade' and fallback and self.is_free(fallback):
+            if model != fallback:
+                print(f"💸 Бюджет '{scope}' исчерпан: переход на модель {fallback}")
+            return fallback
+
+        raise BudgetExceededError(f"Бюджет '{scope}' исчерпан")
+
+    def report(self):
+        """
+        Сводка расходов по занятиям, видам разделов и моделям.
+
+        Returns:
+            dict: {'by_lesson': {...}, 'by_kind': {...}, 'by_model': {...}, 'total': float}
+        """
+        summary = {'by_lesson': {}, 'by_kind': {}, 'by_model': {}, 'total': 0.0}
+        with self._lock:
+            entries = list(self.entries)
+
+        for entry in entries:
+            for group, key in (('by_lesson', entry['session_id'] or '-'),
+                               ('by_kind', entry['kind']),
+                               ('by_model', entry['model'])):
+                bucket = summary[group].setdefault(key, {'calls': 0, 'prompt_tokens': 0,
+                                                         'completion_tokens': 0, 'cost': 0.0})
+                bucket['calls'] += 1
+                bucket['prompt_tokens'] += entry['prompt_tokens']
+                bucket['completion_tokens'] += entry['completion_tokens']
+                bucket['cost'] += entry['cost']
+            summary['total'] += entry['cost']
+
+        return summary
+
+    def print_report(self):
+        """Выводит сводку расходов."""
+        summary = self.report()
+        print(f"\n💰 РАСХОДЫ НА LLM: ${summary['total']:.4f}")
+        for title, group in (("По занятиям", 'by_lesson'), ("По видам запросов", 'by_kind'),
+                             ("По моделям", 'by_model')):
+            print(f"   {title}:")
+            for key, bucket in summary[group].items():
+                print(f"     {key}: ${bucket['cost']:.4f} ({bucket['calls']} запр., "
+                      f"{bucket['prompt_tokens']}+{bucket['completion_tokens']} ток.)")
+
+
+_LEDGER = None
+_LEDGER_LOCK = threading.Lock()
+
+
+def get_ledger():
+    """Возвращает общий журнал расходов процесса."""
+    global _LEDGER
+    with _LEDGER_LOCK:
+        if _LEDGER is None:
+            _LEDGER = CostLedger()
+        return _LEDGER
@@ -1,52 +1,253 @@
 """
-Обработка вывода LLM: извлечение и починка JSON.
+Обработка вывода LLM: извлечение и починка JSON, проверка ячеек по схеме nbformat v4.
 """
 
 import json
 import re
 
+from utils.profiling import profile_stage
+
+# Допустимые типы ячеек и ключи ячеек nbformat v4
+VALID_CELL_TYPES = ('markdown', 'code', 'raw')
+ALLOWED_CELL_KEYS = {
+    'markdown': {'cell_type', 'metadata', 'source', 'id', 'attachments'},
+    'raw': {'cell_type', 'metadata', 'source', 'id', 'attachments'},
+    'code': {'cell_type', 'metadata', 'source', 'id', 'execution_count', 'outputs'},
+}
+
+# JSON-схема ответа с ячейками для моделей со структурированным выводом
+# (строгий режим: все поля обязательны, лишние запрещены)
+NOTEBOOK_CELLS_SCHEMA = {
+    "name": "notebook_cells",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "cells": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "cell_type": {"type": "string", "enum": ["markdown", "code"]},
+                        "source": {"type": "array", "items": {"type": "string"}},
+                    },
+                    "required": ["cell_type", "source"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["cells"],
+        "additionalProperties": False,
+    },
+}
+
+def extract_json_str(llm_output):
+    """Извлекает JSON-фрагмент из ответа LLM (блок ```json``` или весь текст)."""
+    json_match = re.search(r'```(?:json)?\s*(.*?)\s*```', llm_output, re.DOTALL)
+
+    if json_match:
+        return json_match.group(1).strip()
+
+    # Незакрытый блок кода (ответ оборван)
+    open_match = re.search(r'```(?:json)?\s*(.*)$', llm_output, re.DOTALL)
+    if open_match:
+        return open_match.group(1).strip()
+
+    return llm_output.strip()
+
+def _as_notebook(result):
+    """Приводит распарсенный JSON к виду {"cells": [...]} или возвращает None."""
+    if isinstance(result, dict) and isinstance(result.get('cells'), list):
+        return result
+    if isinstance(result, list) and result and all(isinstance(c, dict) for c in result):
+        # Модель вернула сразу список ячеек
+        return {"cells": result}
+    return None
+
+def is_error_output(llm_output):
+    """Проверяет, является ли вывод сообщением об ошибке клиента LLM."""
+    return '"error":' in llm_output
+
+def looks_truncated(llm_output):
+    """
+    Проверяет, оборван ли JSON в ответе (не закрыты скобки или строка).
+
+    Args:
+        llm_output: Сырой вывод от LLM
+
+    Returns:
+        bool: True, если JSON выглядит незавершенным
+    """
+    json_str = extract_json_str(llm_output)
+    depth = 0
+    in_string = False
+    escaped = False
+
+    for char in json_str:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+
+    return in_string or depth > 0
+
+@profile_stage('try_extract_json')
+def try_extract_json(llm_output):
+    """
+    Извлекает JSON ноутбука из ответа LLM без подстановки заглушки.
+
+    Args:
+        llm_output: Сырой вывод от LLM
+
+    Returns:
+        dict: {"cells": [...]} или None, если извлечь не удалось
+    """
+    if not llm_output or is_error_output(llm_output):
+        return None
+
+    json_str = extract_json_str(llm_output)
+
+    # Пробуем распарсить
+    try:
+        return _as_notebook(json.loads(json_str))
+    except json.JSONDecodeError:
+        pass
+
+    # Пробуем починить
+    try:
+        from json_repair import repair_json
+        return _as_notebook(repair_json(json_str, return_objects=True))
+    except Exception:
+        return None
+
+@profile_stage('extract_and_repair_json')
 def extract_and_repair_json(llm_output):
     """
     Извлекает JSON из ответа LLM и чинит его.
-    
+
     Args:
         llm_output: Сырой вывод от LLM
-    
+
     Returns:
         dict: Распарсенный JSON
     """
     # Если вывод уже содержит ошибку
-    if '"error":' in llm_output:
+    if is_error_output(llm_output):
         return {"cells": [{"cell_type": "markdown", "source": [f"# Ошибка\n{llm_output}"]}]}
-    
-    # Извлекаем JSON из текста
-    json_match = re.search(r'```(?:json)?\s*(.*?)\s*```', llm_output, re.DOTALL)
-    
-    if json_match:
-        json_str = json_match.group(1).strip()
-    else:
-        # Ищем JSON в тексте
-        json_str = llm_output.strip()
-    
-    # Пробуем распарсить
-    try:
-        result = json.loads(json_str)
+
+    result = try_extract_json(llm_output)
+    if result is not None:
         return result
-        
-    except json.JSONDecodeError:
-        # Пробуем починить
-        try:
-            from json_repair import repair_json
-            repaired = repair_json(json_str)
-            return repaired
-        except:
-            # Возвращаем минимальную структуру
-            return {
-                "cells": [
-                    {
-                        "cell_type": "markdown",
-                        "metadata": {},
-                        "source": ["# Сгенерированный раздел", "Контент будет здесь."]
-                    }
-                ]
-            }
\ No newline at end of file
+
+    # Возвращаем минимальную структуру
+    return {
+        "cells": [
+            {
+                "cell_type": "markdown",
+                "metadata": {},
+                "source": ["# Сгенерированный раздел", "Контент будет здесь."]
+            }
+        ]
+    }
+
+def normalize_cell(cell):
+    """
+    Проверяет ячейку по схеме nbformat v4 и исправляет простые ошибки.
+
+    Args:
+        cell: Ячейка от LLM (словарь или строка)
+
+    Returns:
+        tuple: (исправленная ячейка или None, список найденных проблем)
+    """
+    problems = []
+
+    # Строка вместо ячейки - считаем текстом markdown
+    if isinstance(cell, str):
+        return {"cell_type": "markdown", "metadata": {}, "source": cell.splitlines(keepends=True)}, \
+            ["ячейка-строка преобразована в markdown"]
+
+    if not isinstance(cell, dict):
+        return None, [f"ячейка неизвестного типа {type(cell).__name__} отброшена"]
+
+    cell = dict(cell)
+
+    # Тип ячейки
+    cell_type = cell.get('cell_type')
+    if cell_type not in VALID_CELL_TYPES:
+        guessed = 'code' if ('outputs' in cell or 'execution_count' in cell) else 'markdown'
+        problems.append(f"cell_type {cell_type!r} заменен на {guessed!r}")
+        cell['cell_type'] = cell_type = guessed
+
+    # Метаданные
+    if not isinstance(cell.get('metadata'), dict):
+        if 'metadata' in cell:
+            problems.append("metadata не является объектом")
+        cell['metadata'] = {}
+
+    # Исходный текст: список строк
+    source = cell.get('source')
+    if source is None:
+        problems.append("нет source")
+        cell['source'] = []
+    elif isinstance(source, str):
+        cell['source'] = source.splitlines(keepends=True)
+    elif isinstance(source, list):
+        if not all(isinstance(line, str) for line in source):
+            problems.append("source содержит не строки")
+            cell['source'] = [line if isinstance(line, str) else str(line) for line in source]
+    else:
+        problems.append(f"source типа {type(source).__name__}")
+        cell['source'] = str(source).splitlines(keepends=True)
+
+    # Поля ячеек кода
+    if cell_type == 'code':
+        execution_count = cell.get('execution_count')
+        if execution_count is not None and not isinstance(execution_count, int):
+            problems.append("execution_count не является числом")
+            execution_count = None
+        cell['execution_count'] = execution_count
+        if not isinstance(cell.get('outputs'), list):
+            cell['outputs'] = []
+
+    # Лишние ключи
+    extra_keys = set(cell) - ALLOWED_CELL_KEYS[cell_type]
+    if extra_keys:
+        problems.append(f"удалены лишние ключи: {sorted(extra_keys)}")
+        for key in extra_keys:
+            del cell[key]
+
+    return cell, problems
+
+@profile_stage('validate_notebook_cells')
+def validate_notebook_cells(cells):
+    """
+    Проверяет и нормализует список ячеек по схеме nbformat v4.
+
+    Args:
+        cells: Список ячеек от LLM
+
+    Returns:
+        tuple: (список исправленных ячеек, список проблем)
+    """
+    if not isinstance(cells, list):
+        return [], ["cells не является списком"]
+
+    normalized = []
+    problems = []
+
+    for i, cell in enumerate(cells):
+        fixed, cell_problems = normalize_cell(cell)
+        problems.extend(f"ячейка {i}: {problem}" for problem in cell_problems)
+        if fixed is not None:
+            normalized.append(fixed)
+
+    return normalized, problems
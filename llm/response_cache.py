@@ -0,0 +1,98 @@
+"""
+Общий потокобезопасный кэш ответов LLM.
+Позволяет нескольким сессиям (например, занятиям одного курса) не повторять одинаковые запросы.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+
+class ResponseCache:
+    """
+    Кэш ответов LLM в памяти с необязательным сохранением на диск.
+    """
+
+    def __init__(self, cache_file=None):
+        """
+        Инициализация кэша.
+
+        Args:
+            cache_file: Путь к JSON файлу для сохранения кэша между запусками (опционально)
+        """
+        self.cache_file = cache_file
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+                print(f"📦 Загружен кэш ответов: {len(self._entries)} записей")
+            except Exception as e:
+                print(f"⚠️ Ошибка загрузки кэша ответов: {e}")
+
+    @staticmethod
+    def make_key(model, messages, temperature, prompt_version=None):
+        """
+        Формирует ключ кэша по параметрам запроса.
+
+        max_tokens в ключ не входит: оборванные ответы дописываются продолжением,
+        поэтому ответ не зависит от выбранного лимита. Версия шаблонов промпта
+        входит в ключ, чтобы изменение шаблона сбрасывало кэш.
+
+        Returns:
+            str: SHA-256 от канонического представления запроса
+        """
+        payload = json.dumps(
+            [model, messages, temperature, prompt_version],
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Возвращает сохраненный ответ или None."""
+        with self._lock:
+            answer = self._entries.get(key)
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return answer
+
+    def set(self, key, answer):
+        """Сохраняет ответ в кэш."""
+        with self._lock:
+            self._entries[key] = answer
+
+    def save(self):
+        """
+        Сохраняет кэш на диск (если задан cache_file).
+
+        Returns:
+            str: Путь к файлу кэша или None
+        """
+        if not self.cache_file:
+            return None
+
+        with self._lock:
+            entries = dict(self._entries)
+
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            tmp_file = f"{self.cache_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+            return self.cache_file
+        except Exception as e:
+            print(f"⚠️ Ошибка сохранения кэша ответов: {e}")
+            return None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,439 @@
+"""
+Корпус сырых ответов LLM для воспроизведения без сети и регрессионных проверок.
+
+Пары запрос/ответ дописываются в один файл корпуса: после сигнатуры идут
+записи "длина (4 байта) + JSON". Рядом хранится индекс смещений из записей
+фиксированного размера (смещение, длина, префикс ключа запроса), поэтому
+корпус читается через mmap без разбора всего файла, а ответ находится по
+ключу запроса. Ключ совпадает с ключом кэша ответов (модель, сообщения,
+температура, версия промптов).
+
+В режиме воспроизведения (CORPUS_PARAMS['replay']) get_llm_response берет
+ответы из корпуса вместо запросов к модели.
+
+Запись и ее заголовок длины дописываются под блокировкой файла (flock),
+поэтому несколько процессов могут писать в один корпус. При перестройке
+индекса поврежденная запись в середине корпуса пропускается (с поиском
+следующей целой записи), а обрезается только недописанный хвост.
+
+Использование из командной строки:
+    python -m llm.response_corpus import logs/      Импорт ответов из лог-файлов
+    python -m llm.response_corpus check             Прогон обработки по всем ответам
+    python -m llm.response_corpus stats             Состав корпуса
+"""
+
+import contextlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: блокировка файла между процессами недоступна
+    fcntl = None
+
+# Сигнатура файла корпуса
+CORPUS_MAGIC = b'AIMCORP1'
+
+# Запись индекса: смещение записи, длина JSON, первые 8 байт ключа запроса
+_INDEX_ENTRY = struct.Struct('<QI8s')
+_LENGTH = struct.Struct('<I')
+_NO_KEY = b'\0' * 8
+
+# Лог-файлы с ответами: <префикс><вид>_<ГГГГММДД>_<ЧЧММСС>.txt
+_LOG_KINDS = (
+    (re.compile(r'lesson_structure_\d{8}_\d{6}\.txt$'), 'structure'),
+    (re.compile(r'full_lesson_\d{8}_\d{6}\.txt$'), 'full'),
+    (re.compile(r'section_\d+_\d{8}_\d{6}\.txt$'), 'sections'),
+    (re.compile(r'(?:^|_)outline_\d{8}_\d{6}\.txt$'), 'course_outline'),
+)
+
+# Виды ответов, содержащих ячейки ноутбука
+NOTEBOOK_KINDS = ('full', 'sections', 'subsections', 'hybrid', 'json_fix')
+
+
+def _key_prefix(key):
+    """Первые 8 байт ключа запроса для индекса."""
+    return bytes.fromhex(key[:16]) if key else _NO_KEY
+
+
+@contextlib.contextmanager
+def _file_lock(f):
+    """Монопольная блокировка открытого файла между процессами (без fcntl - без блокировки)."""
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _parse_record(data, offset):
+    """
+    Разбирает запись корпуса по смещению.
+
+    Returns:
+        tuple: (длина JSON, ключ запроса) или None, если по смещению нет целой записи
+    """
+    start = offset + _LENGTH.size
+    if start > len(data):
+        return None
+    (length,) = _LENGTH.unpack(data[offset:start])
+    end = start + length
+    # Быстрая проверка границ JSON-объекта до разбора
+    if length < 2 or end > len(data) or data[start:start + 1] != b'{' or data[end - 1:end] != b'}':
+        return None
+    try:
+        record = json.loads(data[start:end])
+    except ValueError:
+        return None
+    return (length, record.get('key')) if isinstance(record, dict) else None
+
+
+def _next_record(data, offset):
+    """
+    Ищет ближайшую целую запись после поврежденной.
+
+    Returns:
+        int: Смещение записи или None, если дальше целых записей нет
+    """
+    position = data.find(b'{', offset + _LENGTH.size)
+    while position >= 0:
+        if _parse_record(data, position - _LENGTH.size) is not None:
+            return position - _LENGTH.size
+        position = data.find(b'{', position + 1)
+    return None
+
+
+class ResponseCorpus:
+    """
+    Корпус ответов: дозапись, чтение через mmap и поиск по ключу запроса.
+    """
+
+    def __init__(self, path=None):
+        """
+        Открывает корпус (файл создается при первой записи).
+
+        Args:
+            path: Путь к файлу корпуса (по умолчанию из конфига); индекс - path + '.idx'
+        """
+        import config
+
+        self.path = path or config.CORPUS_PARAMS['path']
+        self.index_path = self.path + '.idx'
+        self._lock = threading.Lock()
+        self._entries = []      # (смещение, длина, префикс ключа)
+        self._by_key = {}       # префикс ключа -> номер последней записи
+        self._mmap = None
+        self._mapped_size = 0
+        self._load_index()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add_entry(self, entry):
+        self._entries.append(entry)
+        if entry[2] != _NO_KEY:
+            self._by_key[entry[2]] = len(self._entries) - 1
+
+    def _load_index(self):
+        """Читает индекс; при расхождении с файлом корпуса перестраивает его."""
+        if not os.path.exists(self.path):
+            return
+        data_size = os.path.getsize(self.path)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                raw = f.read()
+            raw = raw[:len(raw) - len(raw) % _INDEX_ENTRY.size]
+            for entry in _INDEX_ENTRY.iter_unpack(raw):
+                if entry[0] + _LENGTH.size + entry[1] > data_size:
+                    break
+                self._add_entry(entry)
+            last_end = (self._entries[-1][0] + _LENGTH.size + self._entries[-1][1]
+                        if self._entries else len(CORPUS_MAGIC))
+            if last_end == data_size:
+                return
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        """
+        Перестраивает индекс сканированием корпуса (после сбоя записи или
+        копирования корпуса без индекса). Поврежденная запись в середине
+        пропускается, недописанный хвост (после которого нет целых записей)
+        отбрасывается.
+
+        Returns:
+            int: Количество записей
+        """
+        with self._lock:
+            self._entries = []
+            self._by_key = {}
+            self._close_map()
+            with open(self.path, 'r+b') as f:
+                if f.read(len(CORPUS_MAGIC)) != CORPUS_MAGIC:
+                    raise ValueError(f"{self.path}: не файл корпуса ответов")
+                with _file_lock(f):
+                    size = os.fstat(f.fileno()).st_size
+                    offset = valid_end = len(CORPUS_MAGIC)
+                    if size > offset:
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                            while offset < size:
+                                parsed = _parse_record(data, offset)
+                                if parsed is not None:
+                                    length, key = parsed
+                                    self._add_entry((offset, length, _key_prefix(key)))
+                                    offset = valid_end = offset + _LENGTH.size + length
+                                    continue
+                                next_offset = _next_record(data, offset)
+                                if next_offset is None:
+                                    break
+                                print(f"⚠️ Корпус {self.path}: пропущена поврежденная запись "
+                                      f"({next_offset - offset} байт по смещению {offset})")
+                                offset = next_offset
+                    if valid_end < size:
+                        print(f"⚠️ Корпус {self.path}: отброшена недописанная запись "
+                              f"({size - valid_end} байт в конце файла)")
+                        f.truncate(valid_end)
+
+            with open(self.index_path, 'wb') as f:
+                f.write(b''.join(_INDEX_ENTRY.pack(*entry) for entry in self._entries))
+            return len(self._entries)
+
+    def append(self, record):
+        """
+        Дописывает запись в корпус.
+
+        Args:
+            record: Словарь записи (key, model, kind, messages, response, ...)
+        """
+        payload = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'ab') as f, _file_lock(f):
+                # Другой процесс мог дописать корпус, пока ждали блокировку
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    f.write(CORPUS_MAGIC)
+                offset = f.tell()
+                f.write(_LENGTH.pack(len(payload)) + payload)
+                f.flush()
+                entry = (offset, len(payload), _key_prefix(record.get('key')))
+                # Индекс пишется после данных: при сбое запись без индекса восстанавливается сканированием
+                with open(self.index_path, 'ab') as index:
+                    index.write(_INDEX_ENTRY.pack(*entry))
+            self._add_entry(entry)
+
+    def _close_map(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._mapped_size = 0
+
+    def _view(self, end):
+        """Отображение файла в память, покрывающее смещение end."""
+        if self._mmap is None or end > self._mapped_size:
+            self._close_map()
+            with open(self.path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_size = len(self._mmap)
+        return self._mmap
+
+    def get(self, index):
+        """
+        Возвращает запись по номеру.
+
+        Returns:
+            dict: Запись корпуса
+        """
+        offset, length, _ = self._entries[index]
+        start = offset + _LENGTH.size
+        with self._lock:
+            view = self._view(start + length)
+            return json.loads(view[start:start + length])
+
+    def lookup(self, key):
+        """
+        Находит последнюю запись для ключа запроса.
+
+        Returns:
+            dict: Запись или None
+        """
+        index = self._by_key.get(_key_prefix(key))
+        if index is None:
+            return None
+        record = self.get(index)
+        # Префикс в индексе короткий: сверяем полный ключ
+        return record if record.get('key') == key else None
+
+    def __iter__(self):
+        for index in range(len(self._entries)):
+            yield self.get(index)
+
+    def close(self):
+        """Закрывает отображение файла."""
+        with self._lock:
+            self._close_map()
+
+
+_CORPUS = None
+_CORPUS_LOCK = threading.Lock()
+
+
+def get_corpus():
+    """Возвращает общий корпус ответов процесса."""
+    global _CORPUS
+    with _CORPUS_LOCK:
+        if _CORPUS is None:
+            _CORPUS = ResponseCorpus()
+        return _CORPUS
+
+
+def record_response(key, model, kind, messages, answer):
+    """
+    Дописывает ответ в корпус, если запись включена в конфиге.
+
+    Args:
+        key: Ключ запроса (ResponseCache.make_key)
+        model: Модель, давшая ответ
+        kind: Вид запроса
+        messages: Сообщения запроса
+        answer: Текст ответа
+    """
+    import config
+    from utils.log_index import current_context
+
+    if not config.CORPUS_PARAMS['record']:
+        return
+    session_id, section = current_context()
+    try:
+        get_corpus().append({
+            "key": key, "model": model, "kind": kind, "messages": messages, "response": answer,
+            "session_id": session_id, "section": section, "created_at": time.time(),
+        })
+    except Exception as e:
+        print(f"⚠️ Ошибка записи в корпус ответов: {e}")
+
+
+def replay_response(key):
+    """
+    Ответ из корпуса для режима воспроизведения.
+
+    Returns:
+        str: Текст ответа или None, если запроса нет в корпусе
+    """
+    record = get_corpus().lookup(key)
+    return record['response'] if record is not None else None
+
+
+def import_logs(log_dir, corpus=None):
+    """
+    Импортирует ответы из лог-файлов (структуры, разделы, план курса) в корпус.
+
+    Запросы в этих логах не сохранены, поэтому записи импортируются без ключа:
+    они используются в регрессионных проверках, но не в воспроизведении.
+
+    Returns:
+        int: Количество импортированных ответов
+    """
+    corpus = corpus or get_corpus()
+    count = 0
+    for root, _, files in os.walk(log_dir):
+        for name in sorted(files):
+            kind = next((kind for pattern, kind in _LOG_KINDS if pattern.search(name)), None)
+            if kind is None:
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                answer = f.read()
+            corpus.append({"key": None, "kind": kind, "response": answer, "source": name,
+                           "created_at": os.path.getmtime(path)})
+            count += 1
+    return count
+
+
+def check_corpus(corpus=None):
+    """
+    Прогоняет обработку ответов по всему корпусу: извлечение и починку JSON,
+    проверку ячеек и сборку ноутбука для разделов, разбор структуры и плана курса.
+
+    Returns:
+        dict: Вид проверки -> {'total', 'failed', 'repaired'} и общее время 'seconds'
+    """
+    from llm.output_processor import extract_and_repair_json, try_extract_json, validate_notebook_cells
+    from utils.notebook_builder import build_notebook
+    from utils.structure_parser import parse_course_outline, parse_structure
+
+    corpus = corpus or get_corpus()
+    report = {}
+    start_time = time.time()
+
+    for record in corpus:
+        kind = record.get('kind')
+        answer = record.get('response') or ''
+        if kind in NOTEBOOK_KINDS:
+            stats = report.setdefault('notebook', {'total': 0, 'failed': 0, 'repaired': 0})
+            stats['total'] += 1
+            try:
+                # Ответ без валидного JSON заменяется заглушкой - считаем это отказом
+                if try_extract_json(answer) is None:
+                    stats['failed'] += 1
+                cells, problems = validate_notebook_cells(extract_and_repair_json(answer)['cells'])
+                build_notebook(cells)
+                stats['repaired'] += bool(problems)
+            except Exception:
+                stats['failed'] += 1
+        elif kind in ('structure', 'course_outline'):
+            stats = report.setdefault(kind, {'total': 0, 'failed': 0, 'repaired': 0})
+            stats['total'] += 1
+            try:
+                parsed = parse_structure(answer) if kind == 'structure' else parse_course_outline(answer)
+                stats['failed'] += not parsed
+            except Exception:
+                stats['failed'] += 1
+
+    report['seconds'] = time.time() - start_time
+    return report
+
+
+def main():
+    """Импорт логов, проверка и статистика корпуса из командной строки."""
+    if len(sys.argv) < 2 or sys.argv[1] in ['-h', '--help']:
+        print("Использование:")
+        print("  python -m llm.response_corpus import [папка_логов]  Импортировать ответы из логов")
+        print("  python -m llm.response_corpus check                Прогнать обработку по всем ответам")
+        print("  python -m llm.response_corpus stats                Состав корпуса")
+        return
+
+    import config
+
+    corpus = get_corpus()
+    if sys.argv[1] == 'import':
+        count = import_logs(sys.argv[2] if len(sys.argv) > 2 else config.LOG_DIR, corpus)
+        print(f"📥 Импортировано ответов: {count} (всего в корпусе: {len(corpus)})")
+    elif sys.argv[1] == 'check':
+        report = check_corpus(corpus)
+        print(f"🧪 Проверено ответов: {len(corpus)} за {report.pop('seconds'):.2f} сек.")
+        for kind, stats in report.items():
+            print(f"   {kind:<16} всего {stats['total']:>6}, ошибок {stats['failed']:>5}, "
+                  f"исправлено ячеек {stats['repaired']:>5}")
+    elif sys.argv[1] == 'stats':
+        kinds = {}
+        for record in corpus:
+            kinds[record.get('kind')] = kinds.get(record.get('kind'), 0) + 1
+        size = os.path.getsize(corpus.path) if os.path.exists(corpus.path) else 0
+        print(f"📚 Корпус {corpus.path}: {len(corpus)} записей, {size / 1024 / 1024:.1f} МБ")
+        for kind, count in sorted(kinds.items(), key=lambda item: -item[1]):
+            print(f"   {kind}: {count}")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
@@ -0,0 +1,180 @@
+"""
+Статистика длины ответов и задержек LLM по моделям и режимам генерации.
+Используется для адаптивного выбора max_tokens и выбора режима генерации.
+"""
+
+import json
+import os
+import threading
+
+_LOCK = threading.Lock()
+_STATS = None
+
+
+def _stats_file():
+    """Путь к файлу статистики."""
+    import config
+    return os.path.join(config.CACHE_DIR, 'token_stats.json')
+
+
+def _load():
+    """Загружает статистику с диска (один раз за процесс)."""
+    global _STATS
+    if _STATS is None:
+        _STATS = {}
+        path = _stats_file()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    _STATS = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Ошибка загрузки статистики токенов: {e}")
+    return _STATS
+
+
+def _save():
+    """Сохраняет статистику на диск."""
+    path = _stats_file()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(_STATS, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠️ Ошибка сохранения статистики токенов: {e}")
+
+
+# Ключ раздела задержек в файле статистики (не совпадает с именами моделей)
+_LATENCY_KEY = '__latency__'
+
+
+def record_completion(model, kind, completion_tokens, latency=None):
+    """
+    Запоминает фактическую длину ответа модели и время запроса.
+
+    Args:
+        model: Имя модели
+        kind: Вид запроса (режим генерации: full/sections/subsections и т.п.)
+        completion_tokens: Количество токенов ответа (с учетом продолжений)
+        latency: Время выполнения запроса в секундах (опционально)
+    """
+    import config
+
+    if not completion_tokens:
+        return
+
+    window = config.TOKEN_LIMIT_PARAMS['window']
+    with _LOCK:
+        stats = _load()
+        samples = stats.setdefault(model, {}).setdefault(kind, [])
+        samples.append(int(completion_tokens))
+        del samples[:-window]
+        if latency is not None:
+            latencies = stats.setdefault(_LATENCY_KEY, {}).setdefault(model, [])
+            latencies.append([int(completion_tokens), round(float(latency), 3)])
+            del latencies[:-window]
+        _save()
+
+
+def typical_completion_tokens(model, kind):
+    """
+    Возвращает медианную длину ответа модели в данном режиме.
+
+    Returns:
+        int: Медиана токенов ответа или None, если наблюдений нет
+    """
+    with _LOCK:
+        samples = sorted(_load().get(model, {}).get(kind, []))
+    if not samples:
+        return None
+    return samples[len(samples) // 2]
+
+
+def latency_model(model, default_overhead, default_tokens_per_sec):
+    """
+    Оценивает задержку модели как линейную функцию длины ответа:
+    время = накладные расходы + токены / скорость.
+
+    Коэффициенты подбираются методом наименьших квадратов по истории запросов.
+
+    Args:
+        model: Имя модели
+        default_overhead: Накладные расходы на запрос (сек.), пока истории недостаточно
+        default_tokens_per_sec: Скорость генерации (токенов/сек.), пока истории недостаточно
+
+    Returns:
+        tuple: (накладные расходы в секундах, секунд на токен)
+    """
+    import config
+
+    with _LOCK:
+        points = list(_load().get(_LATENCY_KEY, {}).get(model, []))
+
+    default = (default_overhead, 1.0 / default_tokens_per_sec)
+    if len(points) < config.TOKEN_LIMIT_PARAMS['min_samples']:
+        return default
+
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        # Все ответы одной длины: накладные расходы не отделить от скорости
+        return default[0], max(0.0, (mean_y - default[0]) / mean_x) if mean_x else default[1]
+
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+    intercept = mean_y - slope * mean_x
+    if slope <= 0:
+        return default
+    return max(0.0, intercept), slope
+
+
+def suggest_max_tokens(model, kind, default):
+    """
+    Подбирает max_tokens по наблюдаемой длине ответов модели в данном режиме.
+
+    Args:
+        model: Имя модели
+        kind: Вид запроса (режим генерации)
+        default: Значение по умолчанию, пока статистики недостаточно
+
+    Returns:
+        int: Рекомендуемый max_tokens
+    """
+    import config
+
+    params = config.TOKEN_LIMIT_PARAMS
+    if not params['adaptive']:
+        return default
+
+    with _LOCK:
+        samples = sorted(_load().get(model, {}).get(kind, []))
+
+    if len(samples) < params['min_samples']:
+        return default
+
+    index = min(len(samples) - 1, int(len(samples) * params['percentile']))
+    suggested = int(samples[index] * params['headroom'])
+    return max(params['min_tokens'], min(params['max_tokens'], suggested))
+
+
+def latency_percentile(model, percentile):
+    """
+    Возвращает перцентиль времени запроса модели по истории.
+
+    Args:
+        model: Имя модели
+        percentile: Перцентиль (0..1)
+
+    Returns:
+        float: Время в секундах или None, если истории недостаточно
+    """
+    import config
+
+    with _LOCK:
+        latencies = sorted(point[1] for point in _load().get(_LATENCY_KEY, {}).get(model, []))
+
+    if len(latencies) < config.TOKEN_LIMIT_PARAMS['min_samples']:
+        return None
+    return latencies[min(len(latencies) - 1, int(len(latencies) * percentile))]
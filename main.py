@@ -5,18 +5,26 @@
 
 import sys
 import os
+from datetime import datetime
 
 # Добавляем текущую директорию в путь для импорта
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import config
 from utils.helpers import format_text, text_to_list_lines, log_to_file, print_header
+from core.answers import ANSWER_FIELDS, LessonAnswers, default_answer, load_answers
 from core.session_manager import SessionManager
-from core.prompt_factory import PromptFactory
-from llm.client import get_llm_response
-from llm.output_processor import extract_and_repair_json
-from utils.structure_parser import parse_structure
-from utils.notebook_builder import build_and_save_notebook
+from core.lesson_generator import generate_structure, update_structure, generate_lesson_content
+from core.mode_optimizer import resolve_auto_mode
+from core.pipeline import generate_batch
+from core.refinement import generate_tiered
+from core.prompt_registry import get_registry
+from llm.ledger import get_ledger
+from llm.response_cache import ResponseCache
+from utils.exporters import export_catalog, export_lesson
+from utils.lesson_format import LESSON_EXTENSION, save_lesson
+from utils.retrieval import open_default_retriever
+from utils.profiling import profile_stage, profile_run, set_enabled
 
 def extract_default_from_question(question: str) -> str:
     """
@@ -42,6 +50,7 @@ def extract_default_from_question(question: str) -> str:
         return options[0]
     return ""
 
+@profile_stage('dialog')
 def dialog(questions: str) -> str:
     """
     Функция диалога (вопрос-ответ) и сохранение.
@@ -81,11 +90,88 @@ def dialog(questions: str) -> str:
 
     return dialog_str
 
+@profile_stage('dialog')
+def answers_dialog() -> LessonAnswers:
+    """
+    Опрос о занятии по полям ответов с вариантами по умолчанию.
+
+    Returns:
+        LessonAnswers: Проверенные и нормализованные ответы
+    """
+    while True:
+        values = {}
+        for i, (name, field) in enumerate(ANSWER_FIELDS.items(), 1):
+            options = f" ({', '.join(field['options'])})" if field['options'] else ""
+            print(format_text(f"Вопрос {i}: {field['question']}{options}"), '\n')
+
+            default = default_answer(name)
+            answer = input(f"Ваш ответ [{default}]: " if default else "Ваш ответ: ").strip()
+            values[name] = answer or default
+            print()
+
+        answers, problems = LessonAnswers.parse(values)
+        for problem in problems:
+            print(f"⚠️  {problem}")
+        if answers is not None:
+            break
+
+    # Логируем ответы
+    log_to_file(answers.to_context(), "user_dialog")
+
+    return answers
+
+def ask_notebook_name():
+    """Запрашивает имя итогового ноутбука."""
+    notebook_name = input("Введите имя для итогового ноутбука (без .ipynb): ").strip()
+    return notebook_name or "generated_lesson"
+
+
+def tiered_generation(session, notebook_name, retriever=None, fact_checker=None):
+    """
+    Черновик занятия быстрой моделью и фоновое улучшение разделов сильной моделью.
+
+    Args:
+        session: Экземпляр SessionManager с заполненной структурой
+        notebook_name: Имя файлов занятия (без расширения)
+        retriever: Поиск по локальным материалам (опционально)
+        fact_checker: Проверка фактов итоговых разделов (FactChecker, опционально)
+
+    Returns:
+        RefinementJob: Занятие с итоговыми разделами и моделью
+    """
+    job = generate_tiered(session, notebook_name, retriever=retriever)
+    print(f"\n🎉 Черновик можно открывать: {job.notebook_path}")
+    print("   Улучшенные разделы заменяют черновые в этом же файле (Ctrl+C - оставить как есть)")
+
+    try:
+        job.wait()
+    except KeyboardInterrupt:
+        job.cancel()
+        print("\n⚠️  Улучшение остановлено, уже улучшенные разделы сохранены")
+        job.wait()
+
+    print(f"\n📈 Улучшено разделов: {job.refined}/{len(job.targets)}, не удалось улучшить: {job.failed}")
+
+    # Факты проверяются в итоговых разделах (черновых или улучшенных)
+    if fact_checker is not None:
+        position = 0
+        for index, target in enumerate(job.targets, 1):
+            count = len(job.sections.get(index, []))
+            fact_checker.submit_section(target or "ВЕСЬ УРОК",
+                                        list(enumerate(session.cells[position:position + count], position)))
+            position += count
+    return job
+
+
 def main_workflow():
     """Основной рабочий процесс генерации занятия."""
 
     print_header("НЕЙРО-МЕТОДОЛОГ (модульная версия)")
 
+    # Шаблоны промптов загружаются и проверяются один раз при старте
+    prompts = get_registry()
+    print(f"📜 Шаблоны промптов: специалист '{prompts.specialist}', версия {prompts.version()}")
+
     # 1. Инициализация сессии
     session = SessionManager(generation_mode=config.DEFAULT_GENERATION_MODE)
     print(f"🆕 Создана сессия: режим '{session.generation_mode}'")
@@ -93,61 +179,22 @@ def main_workflow():
     # 2. Ввод данных пользователя
     print_header("1. Ввод данных пользователя")
 
-    initial_questions = """
-1. Какая у Вас будет основная тема занятия(Общая тема: Физика; тема занятия: Закон Архимеда, )?
-2. Какой у Вас уровень подготовки? (начинающий, средний, продвинутый, начальный (5-7 класс), средний (8-9 класс), продвинутый (10-11 класс), университетский)?
-3. Какая предполагается продолжительность занятия (15 минут, 45 минут, 1 час, 2 часа)?
-4. Какими предварительными знаниями и навыками обладают обучаемые в данной теме (никакими, начальными, работаю в данной сфере, являюсь специалистом)?
-5. С какой целью хотите изучить занятие(урок в школе, занятие факультатива, лекция на курсе, для самостоятельного самообразования, для профессиональной подготовки, для совершенствования в профессии)?
-6. Укажите дополнительные пожелания к занятию: """
-
-    session.summarized_dialog = dialog(initial_questions)
+    # Ответы передаются в промпты компактным блоком "Поле: значение"
+    session.answers = answers_dialog()
+    session.lesson_title = session.answers.topic
+    session.summarized_dialog = session.answers.to_context()
     print(f"💬 Длина диалога: {len(session.summarized_dialog)} символов")
 
     # 3. Генерация структуры занятия
     print_header("2. Генерация структуры занятия")
 
-    # Создаем промпт для генерации структуры
-    structure_system_prompt = """Ты опытный создатель уроков по теме занятия.
-Ты должен проанализировать ответы студента на вопросы и создать структуру занятия.
-Структура должна включать теоретическую, практическую часть и домашнее задание.
-Выведи структуру в формате:
-1. Теоретическая часть
-   1.1. [название подраздела]
-   1.2. [название подраздела]
-2. Практическая часть
-   2.1. [название подраздела]
-   2.2. [название подраздела]
-3. Домашнее задание
-   3.1. [название подраздела]
-
-Не добавляй никаких дополнительных пояснений, только структуру."""
-
-    structure_user_prompt = f"""Ответы студента: {session.summarized_dialog}
-
-На основе этих ответов создай структуру занятия по теме занятия.
-Создай структуру из 3-4 подразделов в каждом основном разделе."""
-
     print("🧠 Генерация структуры занятия...")
 
-    structure_messages = [
-        {"role": "system", "content": structure_system_prompt},
-        {"role": "user", "content": structure_user_prompt}
-    ]
+    structure_raw, structure_time = generate_structure(session, model=config.DEFAULT_MODEL)
 
-    structure_raw, structure_time, _ = get_llm_response(
-        messages=structure_messages,
-        model=config.DEFAULT_MODEL,
-        max_tokens=2000
-    )
-
-    session.lesson_structure = structure_raw
     print(f"✅ Структура сгенерирована за {structure_time:.2f} сек.")
     print(f"\n📋 Структура занятия:\n{format_text(structure_raw)}")
 
-    # Логируем структуру
-    log_to_file(structure_raw, "lesson_structure")
-
     # 4. Согласование структуры (опционально)
     print_header("3. Согласование структуры")
 
@@ -157,119 +204,60 @@ def main_workflow():
         changes = input("Опишите изменения: ")
 
         # Генерация обновленной структуры
-        update_system_prompt = """Ты опытный создатель уроков по теме занятия.
-Ты должен обновить структуру занятия с учетом пожеланий пользователя."""
-
-        update_user_prompt = f"""Исходная структура: {session.lesson_structure}
-Пожелания студента: {changes}
-Обнови структуру с учетом пожеланий. Сохрани тот же формат."""
-
-        update_messages = [
-            {"role": "system", "content": update_system_prompt},
-            {"role": "user", "content": update_user_prompt}
-        ]
-
-        updated_structure, update_time, _ = get_llm_response(
-            messages=update_messages,
-            model=config.DEFAULT_MODEL,
-            max_tokens=2000
-        )
+        updated_structure, update_time = update_structure(session, changes, model=config.DEFAULT_MODEL)
 
-        session.lesson_structure = updated_structure
         print(f"✅ Структура обновлена за {update_time:.2f} сек.")
         print(f"\n📋 Обновленная структура:\n{format_text(updated_structure)}")
 
     # 5. Генерация материалов занятия
     print_header("4. Генерация материалов занятия")
 
-    # Инициализируем фабрику промптов
-    factory = PromptFactory(session)
+    # Режим 'auto' выбирается по прогнозу времени и стоимости
+    resolve_auto_mode(session, model=config.DEFAULT_MODEL)
 
     # В зависимости от режима определяем цели генерации
     if session.generation_mode == 'full':
         print("🎯 РЕЖИМ 'FULL': Генерация всего занятия одним запросом")
-        # В режиме 'full' цель - вся структура целиком
-        generation_targets = [None]  # None означает "весь урок"
         print("   Будет выполнен ОДИН запрос на весь урок")
     else:
-        # В режимах 'sections' или 'subsections' парсим структуру
-        generation_targets = parse_structure(session.lesson_structure)
         print(f"🎯 РЕЖИМ '{session.generation_mode.upper()}': Генерация по частям")
-        print(f"   Будет сгенерировано {len(generation_targets)} разделов")
 
-    # Очищаем ячейки (начинаем с чистого листа)
-    session.clear_cells()
-
-    # Цикл генерации
-    for i, target in enumerate(generation_targets, 1):
-        if session.generation_mode == 'full':
-            print(f"\n🔨 Генерация ВСЕГО занятия (запрос {i}/{len(generation_targets)})")
-            section_title_display = "ВЕСЬ УРОК"
-        else:
-            print(f"\n🔨 Генерация раздела {i}/{len(generation_targets)}: {target}")
-            section_title_display = target
-
-        # Получаем промпт (для режима 'full' target=None)
-        system_prompt, user_prompt = factory.get_prompt(target)
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-
-        # Настраиваем параметры запроса в зависимости от режима
-        if session.generation_mode == 'full':
-            # Для полной генерации увеличиваем лимит токенов
-            current_max_tokens = 8000
-            current_temperature = 0.7
-        else:
-            current_max_tokens = 4000
-            current_temperature = 0.7
-
-        # Отправляем запрос к LLM
-        print(f"   Параметры: max_tokens={current_max_tokens}, temperature={current_temperature}")
-        raw_output, gen_time, _ = get_llm_response(
-            messages=messages,
-            model=config.DEFAULT_MODEL,
-            temperature=current_temperature,
-            max_tokens=current_max_tokens
-        )
-
-        print(f"   ⏱️  Время генерации: {gen_time:.2f} сек.")
-
-        # Логируем сырой ответ
-        log_prefix = "full_lesson" if session.generation_mode == 'full' else f"section_{i}"
-        log_to_file(raw_output, log_prefix)
-
-        # Обрабатываем вывод LLM (извлекаем JSON)
-        try:
-            json_content = extract_and_repair_json(raw_output)
-
-            if 'cells' in json_content:
-                session.add_cells(json_content['cells'])
-                cell_count = len(json_content['cells'])
-                print(f"   ✅ Добавлено {cell_count} ячеек")
-
-                # Для отладки показываем типы ячеек
-                cell_types = {}
-                for cell in json_content['cells']:
-                    cell_type = cell.get('cell_type', 'unknown')
-                    cell_types[cell_type] = cell_types.get(cell_type, 0) + 1
-                print(f"   📊 Типы ячеек: {cell_types}")
-            else:
-                print(f"   ⚠️  В ответе нет ячеек (cells)")
+    # Поиск по локальным материалам (если включен в конфиге)
+    retriever = open_default_retriever()
+
+    # Проверка фактов параллельно с генерацией (если включена в конфиге)
+    fact_checker = None
+    if config.FACT_CHECK_PARAMS['enabled']:
+        from core.fact_checker import FactChecker
+        fact_checker = FactChecker(retriever=retriever)
+
+    notebook_name = None
+    lesson_model = config.DEFAULT_MODEL
+    if config.REFINEMENT_PARAMS['enabled']:
+        # Черновик занятия сразу, улучшение разделов в фоне
+        notebook_name = ask_notebook_name()
+        job = tiered_generation(session, notebook_name, retriever, fact_checker)
+        generation_targets, lesson_model = job.targets, job.model
+    else:
+        # Цикл генерации по разделам
+        generation_targets = generate_lesson_content(session, model=config.DEFAULT_MODEL,
+                                                     retriever=retriever, fact_checker=fact_checker)
 
-        except Exception as e:
-            print(f"   ❌ Ошибка обработки JSON: {e}")
+    if fact_checker is not None:
+        print("\n🔍 Ожидание результатов проверки фактов...")
+        flagged = fact_checker.collect(session)
+        print(f"   Ячеек с сомнительными утверждениями: {flagged}")
 
     # После цикла выводим статистику
     print(f"\n📈 ИТОГИ ГЕНЕРАЦИИ:")
     print(f"   Режим: {session.generation_mode}")
     print(f"   Всего ячеек: {len(session.cells)}")
+    print(f"   Типы ячеек: {session.cell_type_counts}")
     if session.generation_mode == 'full':
         print(f"   Запросов к LLM: 1 (экономия токенов)")
     else:
         print(f"   Запросов к LLM: {len(generation_targets)}")
+    get_ledger().print_report()
 
     # 6. Сборка финального ноутбука
     print_header("5. Сборка финального ноутбука")
@@ -278,18 +266,18 @@ def main_workflow():
         print("❌ Нет ячеек для сборки ноутбука")
         return
 
-    notebook_name = input("Введите имя для итогового ноутбука (без .ipynb): ").strip()
-    if not notebook_name:
-        notebook_name = "generated_lesson"
-
-    notebook_filename = f"{notebook_name}.ipynb"
+    notebook_name = notebook_name or ask_notebook_name()
 
-    # Собираем ноутбук
-    notebook_path = build_and_save_notebook(
-        cells=session.cells,
-        output_dir=session.output_dir,
-        filename=notebook_filename
-    )
+    # Занятие записывается один раз в промежуточном формате и экспортируется
+    # в ноутбук и дополнительные форматы из конфига
+    lesson_path = save_lesson(session, os.path.join(session.output_dir, f"{notebook_name}{LESSON_EXTENSION}"),
+                              model=lesson_model)
+    formats = ['ipynb'] + [fmt for fmt in config.EXPORT_PARAMS['formats'] if fmt != 'ipynb']
+    exported = export_lesson(lesson_path, formats)
+    notebook_path = exported['ipynb']
+    for fmt, path in exported.items():
+        if fmt != 'ipynb' and path:
+            print(f"📤 Экспорт {fmt}: {path}")
 
     if notebook_path and os.path.exists(notebook_path):
         print(f"\n🎉 Ноутбук успешно создан!")
@@ -300,6 +288,17 @@ def main_workflow():
         file_size = os.path.getsize(notebook_path)
         print(f"💾 Размер: {file_size / 1024:.1f} KB")
 
+        # Проверка ячеек кода выполнением (опционально)
+        if config.EXECUTION_PARAMS['enabled']:
+            from utils.notebook_executor import execute_notebook
+
+            print("\n🧪 Проверка ячеек кода выполнением...")
+            report = execute_notebook(notebook_path)
+            print(f"   Выполнено ячеек: {report['executed']}, с ошибками: {report['failed']}"
+                  + (f", не выполнено: {report['skipped']}" if report['skipped'] else ""))
+            for section in report['failed_sections']:
+                print(f"   🔁 Требует повторной генерации: {section}")
+
         # Предложение открыть ноутбук
         print("\nВы можете открыть ноутбук в Colab:")
         print(f"  from google.colab import files")
@@ -310,9 +309,99 @@ def main_workflow():
     print_header("РАБОТА ЗАВЕРШЕНА")
 
 
+def course_workflow():
+    """Рабочий процесс генерации курса из нескольких занятий."""
+    from core.course_manager import CourseManager
+
+    print_header("НЕЙРО-МЕТОДОЛОГ: ГЕНЕРАЦИЯ КУРСА")
+
+    course_questions = """
+1. Какая у Вас будет тема курса(Физика 7 класс)?
+2. Какой у Вас уровень подготовки? (начинающий, средний, продвинутый, начальный (5-7 класс), средний (8-9 класс), продвинутый (10-11 класс), университетский)?
+3. Какая предполагается продолжительность одного занятия (45 минут, 15 минут, 1 час, 2 часа)?
+4. С какой целью проводится курс(школьный курс, факультатив, курс лекций, самообразование, профессиональная подготовка)?
+5. Укажите дополнительные пожелания к курсу: """
+
+    course_dialog = dialog(course_questions)
+
+    lessons_count = input(f"Количество занятий [{config.COURSE_PARAMS['default_lessons']}]: ").strip()
+    lessons_count = int(lessons_count) if lessons_count.isdigit() else None
+
+    course = CourseManager(course_dialog, generation_mode=config.DEFAULT_GENERATION_MODE,
+                           retriever=open_default_retriever())
+
+    print_header("1. План курса")
+    course.generate_outline(lessons_count)
+    for i, title in enumerate(course.lesson_titles, 1):
+        print(f"   {i}. {title}")
+
+    if not course.lesson_titles:
+        print("❌ Не удалось получить план курса")
+        return
+
+    print_header("2. Генерация занятий")
+    course.generate_lessons()
+
+    print_header("3. Сохранение курса")
+    course.save()
+
+    print_header("РАБОТА ЗАВЕРШЕНА")
+
+
+def batch_workflow(answers_path):
+    """
+    Генерация занятий по заявкам из выгрузки формы (CSV/XLSX) без диалога.
+
+    Args:
+        answers_path: Путь к файлу выгрузки
+    """
+    print_header("НЕЙРО-МЕТОДОЛОГ: ЗАЯВКИ ИЗ ВЫГРУЗКИ ФОРМЫ")
+
+    answers_list, problems = load_answers(answers_path)
+    for problem in problems:
+        print(f"⚠️  {problem}")
+    print(f"📋 Заявок к генерации: {len(answers_list)}")
+    if not answers_list:
+        return
+
+    model = config.DEFAULT_MODEL
+    cache = ResponseCache()
+    retriever = open_default_retriever()
+    batch_id = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    output_dir = os.path.join(config.OUTPUT_DIR, batch_id)
+
+    # Заявки проходят конвейер: структура -> запрос к LLM -> извлечение JSON -> проверка -> запись
+    lesson_paths, pipeline = generate_batch(answers_list, output_dir, batch_id,
+                                            model=model, cache=cache, retriever=retriever)
+    pipeline.print_report()
+    if len(lesson_paths) < len(answers_list):
+        print(f"⚠️  Не сгенерировано заявок: {len(answers_list) - len(lesson_paths)}")
+
+    results = export_catalog(sorted(lesson_paths), output_dir=output_dir)
+    print(f"💾 Сохранено файлов: {sum(1 for path in results.values() if path)} в {output_dir}")
+    get_ledger().print_report()
+
+    print_header("РАБОТА ЗАВЕРШЕНА")
+
+
 if __name__ == "__main__":
+    # --profile включает замер этапов, cProfile и семплы стеков для флейм-графа
+    profiling = '--profile' in sys.argv
+    if profiling:
+        set_enabled(True)
+
     try:
-        main_workflow()
+        # --answers <файл> генерирует занятия по заявкам из выгрузки формы
+        answers_path = sys.argv[sys.argv.index('--answers') + 1] if '--answers' in sys.argv else None
+        run_name = 'batch' if answers_path else 'course' if '--course' in sys.argv else 'lesson'
+
+        with profile_run(run_name, cprofile=profiling or None, sampling=profiling or None):
+            if answers_path:
+                batch_workflow(answers_path)
+            elif '--course' in sys.argv:
+                course_workflow()
+            else:
+                main_workflow()
     except KeyboardInterrupt:
         print("\n\n⚠️  Прервано пользователем")
     except Exception as e:
@@ -0,0 +1,22 @@
+"""
+Общие настройки тестов: корень проекта в путях импорта и временные папки
+вместо рабочих каталогов конфига.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+
+@pytest.fixture
+def tmp_config(tmp_path, monkeypatch):
+    """Перенаправляет логи, результаты и кэш конфига во временную папку."""
+    for name in ('LOG_DIR', 'OUTPUT_DIR', 'CACHE_DIR'):
+        monkeypatch.setattr(config, name, str(tmp_path / name.lower()))
+    monkeypatch.setattr(config, 'LOG_INDEX_FILE', str(tmp_path / 'log_index.sqlite'))
+    return tmp_path
@@ -0,0 +1,130 @@
+"""
+Переходы состояний выключателей моделей и выбор резервной модели.
+"""
+
+import pytest
+
+import config
+from llm import circuit_breaker
+from llm.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreakers, CircuitOpenError
+
+PAID = 'google/gemini-2.5-flash-lite'
+FREE = 'tngtech/deepseek-r1t2-chimera:free'
+OTHER_FREE = 'meta-llama/llama-3.3-70b-instruct:free'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def breakers(tmp_path, monkeypatch, clock):
+    monkeypatch.setitem(config.CIRCUIT_BREAKER_PARAMS, 'failure_threshold', 2)
+    monkeypatch.setitem(config.CIRCUIT_BREAKER_PARAMS, 'open_seconds', 30)
+    monkeypatch.setitem(config.CIRCUIT_BREAKER_PARAMS, 'max_open_seconds', 100)
+    monkeypatch.setitem(config.CIRCUIT_BREAKER_PARAMS, 'probe_timeout', 10)
+    monkeypatch.setitem(config.CIRCUIT_BREAKER_PARAMS, 'fallbacks', [])
+    return CircuitBreakers(str(tmp_path / 'breakers.sqlite'))
+
+
+def state(breakers, model):
+    return {row['model']: row for row in breakers.status()}[model]
+
+
+def test_opens_after_threshold(breakers):
+    breakers.record_failure(FREE, TimeoutError("timeout"))
+    assert breakers.allow(FREE)
+    breakers.record_failure(FREE, TimeoutError("timeout"))
+    assert state(breakers, FREE)['state'] == OPEN
+    assert not breakers.allow(FREE)
+    assert not breakers.is_available(FREE)
+
+
+def test_success_resets_failures(breakers):
+    breakers.record_failure(FREE)
+    breakers.record_success(FREE)
+    breakers.record_failure(FREE)
+    assert state(breakers, FREE)['state'] == CLOSED
+
+
+def test_half_open_single_probe_then_close(breakers, clock):
+    breakers.record_failure(FREE)
+    breakers.record_failure(FREE)
+    clock.now += 31
+    assert breakers.allow(FREE)
+    assert state(breakers, FREE)['state'] == HALF_OPEN
+    # Пока проба идет, остальные запросы получают отказ
+    assert not breakers.allow(FREE)
+    breakers.record_success(FREE)
+    assert state(breakers, FREE)['state'] == CLOSED
+    assert breakers.allow(FREE)
+
+
+def test_failed_probe_doubles_pause(breakers, clock):
+    breakers.record_failure(FREE)
+    breakers.record_failure(FREE)
+    for expected in (60, 100):
+        clock.now += 200
+        assert breakers.allow(FREE)
+        breakers.record_failure(FREE)
+        row = state(breakers, FREE)
+        assert row['state'] == OPEN
+        assert row['open_seconds'] == expected
+
+
+def test_stuck_probe_is_replaced(breakers, clock):
+    breakers.record_failure(FREE)
+    breakers.record_failure(FREE)
+    clock.now += 31
+    assert breakers.allow(FREE)
+    clock.now += 11
+    assert breakers.allow(FREE)
+
+
+def test_route_keeps_free_model_free(breakers):
+    for _ in range(2):
+        breakers.record_failure(FREE)
+    assert breakers.route(FREE) == OTHER_FREE
+    for _ in range(2):
+        breakers.record_failure(OTHER_FREE)
+    # Платная модель не подставляется вместо бесплатной
+    with pytest.raises(CircuitOpenError):
+        breakers.route(FREE)
+
+
+def test_route_paid_model_to_any_alternate(breakers):
+    for _ in range(2):
+        breakers.record_failure(PAID)
+    assert breakers.route(PAID) == FREE
+
+
+def test_released_probe_is_granted_again(breakers, clock):
+    breakers.record_failure(FREE)
+    breakers.record_failure(FREE)
+    clock.now += 31
+    assert breakers.allow(FREE)
+    # Проба завершилась ошибкой квоты или отменой: модель не виновата
+    breakers.release(FREE)
+    row = state(breakers, FREE)
+    assert row['state'] == OPEN and row['open_seconds'] == 30
+    assert breakers.is_available(FREE)
+    assert breakers.allow(FREE)
+    assert not breakers.allow(FREE)
+
+
+def test_release_keeps_closed_circuit(breakers):
+    breakers.record_failure(FREE)
+    breakers.release(FREE)
+    row = state(breakers, FREE)
+    assert row['state'] == CLOSED and row['failures'] == 1
@@ -0,0 +1,37 @@
+"""
+Хеджирование: выбор альтернативной модели.
+"""
+
+import config
+from llm import hedging
+
+FREE = 'meta-llama/llama-3.3-70b-instruct:free'
+OTHER_FREE = 'tngtech/deepseek-r1t2-chimera:free'
+PAID = 'google/gemini-2.5-flash-lite'
+
+MESSAGES = [{"role": "user", "content": "Раздел занятия"}]
+
+
+def use_models(monkeypatch, models):
+    monkeypatch.setitem(config.HEDGING_PARAMS, 'alternates', [])
+    monkeypatch.setattr(config, 'AVAILABLE_MODELS', {str(number): model for number, model in enumerate(models)})
+    monkeypatch.setattr(config, 'MODEL_PRICES', {PAID: {'prompt': 0.1, 'completion': 0.4}})
+    monkeypatch.setattr(hedging, 'get_breakers', lambda: None)
+    budget = hedging.HedgeBudget()
+    budget.count_request()
+    monkeypatch.setattr(hedging, '_BUDGET', budget)
+
+
+def test_free_model_hedges_only_to_free(monkeypatch):
+    use_models(monkeypatch, [PAID, FREE, OTHER_FREE])
+    assert hedging._pick_alternate(FREE, MESSAGES, 1000) == OTHER_FREE
+
+
+def test_free_model_without_free_alternate_is_not_hedged(monkeypatch):
+    use_models(monkeypatch, [PAID, FREE])
+    assert hedging._pick_alternate(FREE, MESSAGES, 1000) is None
+
+
+def test_paid_model_may_hedge_to_any(monkeypatch):
+    use_models(monkeypatch, [FREE, PAID])
+    assert hedging._pick_alternate(PAID, MESSAGES, 1000) == FREE
@@ -0,0 +1,46 @@
+"""
+Промежуточный формат занятия: запись, чтение и экспорт без потери данных.
+"""
+
+import json
+
+from utils.exporters import export_lesson
+from utils.lesson_format import load_lesson, write_lesson
+
+CELLS = [
+    {"cell_type": "markdown", "metadata": {}, "source": ["# Закон Архимеда\n", "Введение"]},
+    {"cell_type": "code", "metadata": {"aimetodolog": {"section": "Опыт"}}, "execution_count": 3,
+     "outputs": [{"output_type": "stream", "name": "stdout", "text": ["9.8\n"]}], "source": ["print(9.8)"]},
+    {"cell_type": "code", "metadata": {}, "execution_count": None, "outputs": [], "source": ["x = 1"]},
+]
+
+
+def test_round_trip_keeps_execution_count(tmp_path):
+    path = write_lesson(str(tmp_path / 'lesson.lesson.jsonl'), {"title": "Закон Архимеда"}, CELLS)
+    meta, cells = load_lesson(path)
+    assert meta['title'] == "Закон Архимеда"
+    assert [cell.to_dict() for cell in cells] == CELLS
+
+
+def test_four_field_rows_still_load(tmp_path):
+    path = tmp_path / 'old.lesson.jsonl'
+    path.write_text('{"format":"aimetodolog-lesson","version":1,"title":"Старое"}\n'
+                    '["code","print(1)",null,[{"output_type":"stream","name":"stdout","text":["1\\n"]}]]\n',
+                    encoding='utf-8')
+    _, cells = load_lesson(str(path))
+    assert cells[0].execution_count is None
+    assert cells[0].outputs[0]['text'] == ["1\n"]
+
+
+def test_export_lesson_to_several_formats(tmp_path, monkeypatch):
+    import config
+    from utils import exporters
+
+    monkeypatch.setitem(config.SIGNING_PARAMS, 'enabled', False)
+    # Одно занятие экспортируется без пула процессов
+    monkeypatch.setattr(exporters, 'ProcessPoolExecutor', None)
+    path = write_lesson(str(tmp_path / 'lesson.lesson.jsonl'), {"title": "Закон Архимеда"}, CELLS)
+    exported = export_lesson(path, ['ipynb', 'md'])
+    assert set(exported) == {'ipynb', 'md'} and all(exported.values())
+    with open(exported['ipynb'], encoding='utf-8') as f:
+        assert json.load(f)['cells'][1]['execution_count'] == 3
@@ -0,0 +1,67 @@
+"""
+Индекс логов: регистрация, удаление по лимитам и очистка индекса.
+"""
+
+import os
+
+import pytest
+
+from utils import log_index
+
+
+@pytest.fixture
+def logs(tmp_config):
+    log_dir = tmp_config / 'logs'
+    log_dir.mkdir()
+    paths = []
+    for number in range(3):
+        path = log_dir / f"section_{number}_20260101_00000{number}.txt"
+        path.write_text("ответ" * 100, encoding='utf-8')
+        log_index.register_log(str(path), f"section_{number}")
+        paths.append(str(path))
+    return paths
+
+
+def indexed_paths():
+    return sorted(row['path'] for row in log_index.query_logs())
+
+
+def test_register_reuses_thread_connection(logs):
+    assert log_index._thread_connection() is log_index._thread_connection()
+    assert indexed_paths() == sorted(os.path.abspath(path) for path in logs)
+
+
+def test_prune_keeps_rows_of_files_that_were_not_removed(logs, monkeypatch):
+    remove = os.remove
+
+    def locked(path):
+        if path.endswith('_1_20260101_000001.txt'):
+            raise PermissionError("файл занят")
+        remove(path)
+
+    monkeypatch.setattr(os, 'remove', locked)
+    deleted, _ = log_index.prune_logs(max_total_mb=0)
+    assert deleted == 2
+    assert indexed_paths() == [os.path.abspath(logs[1])]
+
+
+def test_clear_index_keeps_archived_and_remaining_logs(logs, tmp_config):
+    archive_path = log_index.compact_logs(str(tmp_config / 'archive'), older_than_days=-1)
+    assert archive_path and all(not os.path.exists(path) for path in logs)
+
+    extra = tmp_config / 'logs' / 'llm_20260101_000009.txt'
+    extra.write_text("запрос", encoding='utf-8')
+    log_index.register_log(str(extra), 'llm')
+    stale = tmp_config / 'logs' / 'llm_20260101_000010.txt'
+    stale.write_text("запрос", encoding='utf-8')
+    log_index.register_log(str(stale), 'llm')
+    os.remove(stale)
+
+    assert log_index.clear_index() == 1
+    rows = log_index.query_logs()
+    assert len(rows) == 4
+    assert sum(row['archive'] == archive_path for row in rows) == 3
+
+    os.remove(archive_path)
+    assert log_index.clear_index() == 3
+    assert indexed_paths() == [os.path.abspath(str(extra))]
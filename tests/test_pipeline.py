@@ -0,0 +1,46 @@
+"""
+Конвейер: ошибки этапов не теряют элементы и не останавливают работу.
+"""
+
+import threading
+
+from core.pipeline import Pipeline, Stage, _parse_failed, _parse_item
+
+
+def double(item):
+    if item == 3:
+        raise ValueError("сбой")
+    return item * 2
+
+
+def run_with_timeout(pipeline, items, timeout=10):
+    results = []
+    thread = threading.Thread(target=lambda: results.extend(pipeline.run(items)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "конвейер завис"
+    return results
+
+
+def test_on_error_forwards_failed_item():
+    stages = [Stage('double', double, 2, on_error=lambda item, error: -item), Stage('keep', lambda x: x, 1)]
+    pipeline = Pipeline(stages, queue_size=1)
+    assert sorted(run_with_timeout(pipeline, range(5))) == [-3, 0, 2, 4, 8]
+    assert stages[0].failed == 1
+
+
+def test_failing_on_error_does_not_hang():
+    def broken(item, error):
+        raise RuntimeError("обработчик сбоя тоже упал")
+
+    stages = [Stage('double', double, 2, on_error=broken), Stage('keep', lambda x: x, 1)]
+    pipeline = Pipeline(stages, queue_size=1)
+    assert sorted(run_with_timeout(pipeline, range(5))) == [0, 2, 4, 8]
+    assert len(pipeline.errors) == 2
+
+
+def test_parse_stage_in_process_pool():
+    stages = [Stage('parse', _parse_item, 2, processes=True, on_error=_parse_failed)]
+    results = run_with_timeout(Pipeline(stages, queue_size=2), [(1, None), (2, "не JSON")], timeout=60)
+    assert sorted(results, key=lambda item: item[0]) == [(1, None), (2, (None, []))]
+    assert _parse_failed((7, "ответ"), OSError("пул процессов сломан")) == (7, (None, []))
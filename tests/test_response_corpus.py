@@ -0,0 +1,125 @@
+"""
+Корпус ответов: поиск по ключу и восстановление индекса после сбоя записи.
+"""
+
+import hashlib
+import os
+
+from llm.response_corpus import CORPUS_MAGIC, ResponseCorpus
+
+
+def key(number):
+    return hashlib.sha256(str(number).encode()).hexdigest()
+
+
+def record(number):
+    return {"key": key(number), "model": "m", "kind": "sections",
+            "messages": [{"role": "user", "content": f"запрос {number}"}], "response": f"ответ {number}"}
+
+
+def make_corpus(tmp_path, count=3):
+    corpus = ResponseCorpus(str(tmp_path / 'responses.corpus'))
+    for number in range(count):
+        corpus.append(record(number))
+    corpus.close()
+    return corpus.path
+
+
+def test_append_and_lookup(tmp_path):
+    corpus = ResponseCorpus(make_corpus(tmp_path))
+    assert len(corpus) == 3
+    assert corpus.lookup(key(1))['response'] == "ответ 1"
+    assert corpus.lookup(key("missing")) is None
+    assert [item['key'] for item in corpus] == [key(0), key(1), key(2)]
+    corpus.close()
+
+
+def test_torn_write_is_truncated(tmp_path):
+    path = make_corpus(tmp_path)
+    size = os.path.getsize(path)
+    # Сбой посреди записи: заголовок длины и часть данных
+    with open(path, 'ab') as f:
+        f.write((500).to_bytes(4, 'little') + b'{"key": "k", "resp')
+
+    corpus = ResponseCorpus(path)
+    assert len(corpus) == 3
+    assert os.path.getsize(path) == size
+    assert corpus.lookup(key(2))['response'] == "ответ 2"
+
+    corpus.append(record(3))
+    corpus.close()
+    reopened = ResponseCorpus(path)
+    assert [item['key'] for item in reopened] == [key(number) for number in range(4)]
+    reopened.close()
+
+
+def test_index_behind_data_is_rebuilt(tmp_path):
+    path = make_corpus(tmp_path)
+    # Сбой после записи данных, но до записи индекса (и оборванная запись индекса)
+    with open(path + '.idx', 'r+b') as f:
+        f.truncate(os.path.getsize(path + '.idx') - 7)
+
+    corpus = ResponseCorpus(path)
+    assert len(corpus) == 3
+    assert corpus.lookup(key(2))['response'] == "ответ 2"
+    corpus.close()
+    assert os.path.getsize(path + '.idx') % 20 == 0
+
+
+def test_missing_index_is_rebuilt(tmp_path):
+    path = make_corpus(tmp_path)
+    os.remove(path + '.idx')
+    corpus = ResponseCorpus(path)
+    assert len(corpus) == 3
+    assert corpus.lookup(key(0))['response'] == "ответ 0"
+    corpus.close()
+    with open(path, 'rb') as f:
+        assert f.read(len(CORPUS_MAGIC)) == CORPUS_MAGIC
+
+
+def test_corrupted_tail_record_is_dropped(tmp_path):
+    path = make_corpus(tmp_path)
+    size = os.path.getsize(path)
+    # Длина записана целиком, но данные не успели попасть на диск
+    with open(path, 'ab') as f:
+        f.write((8).to_bytes(4, 'little') + b'\0' * 8)
+
+    corpus = ResponseCorpus(path)
+    assert len(corpus) == 3
+    assert os.path.getsize(path) == size
+    corpus.close()
+
+
+def test_corrupted_middle_record_is_skipped(tmp_path):
+    path = make_corpus(tmp_path, count=4)
+    corpus = ResponseCorpus(path)
+    offset, length, _ = corpus._entries[1]
+    corpus.close()
+    # Поврежденные данные второй записи: длина цела, JSON нет
+    with open(path, 'r+b') as f:
+        f.seek(offset + 4)
+        f.write(b'\xff' * length)
+    size = os.path.getsize(path)
+    os.remove(path + '.idx')
+
+    corpus = ResponseCorpus(path)
+    assert [item['key'] for item in corpus] == [key(0), key(2), key(3)]
+    assert os.path.getsize(path) == size
+    corpus.close()
+
+
+def test_corrupted_length_header_resyncs(tmp_path):
+    path = make_corpus(tmp_path, count=3)
+    corpus = ResponseCorpus(path)
+    offset = corpus._entries[1][0]
+    corpus.close()
+    # Испорченный заголовок длины указывает за конец файла
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write((10 ** 9).to_bytes(4, 'little'))
+    os.remove(path + '.idx')
+
+    corpus = ResponseCorpus(path)
+    assert [item['key'] for item in corpus] == [key(0), key(2)]
+    assert corpus.lookup(key(2))['response'] == "ответ 2"
+    corpus.close()
@@ -0,0 +1,47 @@
+"""
+Поиск BM25 по индексу локальных материалов.
+"""
+
+from utils.retrieval import LocalRetriever, build_index
+
+
+def make_retriever(tmp_path, materials):
+    materials_dir = tmp_path / 'materials'
+    materials_dir.mkdir()
+    for name, text in materials.items():
+        (materials_dir / name).write_text(text, encoding='utf-8')
+    index_dir = str(tmp_path / 'index')
+    build_index(str(materials_dir), index_dir)
+    return LocalRetriever(index_dir)
+
+
+def test_ranking_prefers_matching_chunk(tmp_path):
+    retriever = make_retriever(tmp_path, {
+        'archimedes.txt': "Выталкивающая сила равна весу жидкости в объеме погруженного тела.",
+        'newton.txt': "Сила равна произведению массы тела на ускорение.",
+        'ohm.txt': "Сила тока прямо пропорциональна напряжению на участке цепи.",
+    })
+    results = retriever.search("выталкивающая сила жидкости")
+    assert results[0][2] == 'archimedes.txt'
+    assert [score for score, _, _ in results] == sorted((score for score, _, _ in results), reverse=True)
+    retriever.close()
+
+
+def test_single_chunk_corpus(tmp_path):
+    retriever = make_retriever(tmp_path, {'only.txt': "Закон Архимеда для жидкостей и газов."})
+    results = retriever.search("закон Архимеда")
+    assert [source for _, _, source in results] == ['only.txt']
+    retriever.close()
+
+
+def test_query_of_frequent_terms_only(tmp_path):
+    retriever = make_retriever(tmp_path, {
+        'a.txt': "Тело в жидкости теряет в весе.",
+        'b.txt': "Тело в газе тоже теряет в весе.",
+        'c.txt': "Плотность воды.",
+    })
+    # "тело" встречается в большинстве фрагментов, но других термов в запросе нет
+    assert {source for _, _, source in retriever.search("тело")} == {'a.txt', 'b.txt'}
+    # Более редкий терм в запросе: частый пропускается, ранжирование по редкому
+    assert [source for _, _, source in retriever.search("тело газе")] == ['b.txt']
+    retriever.close()
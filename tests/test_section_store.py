@@ -0,0 +1,69 @@
+"""
+Ключ хранилища разделов: все, что входит в промпт раздела, меняет ключ.
+"""
+
+from core.section_store import SectionStore
+from core.session_manager import SessionManager
+
+
+def make_session(structure, mode='full'):
+    session = SessionManager(generation_mode=mode)
+    session.lesson_title = "Закон Архимеда"
+    session.summarized_dialog = "Тема: Закон Архимеда\nУровень: средний (8-9 класс)"
+    session.lesson_structure = structure
+    return session
+
+
+def test_same_session_same_key(tmp_config):
+    first = make_session("1. Введение\n2. Опыт")
+    second = make_session("1. Введение\n2. Опыт")
+    assert SectionStore.make_key(first, None, 'm', 'v1') == SectionStore.make_key(second, None, 'm', 'v1')
+
+
+def test_structure_changes_key(tmp_config):
+    original = make_session("1. Введение\n2. Опыт")
+    edited = make_session("1. Введение\n2. Задачи\n3. Опыт")
+    assert SectionStore.make_key(original, None, 'm', 'v1') != SectionStore.make_key(edited, None, 'm', 'v1')
+
+
+def test_target_and_references_change_key(tmp_config):
+    session = make_session("1. Введение\n2. Опыт", mode='sections')
+    base = SectionStore.make_key(session, "1. Введение", 'm', 'v1', references="")
+    assert base != SectionStore.make_key(session, "2. Опыт", 'm', 'v1', references="")
+    assert base != SectionStore.make_key(session, "1. Введение", 'm', 'v1', references="Фрагмент учебника")
+
+
+def test_put_get_and_outline_hash_column(tmp_config):
+    store = SectionStore(str(tmp_config / 'sections.sqlite'))
+    session = make_session("1. Введение")
+    key = SectionStore.make_key(session, None, 'm', 'v1')
+    cells = [{"cell_type": "markdown", "metadata": {}, "source": ["# Введение\n", "Текст"]},
+             {"cell_type": "code", "metadata": {}, "source": ["print(1)"]}]
+    store.put(key, cells, session, None, 'm', 'v1')
+
+    stored = store.get(key)
+    assert [cell['cell_type'] for cell in stored] == ['markdown', 'code']
+    assert ''.join(stored[0]['source']) == "# Введение\nТекст"
+    assert store.find(outline_hash=SectionStore.outline_hash(session, None))[0]['key'] == key
+    assert store.get(SectionStore.make_key(make_session("1. Другое"), None, 'm', 'v1')) is None
+    store.close()
+
+
+def test_rerouted_section_found_under_requested_model(tmp_config, monkeypatch):
+    from types import SimpleNamespace
+
+    from core import lesson_generator
+
+    store = SectionStore(str(tmp_config / 'sections.sqlite'))
+    monkeypatch.setattr(lesson_generator, 'get_section_store', lambda: store)
+    session = make_session("1. Введение")
+    factory = SimpleNamespace(prompt_version='v1', get_references=lambda target: "")
+    cells = [{"cell_type": "markdown", "metadata": {}, "source": ["# Введение"]}]
+
+    # Ответила резервная модель вместо запрошенной
+    lesson_generator.finish_section(session, factory, None, 1, [], "", 'fallback', (cells, []),
+                                    requested_model='primary')
+    found = lesson_generator.lookup_section(session, factory, None, 1, 'primary')
+    assert [''.join(cell['source']) for cell in found] == ["# Введение"]
+    assert store.find(model='fallback') and not store.find(model='primary')
+    store.close()
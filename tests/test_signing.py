@@ -0,0 +1,91 @@
+"""
+Подпись и водяной знак ноутбуков: подпись, проверка и обнаружение изменений.
+"""
+
+import json
+
+from utils.signing import encode_watermark, extract_watermark, sign_notebook, strip_watermark, verify_notebook
+
+
+def make_notebook():
+    return {
+        "cells": [
+            {"cell_type": "markdown", "metadata": {}, "source": ["# Закон Архимеда\n", "Введение"]},
+            {"cell_type": "code", "metadata": {}, "outputs": [], "execution_count": None,
+             "source": ["print('Архимед')"]},
+        ],
+        "metadata": {},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }
+
+
+def save(notebook, path):
+    path.write_text(json.dumps(notebook, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+def test_watermark_round_trip():
+    text = "Заголовок" + encode_watermark("Иванова М. А.") + "\nТекст"
+    assert extract_watermark(text) == "Иванова М. А."
+    assert strip_watermark(text) == "Заголовок\nТекст"
+    assert extract_watermark("Без знака") is None
+
+
+def test_signed_notebook_verifies(tmp_path):
+    notebook = make_notebook()
+    signature = sign_notebook(notebook, author="Автор", key="secret", watermark=True)
+    assert signature['algorithm'] == 'hmac-sha256'
+    assert signature['cells'] == 2
+
+    result = verify_notebook(save(notebook, tmp_path / 'lesson.ipynb'), key="secret")
+    assert result['status'] == 'valid'
+    assert result['author'] == "Автор"
+    assert result['watermark'] == "Автор"
+
+
+def test_outputs_and_metadata_do_not_break_signature(tmp_path):
+    notebook = make_notebook()
+    sign_notebook(notebook, author="Автор", key="secret", watermark=False)
+    notebook['cells'][1]['outputs'] = [{"output_type": "stream", "name": "stdout", "text": ["Архимед\n"]}]
+    notebook['cells'][1]['execution_count'] = 1
+    notebook['cells'][0]['metadata']['collapsed'] = True
+    assert verify_notebook(save(notebook, tmp_path / 'lesson.ipynb'), key="secret")['status'] == 'valid'
+
+
+def test_modified_wrong_key_and_unsigned(tmp_path):
+    notebook = make_notebook()
+    sign_notebook(notebook, author="Автор", key="secret", watermark=True)
+    path = save(notebook, tmp_path / 'lesson.ipynb')
+    assert verify_notebook(path, key="other")['status'] == 'wrong_key'
+
+    notebook['cells'][1]['source'] = ["print('изменено')"]
+    assert verify_notebook(save(notebook, tmp_path / 'edited.ipynb'), key="secret")['status'] == 'modified'
+
+    assert verify_notebook(save(make_notebook(), tmp_path / 'plain.ipynb'), key="secret")['status'] == 'unsigned'
+
+
+def test_resigning_keeps_single_watermark(tmp_path):
+    notebook = make_notebook()
+    sign_notebook(notebook, author="Первый", key=None, watermark=True)
+    sign_notebook(notebook, author="Второй", key=None, watermark=True)
+    result = verify_notebook(save(notebook, tmp_path / 'lesson.ipynb'), key=None)
+    assert result['status'] == 'intact'
+    assert result['author'] is None
+    assert result['watermark'] == "Второй"
+    assert notebook['metadata']['aimetodolog_signature']['algorithm'] == 'sha256'
+    assert notebook['metadata']['aimetodolog_signature']['integrity_only'] is True
+
+
+def test_unkeyed_signature_rejected_when_key_given(tmp_path):
+    notebook = make_notebook()
+    sign_notebook(notebook, author="AIMetodolog", key=None, watermark=False)
+    result = verify_notebook(save(notebook, tmp_path / 'forged.ipynb'), key="real-secret")
+    assert result['status'] == 'unkeyed'
+    assert result['author'] is None
+    assert result['claimed_author'] == "AIMetodolog"
+
+    # Подмена алгоритма в метаданных не выключает проверку ключом
+    notebook['metadata']['aimetodolog_signature']['algorithm'] = 'hmac-sha256'
+    result = verify_notebook(save(notebook, tmp_path / 'forged.ipynb'), key="real-secret")
+    assert result['status'] in ('wrong_key', 'modified')
@@ -0,0 +1,285 @@
+"""
+Экспорт занятий из промежуточного формата (.lesson.jsonl) в выходные форматы.
+
+Экспортеры подключаются декоратором ``register_exporter``: функция получает
+метаданные, ячейки и путь файла. Встроены ipynb, Markdown (md) и HTML
+с оформлением для печати (html, сохраняется в PDF из браузера или
+weasyprint). Каталог занятий экспортируется параллельно процессами
+по всем ядрам, одно занятие - последовательно в текущем процессе;
+запросы к LLM при этом не выполняются.
+
+Использование из командной строки:
+    python -m utils.exporters output/ --formats md,html
+"""
+
+import html
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.lesson_format import find_lessons, lesson_stem, load_lesson
+from utils.notebook_builder import build_and_save_notebook
+
+# Формат -> (расширение файла, функция экспорта)
+EXPORTERS = {}
+
+
+def register_exporter(name, extension):
+    """
+    Регистрирует экспортер формата. Используется как декоратор функции
+    ``exporter(meta, cells, path)``.
+
+    Экспортеры, зарегистрированные после импорта модуля, доступны
+    процессам экспорта каталога только при запуске процессов через fork.
+
+    Args:
+        name: Имя формата
+        extension: Расширение файла (с точкой)
+    """
+    def decorator(func):
+        EXPORTERS[name] = (extension, func)
+        return func
+    return decorator
+
+
+@register_exporter('ipynb', '.ipynb')
+def export_ipynb(meta, cells, path):
+    """Ноутбук Jupyter (nbformat v4)."""
+    return build_and_save_notebook(cells, os.path.dirname(path), os.path.basename(path))
+
+
+@register_exporter('md', '.md')
+def export_markdown(meta, cells, path):
+    """Markdown: текст ячеек markdown и блоки кода."""
+    parts = []
+    for cell in cells:
+        if cell.cell_type == 'code':
+            parts.append(f"```python\n{cell.source.rstrip()}\n```")
+        else:
+            parts.append(cell.source.strip())
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n\n'.join(part for part in parts if part))
+        f.write('\n')
+    return path
+
+
+# Оформление HTML: экран и печать в PDF (A4, без разрыва блоков кода)
+_HTML_STYLE = """
+body { font-family: "DejaVu Sans", Arial, sans-serif; max-width: 860px; margin: 2em auto; line-height: 1.5; }
+pre { background: #f6f8fa; padding: 0.8em; border-radius: 4px; overflow-x: auto; }
+code { font-family: "DejaVu Sans Mono", monospace; font-size: 0.92em; }
+table { border-collapse: collapse; } td, th { border: 1px solid #ccc; padding: 0.3em 0.6em; }
+@page { size: A4; margin: 18mm 16mm; }
+@media print {
+  body { margin: 0; max-width: none; }
+  pre, table, img { page-break-inside: avoid; }
+  h1, h2, h3, h4 { page-break-after: avoid; }
+}
+"""
+
+_INLINE_RULES = (
+    (re.compile(r'`([^`]+)`'), r'<code>\1</code>'),
+    (re.compile(r'\*\*([^*]+)\*\*'), r'<strong>\1</strong>'),
+    (re.compile(r'(?<![*\w])\*([^*]+)\*(?!\w)'), r'<em>\1</em>'),
+    (re.compile(r'\[([^\]]+)\]\(([^)\s]+)\)'), r'<a href="\2">\1</a>'),
+)
+
+
+def _inline(text):
+    """Встроенная разметка строки (код, выделение, ссылки)."""
+    text = html.escape(text, quote=False)
+    for pattern, replacement in _INLINE_RULES:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _markdown_to_html(source):
+    """
+    Преобразует Markdown в HTML. Используется библиотека markdown, если она
+    установлена, иначе - упрощенный разбор (заголовки, списки, код, абзацы).
+    """
+    try:
+        import markdown
+        return markdown.markdown(source, extensions=['fenced_code', 'tables'])
+    except ImportError:
+        pass
+
+    blocks = []
+    paragraph = []
+    list_items = []
+    code_lines = None
+
+    def flush():
+        if paragraph:
+            blocks.append(f"<p>{_inline(' '.join(paragraph))}</p>")
+            paragraph.clear()
+        if list_items:
+            items = ''.join(f"<li>{_inline(item)}</li>" for item in list_items)
+            blocks.append(f"<ul>{items}</ul>")
+            list_items.clear()
+
+    for line in source.splitlines():
+        if code_lines is not None:
+            if line.strip().startswith('```'):
+                blocks.append(f"<pre><code>{html.escape(chr(10).join(code_lines))}</code></pre>")
+                code_lines = None
+            else:
+                code_lines.append(line)
+            continue
+
+        stripped = line.strip()
+        heading = re.match(r'(#{1,6})\s+(.*)', stripped)
+        item = re.match(r'(?:[-*+]|\d+[.)])\s+(.*)', stripped)
+        if stripped.startswith('```'):
+            flush()
+            code_lines = []
+        elif heading:
+            flush()
+            level = len(heading.group(1))
+            blocks.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+        elif item:
+            if paragraph:
+                flush()
+            list_items.append(item.group(1))
+        elif not stripped:
+            flush()
+        else:
+            if list_items:
+                flush()
+            paragraph.append(stripped)
+
+    if code_lines is not None:
+        blocks.append(f"<pre><code>{html.escape(chr(10).join(code_lines))}</code></pre>")
+    flush()
+    return '\n'.join(blocks)
+
+
+@register_exporter('html', '.html')
+def export_html(meta, cells, path):
+    """HTML-страница с оформлением для печати в PDF."""
+    body = []
+    for cell in cells:
+        if cell.cell_type == 'code':
+            body.append(f'<pre><code class="language-python">{html.escape(cell.source.rstrip())}</code></pre>')
+        elif cell.cell_type == 'markdown':
+            body.append(_markdown_to_html(cell.source))
+        else:
+            body.append(f"<pre>{html.escape(cell.source)}</pre>")
+
+    title = html.escape(meta.get('title') or lesson_stem(path))
+    document = (f'<!DOCTYPE html>\n<html lang="ru">\n<head>\n<meta charset="utf-8">\n'
+                f'<title>{title}</title>\n<style>{_HTML_STYLE}</style>\n</head>\n<body>\n'
+                + '\n'.join(body) + '\n</body>\n</html>\n')
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(document)
+    return path
+
+
+def _export_one(lesson_path, fmt, output_dir):
+    """
+    Экспортирует одно занятие в один формат (выполняется в процессе пула).
+
+    Returns:
+        str: Путь к файлу или None при ошибке
+    """
+    extension, exporter = EXPORTERS[fmt]
+    meta, cells = load_lesson(lesson_path)
+    target_dir = output_dir or os.path.dirname(lesson_path)
+    os.makedirs(target_dir, exist_ok=True)
+    return exporter(meta, cells, os.path.join(target_dir, lesson_stem(lesson_path) + extension))
+
+
+def export_catalog(lesson_paths, formats=None, output_dir=None, max_workers=None):
+    """
+    Экспортирует занятия во все заданные форматы параллельно процессами.
+
+    Args:
+        lesson_paths: Пути к файлам .lesson.jsonl
+        formats: Форматы экспорта (по умолчанию из конфига)
+        output_dir: Папка результатов (по умолчанию рядом с файлом занятия)
+        max_workers: Число процессов (по умолчанию из конфига или по числу ядер)
+
+    Returns:
+        dict: (путь занятия, формат) -> путь файла или None при ошибке
+    """
+    import config
+
+    params = config.EXPORT_PARAMS
+    formats = formats or params['formats']
+    unknown = [fmt for fmt in formats if fmt not in EXPORTERS]
+    if unknown:
+        raise ValueError(f"Неизвестные форматы экспорта: {unknown}. Доступны: {sorted(EXPORTERS)}")
+
+    tasks = [(path, fmt) for path in lesson_paths for fmt in formats]
+    results = {}
+    workers = min(len(tasks), max_workers or params['max_workers'] or os.cpu_count() or 1)
+
+    # Одна задача или один процесс - без накладных расходов на пул
+    if workers <= 1:
+        for path, fmt in tasks:
+            try:
+                results[(path, fmt)] = _export_one(path, fmt, output_dir)
+            except Exception as e:
+                print(f"❌ Ошибка экспорта {os.path.basename(path)} в {fmt}: {e}")
+                results[(path, fmt)] = None
+        return results
+
+    # spawn: экспорт может вызываться из процесса с работающими потоками
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(_export_one, path, fmt, output_dir): (path, fmt) for path, fmt in tasks}
+        for future in as_completed(futures):
+            path, fmt = futures[future]
+            try:
+                results[(path, fmt)] = future.result()
+            except Exception as e:
+                print(f"❌ Ошибка экспорта {os.path.basename(path)} в {fmt}: {e}")
+                results[(path, fmt)] = None
+    return results
+
+
+def export_lesson(lesson_path, formats=None, output_dir=None):
+    """
+    Экспортирует одно занятие в заданные форматы последовательно: пул
+    процессов ради нескольких файлов дороже самого экспорта, а вызов идет
+    и из потоков (asyncio.to_thread, фоновое улучшение занятия).
+
+    Returns:
+        dict: Формат -> путь файла (None при ошибке)
+    """
+    results = export_catalog([lesson_path], formats, output_dir, max_workers=1)
+    return {fmt: path for (_, fmt), path in results.items()}
+
+
+def main():
+    """Повторный экспорт каталога занятий из командной строки."""
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Экспорт занятий AIMetodolog из формата .lesson.jsonl")
+    parser.add_argument('paths', nargs='+', help="Файлы .lesson.jsonl или папки с ними")
+    parser.add_argument('--formats', help=f"Форматы через запятую ({', '.join(sorted(EXPORTERS))})")
+    parser.add_argument('--output', help="Папка результатов (по умолчанию рядом с занятиями)")
+    parser.add_argument('--workers', type=int, help="Число процессов (по умолчанию по числу ядер)")
+    args = parser.parse_args()
+
+    lesson_paths = []
+    for path in args.paths:
+        lesson_paths.extend(find_lessons(path) if os.path.isdir(path) else [path])
+    if not lesson_paths:
+        print("⚠️  Файлы занятий не найдены")
+        return
+
+    formats = args.formats.split(',') if args.formats else None
+    start_time = time.time()
+    results = export_catalog(lesson_paths, formats, args.output, args.workers)
+    done = sum(1 for path in results.values() if path)
+    print(f"📤 Экспортировано файлов: {done}/{len(results)} за {time.time() - start_time:.2f} сек.")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
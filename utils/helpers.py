@@ -7,6 +7,9 @@ import textwrap
 import os
 from datetime import datetime
 
+from utils.profiling import profile_stage
+
+@profile_stage('format_text')
 def format_text(text, width=None):
     """Форматирует текст для красивого вывода."""
     if width is None:
@@ -29,6 +32,7 @@ def text_to_list_lines(text):
     lines_list = text.split("\n")
     return [line for line in lines_list if line.strip() != '']
 
+@profile_stage('log_to_file')
 def log_to_file(content, prefix="log", log_dir=None):
     """Логирует содержимое в файл для отладки."""
     if log_dir is None:
@@ -43,6 +47,10 @@ def log_to_file(content, prefix="log", log_dir=None):
     try:
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(str(content))
+        
+        # Регистрируем лог в индексе (сессия и раздел берутся из log_context)
+        from utils.log_index import register_log
+        register_log(filename, prefix)
         return filename
     except Exception as e:
         print(f"⚠️ Ошибка записи лога: {e}")
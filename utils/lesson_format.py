@@ -0,0 +1,147 @@
+"""
+Промежуточный формат занятия (.lesson.jsonl).
+
+Занятие записывается один раз после генерации, а затем экспортируется
+в нужные форматы (ipynb, Markdown, HTML) без повторных запросов к LLM.
+Формат построчный и компактный: первая строка - заголовок с метаданными
+и структурой занятия, каждая следующая - одна ячейка в виде массива
+[тип, текст, метаданные, выводы, номер выполнения] (пустые хвостовые поля
+опускаются, поэтому файлы без номера выполнения читаются так же).
+"""
+
+import json
+import os
+
+# Идентификатор и версия формата
+LESSON_FORMAT = 'aimetodolog-lesson'
+LESSON_FORMAT_VERSION = 1
+
+# Расширение файлов занятия
+LESSON_EXTENSION = '.lesson.jsonl'
+
+
+def _dumps(value):
+    """Компактная сериализация одной строки файла."""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def lesson_meta(session, model=None):
+    """
+    Метаданные занятия из сессии.
+
+    Args:
+        session: Экземпляр SessionManager
+        model: Модель, которой сгенерировано занятие (опционально)
+
+    Returns:
+        dict: Метаданные для заголовка файла
+    """
+    return {
+        "title": session.lesson_title,
+        "session_id": session.session_id,
+        "created_at": session.created_at.isoformat(),
+        "generation_mode": session.generation_mode,
+        "model": model,
+        "outline": session.lesson_structure,
+    }
+
+
+def write_lesson(path, meta, cells):
+    """
+    Записывает занятие в промежуточный формат.
+
+    Args:
+        path: Путь к файлу (.lesson.jsonl)
+        meta: Метаданные занятия
+        cells: Ячейки (Cell или словари nbformat)
+
+    Returns:
+        str: Путь к файлу
+    """
+    from core.cell import Cell
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    lines = [_dumps({"format": LESSON_FORMAT, "version": LESSON_FORMAT_VERSION, **meta})]
+    for cell in cells:
+        cell = Cell.from_dict(cell)
+        row = [cell.cell_type, cell.source, cell.metadata, cell.outputs, cell.execution_count]
+        while row[-1] is None:
+            row.pop()
+        lines.append(_dumps(row))
+
+    # Запись во временный файл и замена: читатели не видят недописанное занятие
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+        f.write('\n')
+    os.replace(tmp_path, path)
+    return path
+
+
+def save_lesson(session, path, model=None):
+    """
+    Сохраняет занятие сессии в промежуточный формат.
+
+    Returns:
+        str: Путь к файлу
+    """
+    return write_lesson(path, lesson_meta(session, model), session.cells)
+
+
+def load_lesson(path):
+    """
+    Читает занятие из промежуточного формата.
+
+    Args:
+        path: Путь к файлу (.lesson.jsonl)
+
+    Returns:
+        tuple: (метаданные, список Cell)
+
+    Raises:
+        ValueError: файл не является занятием или версия формата не поддерживается
+    """
+    from core.cell import Cell
+
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline() or 'null')
+        if not isinstance(header, dict) or header.get('format') != LESSON_FORMAT:
+            raise ValueError(f"{path}: не файл занятия")
+        if header.get('version', 0) > LESSON_FORMAT_VERSION:
+            raise ValueError(f"{path}: версия формата {header['version']} не поддерживается")
+
+        cells = []
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            row += [None] * (5 - len(row))
+            cells.append(Cell(cell_type=row[0], source=row[1], metadata=row[2], outputs=row[3],
+                              execution_count=row[4]))
+
+    meta = {key: value for key, value in header.items() if key not in ('format', 'version')}
+    return meta, cells
+
+
+def lesson_stem(path):
+    """Имя занятия без папки и расширения (для имен экспортированных файлов)."""
+    name = os.path.basename(path)
+    if name.endswith(LESSON_EXTENSION):
+        return name[:-len(LESSON_EXTENSION)]
+    return os.path.splitext(name)[0]
+
+
+def find_lessons(directory):
+    """
+    Находит файлы занятий в папке (рекурсивно).
+
+    Returns:
+        list: Отсортированные пути к файлам .lesson.jsonl
+    """
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.endswith(LESSON_EXTENSION))
+    return sorted(paths)
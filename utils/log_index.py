@@ -0,0 +1,311 @@
+"""
+Индекс лог-файлов в SQLite.
+
+Каждый записанный лог регистрируется с сессией, разделом, префиксом, размером
+и временем создания, что позволяет находить пары запрос/ответ по разделу без
+перебора файлов и удалять или архивировать логи пакетно.
+"""
+
+import contextvars
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Текущая сессия и раздел для логов (свои для каждого потока/задачи)
+_session_var = contextvars.ContextVar('log_session', default=None)
+_section_var = contextvars.ContextVar('log_section', default=None)
+
+_INITIALIZED = set()
+
+# Соединения регистрации логов: одно на поток и файл индекса
+_THREAD_CONNECTIONS = threading.local()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    session_id TEXT,
+    section TEXT,
+    prefix TEXT,
+    size INTEGER,
+    created_at REAL,
+    archive TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_logs_session ON logs(session_id, section);
+CREATE INDEX IF NOT EXISTS idx_logs_created ON logs(created_at);
+CREATE INDEX IF NOT EXISTS idx_logs_prefix ON logs(prefix);
+"""
+
+# Имя лог-файла: <префикс>_<ГГГГММДД>_<ЧЧММСС>.txt
+_LOG_NAME_RE = re.compile(r'^(.*)_(\d{8})_(\d{6})\.txt$')
+
+
+def _index_file():
+    """Путь к базе индекса."""
+    import config
+    return config.LOG_INDEX_FILE
+
+
+def connect(index_file=None):
+    """
+    Открывает базу индекса, создавая схему при необходимости.
+
+    Returns:
+        sqlite3.Connection: Соединение с базой
+    """
+    index_file = index_file or _index_file()
+    if index_file not in _INITIALIZED:
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+    connection = sqlite3.connect(index_file, timeout=30)
+    if index_file not in _INITIALIZED:
+        connection.executescript(_SCHEMA)
+        _INITIALIZED.add(index_file)
+    return connection
+
+
+@contextmanager
+def log_context(session_id=None, section=None):
+    """
+    Задает сессию и раздел для логов, записываемых внутри блока.
+
+    Args:
+        session_id: Идентификатор сессии (None - не менять)
+        section: Название раздела (None - не менять)
+    """
+    tokens = []
+    if session_id is not None:
+        tokens.append((_session_var, _session_var.set(session_id)))
+    if section is not None:
+        tokens.append((_section_var, _section_var.set(section)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_context():
+    """
+    Возвращает текущие сессию и раздел, заданные через log_context.
+
+    Returns:
+        tuple: (session_id, section)
+    """
+    return _session_var.get(), _section_var.get()
+
+
+def _thread_connection():
+    """Соединение текущего потока с базой индекса (открывается один раз)."""
+    index_file = _index_file()
+    connections = _THREAD_CONNECTIONS.__dict__.setdefault('connections', {})
+    if index_file not in connections:
+        connections[index_file] = connect(index_file)
+    return connections[index_file]
+
+
+def register_log(path, prefix):
+    """
+    Регистрирует записанный лог-файл в индексе.
+
+    Args:
+        path: Путь к лог-файлу
+        prefix: Префикс лога (llm, respond, section_1 и т.п.)
+    """
+    try:
+        size = os.path.getsize(path)
+        connection = _thread_connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO logs (path, session_id, section, prefix, size, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (os.path.abspath(path), _session_var.get(), _section_var.get(), prefix, size, time.time())
+            )
+    except Exception as e:
+        print(f"⚠️ Ошибка индексации лога: {e}")
+
+
+def reindex(log_dir):
+    """
+    Добавляет в индекс лог-файлы, записанные без регистрации (один проход по директории).
+
+    Returns:
+        int: Количество добавленных файлов
+    """
+    connection = connect()
+    known = {row[0] for row in connection.execute("SELECT path FROM logs")}
+    rows = []
+
+    for entry in os.scandir(log_dir):
+        if not entry.is_file():
+            continue
+        path = os.path.abspath(entry.path)
+        if path in known:
+            continue
+        match = _LOG_NAME_RE.match(entry.name)
+        prefix = match.group(1) if match else os.path.splitext(entry.name)[0]
+        stat = entry.stat()
+        rows.append((path, None, None, prefix, stat.st_size, stat.st_mtime))
+
+    with connection:
+        connection.executemany(
+            "INSERT OR IGNORE INTO logs (path, session_id, section, prefix, size, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+    connection.close()
+    return len(rows)
+
+
+def query_logs(session_id=None, section=None, prefix=None, since=None, limit=100):
+    """
+    Ищет логи по сессии, разделу, префиксу и времени.
+
+    Args:
+        session_id: Идентификатор сессии (подстрока)
+        section: Название раздела (подстрока)
+        prefix: Префикс лога (подстрока)
+        since: Unix-время, не раньше которого создан лог
+        limit: Максимальное количество записей
+
+    Returns:
+        list: Словари с полями path, session_id, section, prefix, size, created_at, archive
+    """
+    conditions, params = [], []
+    for column, value in (('session_id', session_id), ('section', section), ('prefix', prefix)):
+        if value:
+            conditions.append(f"{column} LIKE ?")
+            params.append(f"%{value}%")
+    if since:
+        conditions.append("created_at >= ?")
+        params.append(since)
+
+    sql = "SELECT path, session_id, section, prefix, size, created_at, archive FROM logs"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY created_at DESC LIMIT ?"
+    params.append(limit)
+
+    connection = connect()
+    columns = ('path', 'session_id', 'section', 'prefix', 'size', 'created_at', 'archive')
+    rows = [dict(zip(columns, row)) for row in connection.execute(sql, params)]
+    connection.close()
+    return rows
+
+
+def _select_for_retention(connection, older_than_days=None, max_total_mb=None):
+    """Выбирает неархивированные логи, выходящие за возрастной или размерный лимит."""
+    selected = {}
+    rows = connection.execute(
+        "SELECT id, path, size, created_at FROM logs WHERE archive IS NULL ORDER BY created_at DESC"
+    ).fetchall()
+
+    if older_than_days is not None:
+        cutoff = time.time() - older_than_days * 86400
+        for row in rows:
+            if row[3] < cutoff:
+                selected[row[0]] = row
+
+    if max_total_mb is not None:
+        # Оставляем самые свежие логи в пределах лимита размера
+        budget = max_total_mb * 1024 * 1024
+        total = 0
+        for row in rows:
+            total += row[2] or 0
+            if total > budget:
+                selected[row[0]] = row
+
+    return list(selected.values())
+
+
+def prune_logs(older_than_days=None, max_total_mb=None):
+    """
+    Удаляет старые логи и логи сверх лимита размера, обновляя индекс одним запросом.
+
+    Args:
+        older_than_days: Удалять логи старше N дней
+        max_total_mb: Оставлять не более N МБ самых свежих логов
+
+    Returns:
+        tuple: (количество удаленных файлов, освобождено байт)
+    """
+    connection = connect()
+    rows = _select_for_retention(connection, older_than_days, max_total_mb)
+
+    freed = 0
+    removed = []
+    for row_id, path, size, _ in rows:
+        try:
+            os.remove(path)
+            freed += size or 0
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # Файл остался на диске - запись индекса сохраняется
+            print(f"Ошибка при удалении {path}: {e}")
+            continue
+        removed.append((row_id,))
+
+    with connection:
+        connection.executemany("DELETE FROM logs WHERE id = ?", removed)
+    connection.close()
+    return len(removed), freed
+
+
+def compact_logs(archive_dir, older_than_days):
+    """
+    Упаковывает старые логи в сжатый архив tar.gz и удаляет исходные файлы.
+
+    Записи индекса сохраняются и указывают на архив.
+
+    Args:
+        archive_dir: Директория для архивов
+        older_than_days: Архивировать логи старше N дней
+
+    Returns:
+        str: Путь к архиву или None, если архивировать нечего
+    """
+    import tarfile
+    from datetime import datetime
+
+    connection = connect()
+    rows = _select_for_retention(connection, older_than_days=older_than_days)
+    rows = [row for row in rows if os.path.exists(row[1])]
+    if not rows:
+        connection.close()
+        return None
+
+    os.makedirs(archive_dir, exist_ok=True)
+    archive_path = os.path.join(archive_dir, f"logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.tar.gz")
+
+    with tarfile.open(archive_path, 'w:gz') as archive:
+        for _, path, _, _ in rows:
+            archive.add(path, arcname=os.path.basename(path))
+
+    for _, path, _, _ in rows:
+        os.remove(path)
+
+    with connection:
+        connection.executemany("UPDATE logs SET archive = ? WHERE id = ?",
+                               [(archive_path, row[0]) for row in rows])
+    connection.close()
+    return archive_path
+
+
+def clear_index():
+    """
+    Удаляет записи индекса, файлы которых больше не существуют. Записи
+    логов в сохраненных архивах и файлов, которые не удалось удалить, остаются.
+
+    Returns:
+        int: Количество удаленных записей
+    """
+    connection = connect()
+    rows = connection.execute("SELECT id, path, archive FROM logs").fetchall()
+    stale = [(row_id,) for row_id, path, archive in rows if not os.path.exists(archive or path)]
+    with connection:
+        connection.executemany("DELETE FROM logs WHERE id = ?", stale)
+    connection.close()
+    return len(stale)
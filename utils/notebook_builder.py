@@ -5,21 +5,23 @@
 import json
 import os
 
-def build_and_save_notebook(cells, output_dir, filename):
+from utils.profiling import profile_stage
+
+def build_notebook(cells):
     """
-    Создаёт ноутбук из списка ячеек и сохраняет его.
+    Создаёт структуру ноутбука nbformat v4 из списка ячеек.
     
     Args:
-        cells (list): Список ячеек ноутбука
-        output_dir (str): Директория для сохранения
-        filename (str): Имя файла
+        cells (list): Список ячеек ноутбука (Cell или словари nbformat)
     
     Returns:
-        str: Путь к сохранённому файлу
+        dict: Ноутбук, готовый к сериализации в JSON
     """
-    # Полная структура ноутбука
-    notebook = {
-        "cells": cells,
+    # Компактные ячейки преобразуются в словари nbformat только здесь
+    from core.cell import cells_to_dicts
+    
+    return {
+        "cells": cells_to_dicts(cells),
         "metadata": {
             "kernelspec": {
                 "display_name": "Python 3",
@@ -34,6 +36,29 @@ def build_and_save_notebook(cells, output_dir, filename):
         "nbformat": 4,
         "nbformat_minor": 5
     }
+
+@profile_stage('build_and_save_notebook')
+def build_and_save_notebook(cells, output_dir, filename):
+    """
+    Создаёт ноутбук из списка ячеек и сохраняет его.
+    
+    Args:
+        cells (list): Список ячеек ноутбука (Cell или словари nbformat)
+        output_dir (str): Директория для сохранения
+        filename (str): Имя файла
+    
+    Returns:
+        str: Путь к сохранённому файлу
+    """
+    import config
+    
+    # Полная структура ноутбука
+    notebook = build_notebook(cells)
+    
+    # Водяной знак и подпись автора наносятся за один проход по ячейкам
+    if config.SIGNING_PARAMS['enabled']:
+        from utils.signing import sign_notebook
+        sign_notebook(notebook)
     
     # Создаем директорию
     os.makedirs(output_dir, exist_ok=True)
@@ -0,0 +1,292 @@
+"""
+Проверка сгенерированных ноутбуков выполнением ячеек кода.
+
+Каждый ноутбук выполняется в отдельном изолированном процессе Python
+(аналог ядра Jupyter) с тайм-аутом на ячейку и ограничением памяти.
+Результаты выполнения записываются обратно в ноутбук, а разделы
+с ошибками помечаются для повторной генерации.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Скрипт "ядра": получает ячейки через stdin, выполняет их в общем пространстве имен
+# и дописывает результат каждой ячейки строкой JSON в файл результатов. Вывод
+# ячеек в stdout (в том числе из C-расширений и подпроцессов) результатам не мешает,
+# а при аварии ядра результаты выполненных ячеек сохраняются
+_KERNEL_SCRIPT = r'''
+import io, json, sys, traceback, contextlib
+
+task = json.loads(sys.stdin.read())
+results_file = open(task["results_path"], "w", encoding="utf-8")
+
+try:
+    import resource
+    limit = task["memory_mb"] * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+except Exception:
+    pass
+
+try:
+    import signal
+    def _on_timeout(signum, frame):
+        raise TimeoutError(f"Превышено время выполнения ячейки ({task['timeout']} сек.)")
+    signal.signal(signal.SIGALRM, _on_timeout)
+    has_alarm = True
+except Exception:
+    has_alarm = False
+
+namespace = {"__name__": "__main__"}
+for i, source in enumerate(task["cells"]):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    error = None
+    try:
+        if has_alarm:
+            signal.alarm(task["timeout"])
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            exec(compile(source, f"<cell {i}>", "exec"), namespace)
+    except BaseException as e:
+        error = {
+            "ename": type(e).__name__,
+            "evalue": str(e),
+            "traceback": traceback.format_exception(type(e), e, e.__traceback__)[1:],
+        }
+    finally:
+        if has_alarm:
+            signal.alarm(0)
+    results_file.write(json.dumps({"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "error": error}) + "\n")
+    results_file.flush()
+
+results_file.close()
+'''
+
+
+# Переменные окружения, передаваемые процессу выполнения ноутбука
+_ENV_ALLOWLIST = ('PATH', 'HOME', 'LANG', 'LC_ALL', 'LC_CTYPE', 'TZ', 'TMPDIR', 'TEMP', 'TMP',
+                  'SYSTEMROOT', 'SYSTEMDRIVE')
+
+
+def _prepare_source(source):
+    """
+    Готовит исходный код ячейки к выполнению вне Jupyter.
+
+    Магические команды (!pip, %matplotlib) не выполняются и заменяются комментариями.
+    """
+    if isinstance(source, list):
+        source = ''.join(source)
+
+    lines = []
+    for line in source.split('\n'):
+        stripped = line.lstrip()
+        if stripped.startswith(('!', '%')):
+            indent = line[:len(line) - len(stripped)]
+            lines.append(f"{indent}pass  # пропущено: {stripped}")
+        else:
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def _build_outputs(result):
+    """Формирует outputs ячейки в формате nbformat v4."""
+    outputs = []
+    for name in ('stdout', 'stderr'):
+        if result.get(name):
+            outputs.append({
+                "output_type": "stream",
+                "name": name,
+                "text": result[name].splitlines(keepends=True)
+            })
+    if result.get('error'):
+        outputs.append({"output_type": "error", **result['error']})
+    return outputs
+
+
+def _read_results(results_path):
+    """Результаты выполненных ячеек из файла ядра (недописанная строка отбрасывается)."""
+    results = []
+    try:
+        with open(results_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    results.append(json.loads(line))
+                except ValueError:
+                    break
+    except OSError:
+        pass
+    return results
+
+
+def _run_kernel(sources, cell_timeout, memory_limit_mb):
+    """
+    Выполняет ячейки в изолированном процессе Python.
+
+    Returns:
+        list: Результаты по ячейкам; при аварии ядра ячейка, на которой оно
+            завершилось, получает ошибку KernelDied, а невыполненные - признак skipped
+    """
+    # Исполняемый код получает только переменные из списка: ключи API, ключ
+    # подписи и другие секреты окружения ему недоступны
+    env = {name: os.environ[name] for name in _ENV_ALLOWLIST if name in os.environ}
+    env.update(MPLBACKEND='Agg', PYTHONIOENCODING='utf-8')
+
+    with tempfile.TemporaryDirectory(prefix='aimetodolog_exec_') as workdir:
+        results_path = os.path.join(workdir, '.aimetodolog_results.jsonl')
+        task = json.dumps({
+            "cells": sources,
+            "timeout": int(cell_timeout),
+            "memory_mb": int(memory_limit_mb),
+            "results_path": results_path
+        })
+        try:
+            completed = subprocess.run(
+                [sys.executable, '-I', '-c', _KERNEL_SCRIPT],
+                input=task,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding='utf-8',
+                cwd=workdir,
+                env=env,
+                timeout=cell_timeout * len(sources) + 10
+            )
+            reason = completed.stderr.strip().splitlines()[-1:] or [f"код возврата {completed.returncode}"]
+            reason = reason[0]
+        except subprocess.TimeoutExpired:
+            reason = "превышено общее время выполнения ноутбука"
+        except Exception as e:
+            reason = f"{type(e).__name__}: {e}"
+        results = _read_results(results_path)[:len(sources)]
+
+    if len(results) < len(sources):
+        # Ядро завершилось аварийно: ошибка у ячейки, на которой это случилось,
+        # следующие ячейки не выполнялись
+        results.append({"stdout": "", "stderr": "",
+                        "error": {"ename": "KernelDied", "evalue": reason, "traceback": []}})
+        results.extend({"skipped": True} for _ in range(len(sources) - len(results)))
+    return results
+
+
+def execute_notebook(notebook_path, cell_timeout=None, memory_limit_mb=None, write=True):
+    """
+    Выполняет ячейки кода ноутбука и записывает результаты в него.
+
+    Args:
+        notebook_path: Путь к .ipynb файлу
+        cell_timeout: Тайм-аут на ячейку в секундах (по умолчанию из конфига)
+        memory_limit_mb: Ограничение памяти процесса в МБ (по умолчанию из конфига)
+        write: Сохранять ли ноутбук с результатами выполнения
+
+    Returns:
+        dict: Отчет о выполнении (ячейки, ошибки, разделы для повторной генерации)
+    """
+    import config
+
+    cell_timeout = cell_timeout or config.EXECUTION_PARAMS['cell_timeout']
+    memory_limit_mb = memory_limit_mb or config.EXECUTION_PARAMS['memory_limit_mb']
+
+    with open(notebook_path, 'r', encoding='utf-8') as f:
+        notebook = json.load(f)
+
+    code_cells = [cell for cell in notebook.get('cells', []) if cell.get('cell_type') == 'code']
+    report = {"path": notebook_path, "executed": len(code_cells), "failed": 0, "skipped": 0, "failed_sections": []}
+
+    if not code_cells:
+        return report
+
+    results = _run_kernel([_prepare_source(c.get('source', '')) for c in code_cells],
+                          cell_timeout, memory_limit_mb)
+
+    failed_sections = []
+    for count, (cell, result) in enumerate(zip(code_cells, results), 1):
+        meta = cell.setdefault('metadata', {}).setdefault('aimetodolog', {})
+        if result.get('skipped'):
+            # Ячейка не выполнялась (ядро завершилось раньше): ошибкой не считается
+            cell['execution_count'] = None
+            cell['outputs'] = []
+            meta['execution'] = 'skipped'
+            report['skipped'] += 1
+            continue
+        cell['execution_count'] = count
+        cell['outputs'] = _build_outputs(result)
+        meta['execution'] = 'error' if result.get('error') else 'ok'
+
+        if result.get('error'):
+            report['failed'] += 1
+            section = meta.get('section')
+            if section and section not in failed_sections:
+                failed_sections.append(section)
+
+    report['executed'] -= report['skipped']
+    report['failed_sections'] = failed_sections
+    notebook.setdefault('metadata', {}).setdefault('aimetodolog', {})['execution'] = {
+        "executed": report['executed'],
+        "failed": report['failed'],
+        "skipped": report['skipped'],
+        "failed_sections": failed_sections
+    }
+
+    if write:
+        with open(notebook_path, 'w', encoding='utf-8') as f:
+            json.dump(notebook, f, ensure_ascii=False, indent=2)
+
+    return report
+
+
+def execute_notebooks(notebook_paths, max_workers=None, **kwargs):
+    """
+    Параллельно выполняет ячейки кода нескольких ноутбуков.
+
+    Каждый ноутбук выполняется в собственном процессе-ядре;
+    max_workers ограничивает число одновременно работающих ядер.
+
+    Args:
+        notebook_paths: Список путей к .ipynb файлам
+        max_workers: Количество одновременных ядер (по умолчанию из конфига)
+        **kwargs: Параметры для execute_notebook
+
+    Returns:
+        list: Отчеты по ноутбукам
+    """
+    import config
+
+    max_workers = max_workers or config.EXECUTION_PARAMS['max_workers']
+    reports = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(execute_notebook, path, **kwargs): path for path in notebook_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:
+                print(f"❌ Ошибка выполнения {os.path.basename(path)}: {e}")
+                continue
+            status = "✅" if report['failed'] == 0 else "⚠️ "
+            skipped = f", не выполнено {report['skipped']}" if report['skipped'] else ""
+            print(f"{status} {os.path.basename(path)}: ячеек {report['executed']}, с ошибками {report['failed']}{skipped}")
+            reports.append(report)
+
+    return reports
+
+
+def main():
+    """Запуск проверки из командной строки."""
+    if len(sys.argv) < 2 or sys.argv[1] in ['-h', '--help']:
+        print("Использование: python -m utils.notebook_executor <ноутбук.ipynb> [...]")
+        return
+
+    reports = execute_notebooks(sys.argv[1:])
+    for report in reports:
+        if report['failed_sections']:
+            print(f"\n🔁 {os.path.basename(report['path'])}: разделы для повторной генерации:")
+            for section in report['failed_sections']:
+                print(f"   - {section}")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
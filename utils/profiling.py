@@ -0,0 +1,213 @@
+"""
+Профилирование этапов конвейера генерации.
+
+Этапы (диалог, структура, промпты, запросы к LLM, починка JSON, сборка
+ноутбука, логи, форматирование) размечаются ``profile_stage`` - контекстным
+менеджером, который можно использовать и как декоратор. Для каждого этапа
+накапливается полное время и процессорное время потока; их разность - время
+ожидания ввода-вывода (сеть, диск, ввод пользователя).
+
+За запуск (``profile_run``) дополнительно можно снять профиль cProfile (.prof,
+открывается snakeviz/pstats) и семплы стеков в свернутом формате (.folded)
+для построения флейм-графа (flamegraph.pl, speedscope).
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+_LOCK = threading.Lock()
+_STAGES = {}
+_ENABLED = None
+
+
+def is_enabled():
+    """Включено ли профилирование этапов (настройка читается один раз)."""
+    global _ENABLED
+    if _ENABLED is None:
+        import config
+        _ENABLED = config.PROFILING_PARAMS['enabled']
+    return _ENABLED
+
+
+def set_enabled(enabled):
+    """Включает или выключает профилирование этапов во время работы."""
+    global _ENABLED
+    _ENABLED = bool(enabled)
+
+
+@contextmanager
+def profile_stage(name):
+    """
+    Замеряет этап конвейера. Используется как ``with profile_stage(...)``
+    или как декоратор ``@profile_stage(...)``.
+
+    Args:
+        name: Название этапа
+    """
+    if not is_enabled():
+        yield
+        return
+
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        with _LOCK:
+            stats = _STAGES.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+            stats['calls'] += 1
+            stats['wall'] += wall
+            stats['cpu'] += cpu
+
+
+def reset_stages():
+    """Сбрасывает накопленную статистику этапов."""
+    with _LOCK:
+        _STAGES.clear()
+
+
+def get_report():
+    """
+    Сводка по этапам.
+
+    Returns:
+        dict: Этап -> {'calls', 'wall', 'cpu', 'wait'} (время в секундах)
+    """
+    with _LOCK:
+        return {name: {**stats, 'wait': max(0.0, stats['wall'] - stats['cpu'])}
+                for name, stats in _STAGES.items()}
+
+
+def print_report(report=None):
+    """Выводит сводку по этапам, отсортированную по полному времени."""
+    report = report if report is not None else get_report()
+    if not report:
+        return
+
+    print("\n⏱️  ПРОФИЛЬ ЭТАПОВ (вложенные этапы входят во время внешних):")
+    print(f"   {'Этап':<28}{'вызовов':>8}{'всего, с':>11}{'CPU, с':>9}{'ожидание, с':>13}")
+    for name, stats in sorted(report.items(), key=lambda item: item[1]['wall'], reverse=True):
+        print(f"   {name:<28}{stats['calls']:>8}{stats['wall']:>11.3f}"
+              f"{stats['cpu']:>9.3f}{stats['wait']:>13.3f}")
+
+
+class SamplingProfiler:
+    """
+    Семплирующий профилировщик: периодически снимает стеки всех потоков
+    и считает одинаковые стеки для флейм-графа.
+    """
+
+    def __init__(self, interval=0.005):
+        """
+        Args:
+            interval: Интервал между семплами (сек.)
+        """
+        self.interval = interval
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        """Снимает стеки всех потоков, кроме собственного."""
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            key = ';'.join(reversed(stack))
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        """Запускает сбор семплов в фоновом потоке."""
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает сбор семплов."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def save_folded(self, path):
+        """
+        Сохраняет стеки в свернутом формате: "поток;файл:функция;... число".
+
+        Returns:
+            str: Путь к файлу
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+@contextmanager
+def profile_run(name="run", cprofile=None, sampling=None, output_dir=None):
+    """
+    Профилирует запуск целиком: этапы, cProfile и семплы стеков.
+
+    Args:
+        name: Имя запуска (используется в именах файлов)
+        cprofile: Снимать профиль cProfile (по умолчанию из конфига)
+        sampling: Снимать семплы стеков для флейм-графа (по умолчанию из конфига)
+        output_dir: Папка для файлов профиля (по умолчанию из конфига)
+    """
+    import config
+
+    params = config.PROFILING_PARAMS
+    cprofile = params['cprofile'] if cprofile is None else cprofile
+    sampling = params['sampling'] if sampling is None else sampling
+    if not (is_enabled() or cprofile or sampling):
+        yield
+        return
+
+    output_dir = output_dir or params['output_dir']
+    prefix = os.path.join(output_dir, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    reset_stages()
+
+    profiler = None
+    if cprofile:
+        import cProfile
+        # cProfile видит только поток, в котором запущен
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    sampler = None
+    if sampling:
+        sampler = SamplingProfiler(params['sampling_interval'])
+        sampler.start()
+
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        if sampler is not None:
+            sampler.stop()
+
+        print_report()
+
+        if profiler is not None or sampler is not None:
+            os.makedirs(output_dir, exist_ok=True)
+        if profiler is not None:
+            profiler.dump_stats(f"{prefix}.prof")
+            print(f"📄 Профиль cProfile: {prefix}.prof")
+        if sampler is not None:
+            sampler.save_folded(f"{prefix}.folded")
+            print(f"🔥 Стеки для флейм-графа: {prefix}.folded ({sum(sampler.samples.values())} семплов)")
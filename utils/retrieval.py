@@ -0,0 +1,342 @@
+"""
+Локальный поиск по учебным материалам (RAG) для обогащения промптов разделов.
+
+Материалы (txt/md/pdf) разбиваются на фрагменты и индексируются по BM25.
+Индекс хранится на диске в бинарных массивах и открывается через mmap,
+поэтому поиск не требует загрузки всех фрагментов в память и не зависит от GPU.
+"""
+
+import json
+import math
+import mmap
+import os
+import re
+import sys
+import heapq
+from array import array
+
+# Поддерживаемые форматы материалов
+TEXT_EXTENSIONS = ('.txt', '.md')
+PDF_EXTENSIONS = ('.pdf',)
+
+# Длина основы слова: простое усечение окончаний для русской морфологии
+STEM_LENGTH = 6
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """
+    Разбивает текст на нормализованные термы.
+
+    Args:
+        text: Исходный текст
+
+    Returns:
+        list: Термы (нижний регистр, усеченные до основы)
+    """
+    return [token[:STEM_LENGTH] for token in _TOKEN_RE.findall(text.lower()) if len(token) > 1]
+
+
+def _read_material(path):
+    """Читает текст материала или возвращает None, если формат не поддерживается."""
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in TEXT_EXTENSIONS:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+
+    if extension in PDF_EXTENSIONS:
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            print(f"⚠️  pypdf не установлен, пропускаем {os.path.basename(path)}")
+            return None
+        reader = PdfReader(path)
+        return '\n\n'.join(page.extract_text() or '' for page in reader.pages)
+
+    return None
+
+
+def chunk_text(text, chunk_words, overlap):
+    """
+    Разбивает текст на фрагменты примерно по chunk_words слов с перекрытием.
+
+    Returns:
+        list: Список фрагментов
+    """
+    words = text.split()
+    if not words:
+        return []
+
+    step = max(1, chunk_words - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(' '.join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+def _index_paths(index_dir):
+    """Пути к файлам индекса."""
+    return {
+        'meta': os.path.join(index_dir, 'meta.json'),
+        'vocab': os.path.join(index_dir, 'vocab.json'),
+        'sources': os.path.join(index_dir, 'sources.json'),
+        'postings': os.path.join(index_dir, 'postings.bin'),
+        'norms': os.path.join(index_dir, 'norms.bin'),
+        'chunks': os.path.join(index_dir, 'chunks.bin'),
+        'offsets': os.path.join(index_dir, 'offsets.bin'),
+        'chunk_sources': os.path.join(index_dir, 'chunk_sources.bin'),
+    }
+
+
+def build_index(materials_dir=None, index_dir=None):
+    """
+    Индексирует папку с учебными материалами.
+
+    Args:
+        materials_dir: Папка с материалами (по умолчанию из конфига)
+        index_dir: Папка индекса (по умолчанию из конфига)
+
+    Returns:
+        dict: Метаданные индекса (количество файлов, фрагментов, термов)
+    """
+    import config
+
+    params = config.RAG_PARAMS
+    materials_dir = materials_dir or params['materials_dir']
+    index_dir = index_dir or params['index_dir']
+    paths = _index_paths(index_dir)
+    os.makedirs(index_dir, exist_ok=True)
+
+    sources = []
+    postings = {}
+    doc_lengths = array('I')
+    offsets = array('Q', [0])
+    chunk_sources = array('I')
+
+    print(f"📚 Индексирование материалов из {materials_dir}")
+
+    with open(paths['chunks'], 'wb') as chunks_file:
+        for root, _, filenames in os.walk(materials_dir):
+            for filename in sorted(filenames):
+                path = os.path.join(root, filename)
+                text = _read_material(path)
+                if not text:
+                    continue
+
+                source_id = len(sources)
+                sources.append(os.path.relpath(path, materials_dir))
+
+                for chunk in chunk_text(text, params['chunk_words'], params['chunk_overlap']):
+                    doc_id = len(doc_lengths)
+                    tokens = tokenize(chunk)
+                    term_counts = {}
+                    for token in tokens:
+                        term_counts[token] = term_counts.get(token, 0) + 1
+                    for term, tf in term_counts.items():
+                        postings.setdefault(term, []).append((doc_id, tf))
+
+                    encoded = chunk.encode('utf-8')
+                    chunks_file.write(encoded)
+                    offsets.append(offsets[-1] + len(encoded))
+                    doc_lengths.append(len(tokens))
+                    chunk_sources.append(source_id)
+
+    n_chunks = len(doc_lengths)
+    avgdl = (sum(doc_lengths) / n_chunks) if n_chunks else 0.0
+    k1, b = params['bm25_k1'], params['bm25_b']
+
+    # Нормировочный множитель длины фрагмента для BM25 считается заранее
+    norms = array('f', (k1 * (1 - b + b * dl / avgdl) if avgdl else k1 for dl in doc_lengths))
+
+    # Списки вхождений: пары (doc_id, tf) подряд в одном массиве uint32
+    vocab = {}
+    flat = array('I')
+    for term, entries in postings.items():
+        vocab[term] = [len(flat), len(entries)]
+        for doc_id, tf in entries:
+            flat.append(doc_id)
+            flat.append(tf)
+
+    for key, data in (('postings', flat), ('norms', norms), ('offsets', offsets),
+                      ('chunk_sources', chunk_sources)):
+        with open(paths[key], 'wb') as f:
+            data.tofile(f)
+
+    meta = {"n_chunks": n_chunks, "avgdl": avgdl, "k1": k1, "b": b,
+            "n_terms": len(vocab), "n_sources": len(sources)}
+    for key, data in (('vocab', vocab), ('sources', sources), ('meta', meta)):
+        with open(paths[key], 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    print(f"✅ Индекс построен: файлов {len(sources)}, фрагментов {n_chunks}, термов {len(vocab)}")
+    return meta
+
+
+class LocalRetriever:
+    """
+    Поиск фрагментов материалов по BM25 в индексе, открытом через mmap.
+    """
+
+    def __init__(self, index_dir=None):
+        """
+        Открывает индекс.
+
+        Args:
+            index_dir: Папка индекса (по умолчанию из конфига)
+        """
+        import config
+
+        self.params = config.RAG_PARAMS
+        paths = _index_paths(index_dir or self.params['index_dir'])
+
+        with open(paths['meta'], 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        with open(paths['vocab'], 'r', encoding='utf-8') as f:
+            self.vocab = json.load(f)
+        with open(paths['sources'], 'r', encoding='utf-8') as f:
+            self.sources = json.load(f)
+
+        self._files = []
+        self._maps = []
+        self.postings = self._map(paths['postings'], 'I')
+        self.norms = self._map(paths['norms'], 'f')
+        self.offsets = self._map(paths['offsets'], 'Q')
+        self.chunk_sources = self._map(paths['chunk_sources'], 'I')
+        self.chunks = self._map(paths['chunks'], None)
+
+    def _map(self, path, typecode):
+        """Отображает файл в память и возвращает memoryview нужного типа."""
+        f = open(path, 'rb')
+        self._files.append(f)
+        if os.path.getsize(path) == 0:
+            return memoryview(b'').cast(typecode) if typecode else b''
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped).cast(typecode) if typecode else mapped
+
+    def close(self):
+        """Закрывает отображенные файлы."""
+        for view in (self.postings, self.norms, self.offsets, self.chunk_sources):
+            if isinstance(view, memoryview):
+                view.release()
+        for mapped in self._maps:
+            mapped.close()
+        for f in self._files:
+            f.close()
+        self._maps, self._files = [], []
+
+    def _chunk(self, doc_id):
+        """Текст фрагмента по номеру."""
+        start, end = self.offsets[doc_id], self.offsets[doc_id + 1]
+        return self.chunks[start:end].decode('utf-8')
+
+    def search(self, query, top_k=None):
+        """
+        Ищет наиболее релевантные фрагменты.
+
+        Args:
+            query: Текст запроса
+            top_k: Количество результатов (по умолчанию из конфига)
+
+        Returns:
+            list: Список (оценка, текст фрагмента, файл-источник)
+        """
+        top_k = top_k or self.params['top_k']
+        n_chunks = self.meta['n_chunks']
+        k1 = self.meta['k1']
+        max_df = self.params['max_df_ratio'] * n_chunks
+
+        entries = [entry for entry in map(self.vocab.get, set(tokenize(query))) if entry is not None]
+        # Слишком частые термы почти не влияют на ранжирование, но дороже всего в обходе:
+        # они пропускаются, только если в запросе есть более редкие термы
+        rare = [entry for entry in entries if entry[1] <= max_df]
+        scores = {}
+
+        for start, df in rare or entries:
+            idf = math.log(1 + (n_chunks - df + 0.5) / (df + 0.5))
+            postings = self.postings[start:start + 2 * df]
+            norms = self.norms
+            for i in range(0, 2 * df, 2):
+                doc_id, tf = postings[i], postings[i + 1]
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norms[doc_id])
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(score, self._chunk(doc_id), self.sources[self.chunk_sources[doc_id]])
+                for doc_id, score in best]
+
+    def get_context(self, query, top_k=None, token_budget=None):
+        """
+        Формирует блок справочных материалов для промпта в пределах бюджета токенов.
+
+        Args:
+            query: Текст запроса (обычно название раздела и тема)
+            top_k: Количество фрагментов
+            token_budget: Бюджет токенов на блок (по умолчанию из конфига)
+
+        Returns:
+            str: Текст блока или пустая строка, если ничего не найдено
+        """
+        token_budget = token_budget or self.params['token_budget']
+        char_budget = token_budget * self.params['chars_per_token']
+
+        parts = []
+        used = 0
+        for _, text, source in self.search(query, top_k):
+            passage = f"[{source}] {text}"
+            if used + len(passage) > char_budget:
+                remaining = char_budget - used
+                if remaining > 200:
+                    parts.append(passage[:remaining] + "...")
+                break
+            parts.append(passage)
+            used += len(passage)
+
+        return '\n\n'.join(parts)
+
+
+def open_default_retriever():
+    """
+    Открывает индекс из конфигурации, если поиск включен и индекс построен.
+
+    Returns:
+        LocalRetriever или None
+    """
+    import config
+
+    if not config.RAG_PARAMS['enabled']:
+        return None
+    if not os.path.exists(_index_paths(config.RAG_PARAMS['index_dir'])['meta']):
+        print("⚠️  Индекс материалов не найден. Постройте его: python -m utils.retrieval build <папка>")
+        return None
+    return LocalRetriever()
+
+
+def main():
+    """Построение индекса и поиск из командной строки."""
+    if len(sys.argv) < 2 or sys.argv[1] in ['-h', '--help']:
+        print("Использование:")
+        print("  python -m utils.retrieval build [папка_материалов]  Построить индекс")
+        print("  python -m utils.retrieval query <текст запроса>     Найти фрагменты")
+        return
+
+    if sys.argv[1] == 'build':
+        build_index(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif sys.argv[1] == 'query':
+        import time
+
+        retriever = LocalRetriever()
+        start_time = time.time()
+        results = retriever.search(' '.join(sys.argv[2:]))
+        print(f"🔎 Найдено за {(time.time() - start_time) * 1000:.1f} мс")
+        for score, text, source in results:
+            print(f"\n[{score:.2f}] {source}\n{text[:300]}")
+        retriever.close()
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
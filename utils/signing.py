@@ -0,0 +1,303 @@
+"""
+Авторская подпись занятий: водяной знак и криптографическая подпись ноутбуков.
+
+При сохранении ноутбука (build_and_save_notebook) в первую ячейку markdown
+встраивается невидимый водяной знак с автором (символы нулевой ширины не
+видны при отображении и переносятся вместе с текстом при копировании),
+а в метаданные ноутбука записывается подпись: HMAC-SHA256 по
+каноническому представлению ячеек (тип и текст) с секретным ключом
+AIMETODOLOG_SIGNING_KEY или SHA-256 без ключа. Подпись без ключа может
+пересчитать любой, поэтому она помечается как контроль целостности и
+авторство не подтверждает. Алгоритм проверки задается ключом проверяющего,
+а не метаданными ноутбука: при заданном ключе подпись без ключа
+отклоняется. Подпись считается по ячейкам за один проход, вместе
+с нанесением водяного знака, поэтому почти не замедляет сборку.
+
+Использование из командной строки:
+    python -m utils.signing verify output/          Проверка подписей (параллельно)
+    python -m utils.signing sign lesson.ipynb       Подписать готовые ноутбуки
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# Версия схемы подписи и ключ метаданных ноутбука
+SIGNATURE_VERSION = 1
+SIGNATURE_KEY = 'aimetodolog_signature'
+
+# Результаты проверки, которые не считаются ошибкой: подпись ключом
+# и (при проверке без ключа) совпавшая контрольная сумма
+ACCEPTED_STATUSES = ('valid', 'intact')
+
+# Водяной знак: биты автора символами нулевой ширины между маркерами
+_WATERMARK_MARK = '\u2060'
+_WATERMARK_BITS = ('\u200b', '\u200c')
+
+
+def encode_watermark(text):
+    """Кодирует строку невидимыми символами (маркер, биты UTF-8, маркер)."""
+    bits = ''.join(f"{byte:08b}" for byte in text.encode('utf-8'))
+    return _WATERMARK_MARK + ''.join(_WATERMARK_BITS[int(bit)] for bit in bits) + _WATERMARK_MARK
+
+
+def extract_watermark(text):
+    """
+    Находит водяной знак в тексте.
+
+    Returns:
+        str: Закодированная строка или None, если знака нет
+    """
+    start = text.find(_WATERMARK_MARK)
+    end = text.find(_WATERMARK_MARK, start + 1)
+    if start < 0 or end < 0:
+        return None
+    bits = ''.join(str(_WATERMARK_BITS.index(char)) for char in text[start + 1:end] if char in _WATERMARK_BITS)
+    try:
+        return bytes(int(bits[i:i + 8], 2) for i in range(0, len(bits) - 7, 8)).decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+
+def strip_watermark(text):
+    """Удаляет водяной знак из текста (перед повторной подписью)."""
+    return ''.join(char for char in text if char != _WATERMARK_MARK and char not in _WATERMARK_BITS)
+
+
+def _source_text(cell):
+    source = cell.get('source', '')
+    return source if isinstance(source, str) else ''.join(source)
+
+
+def _key_id(key):
+    """Идентификатор ключа подписи (не раскрывает ключ)."""
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:12] if key else None
+
+
+class NotebookSigner:
+    """
+    Инкрементальный подсчет подписи по ячейкам ноутбука.
+    """
+
+    def __init__(self, author, key=None):
+        """
+        Args:
+            author: Автор (входит в подпись)
+            key: Секретный ключ HMAC (None - SHA-256 без ключа)
+        """
+        self.author = author
+        self.key = key
+        self.cells = 0
+        self._digest = hmac.new(key.encode('utf-8'), digestmod=hashlib.sha256) if key else hashlib.sha256()
+        self._digest.update(json.dumps([SIGNATURE_VERSION, author], ensure_ascii=False).encode('utf-8'))
+
+    def update(self, cell):
+        """Добавляет ячейку: тип и текст (метаданные и выводы меняются при открытии в Jupyter)."""
+        self.cells += 1
+        canonical = json.dumps([cell.get('cell_type'), _source_text(cell)], ensure_ascii=False,
+                               separators=(',', ':'))
+        self._digest.update(canonical.encode('utf-8'))
+        self._digest.update(b'\n')
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def signature(self):
+        """Метаданные подписи для ноутбука (без ключа - с пометкой integrity_only)."""
+        return {
+            "version": SIGNATURE_VERSION,
+            "algorithm": "hmac-sha256" if self.key else "sha256",
+            "key_id": _key_id(self.key),
+            "integrity_only": not self.key,
+            "author": self.author,
+            "signed_at": datetime.now().isoformat(timespec='seconds'),
+            "cells": self.cells,
+            "digest": self.hexdigest(),
+        }
+
+
+def sign_notebook(notebook, author=None, key=None, watermark=None):
+    """
+    Наносит водяной знак и подписывает ноутбук (изменяет словарь ноутбука;
+    ячейки с водяным знаком заменяются копиями, исходные ячейки не меняются).
+    Без ключа подпись только контролирует целостность (integrity_only).
+
+    Args:
+        notebook: Ноутбук nbformat (словарь)
+        author: Автор (по умолчанию из конфига)
+        key: Ключ подписи (по умолчанию из конфига)
+        watermark: Наносить водяной знак (по умолчанию из конфига)
+
+    Returns:
+        dict: Метаданные подписи
+    """
+    import config
+
+    params = config.SIGNING_PARAMS
+    author = author or params['author']
+    key = key if key is not None else params['key']
+    watermark = params['watermark'] if watermark is None else watermark
+
+    signer = NotebookSigner(author, key)
+    mark = encode_watermark(author) if watermark else None
+    cells = notebook['cells']
+    for position, cell in enumerate(cells):
+        if mark and cell.get('cell_type') == 'markdown':
+            # Знак ставится в конец первой строки первой ячейки markdown
+            lines = strip_watermark(_source_text(cell)).splitlines(keepends=True) or ['']
+            ending = lines[0][len(lines[0].rstrip('\r\n')):]
+            lines[0] = lines[0].rstrip('\r\n') + mark + ending
+            cell = cells[position] = {**cell, 'source': lines}
+            mark = None
+        signer.update(cell)
+
+    signature = signer.signature()
+    notebook.setdefault('metadata', {})[SIGNATURE_KEY] = signature
+    return signature
+
+
+def verify_notebook(path, key=None):
+    """
+    Проверяет подпись ноутбука.
+
+    Args:
+        path: Путь к .ipynb
+        key: Ключ подписи (по умолчанию из конфига)
+
+    Алгоритм выбирается по ключу проверяющего: с ключом принимается только
+    подпись HMAC, подпись без ключа получает статус 'unkeyed' (ее может
+    подделать любой). Без ключа совпавшая контрольная сумма дает статус
+    'intact': ноутбук не изменен, но авторство не подтверждено.
+
+    Returns:
+        dict: path, status ('valid', 'intact', 'modified', 'unsigned', 'unkeyed',
+            'wrong_key', 'error'), author (из подписи, только для 'valid'),
+            claimed_author (автор, указанный в подписи), watermark (автор из водяного знака)
+    """
+    import config
+
+    key = key if key is not None else config.SIGNING_PARAMS['key']
+    result = {"path": path, "status": "error", "author": None, "claimed_author": None, "watermark": None}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            notebook = json.load(f)
+    except (OSError, ValueError) as e:
+        result["details"] = str(e)
+        return result
+
+    cells = notebook.get('cells', [])
+    for cell in cells:
+        if cell.get('cell_type') == 'markdown':
+            result["watermark"] = extract_watermark(_source_text(cell))
+            if result["watermark"]:
+                break
+
+    signature = notebook.get('metadata', {}).get(SIGNATURE_KEY)
+    if not signature:
+        result["status"] = "unsigned"
+        return result
+    result["claimed_author"] = signature.get('author')
+
+    # Алгоритм определяет ключ проверяющего, а не метаданные ноутбука
+    algorithm = signature.get('algorithm')
+    if key and algorithm != 'hmac-sha256':
+        result["status"] = "unkeyed"
+        return result
+    if not key and algorithm != 'sha256':
+        result["status"] = "wrong_key"
+        return result
+    if key and signature.get('key_id') != _key_id(key):
+        result["status"] = "wrong_key"
+        return result
+
+    signer = NotebookSigner(signature.get('author'), key or None)
+    for cell in cells:
+        signer.update(cell)
+    if not hmac.compare_digest(signer.hexdigest(), str(signature.get('digest', ''))):
+        result["status"] = "modified"
+    elif key:
+        result["status"] = "valid"
+        result["author"] = signature.get('author')
+    else:
+        result["status"] = "intact"
+    return result
+
+
+def _find_notebooks(paths):
+    """Пути к ноутбукам из файлов и папок (рекурсивно)."""
+    notebooks = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                notebooks.extend(os.path.join(root, name) for name in files if name.endswith('.ipynb'))
+        else:
+            notebooks.append(path)
+    return sorted(notebooks)
+
+
+def verify_catalog(paths, max_workers=None):
+    """
+    Проверяет подписи ноутбуков параллельно процессами.
+
+    Returns:
+        list: Результаты verify_notebook в порядке путей
+    """
+    import config
+
+    notebooks = _find_notebooks(paths)
+    workers = min(len(notebooks), max_workers or config.SIGNING_PARAMS['max_workers'] or os.cpu_count() or 1)
+    if workers <= 1:
+        return [verify_notebook(path) for path in notebooks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Пачки снижают накладные расходы на передачу задач процессам
+        return list(executor.map(verify_notebook, notebooks, chunksize=max(1, len(notebooks) // (workers * 8))))
+
+
+def main():
+    """Проверка и подпись ноутбуков из командной строки."""
+    import argparse
+    import time
+
+    import config
+
+    parser = argparse.ArgumentParser(description="Авторская подпись ноутбуков AIMetodolog")
+    parser.add_argument('command', choices=['verify', 'sign'], help="verify - проверить, sign - подписать")
+    parser.add_argument('paths', nargs='+', help="Ноутбуки .ipynb или папки с ними")
+    parser.add_argument('--workers', type=int, help="Число процессов проверки (по умолчанию по числу ядер)")
+    parser.add_argument('--verbose', action='store_true', help="Выводить результат по каждому ноутбуку")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if args.command == 'sign':
+        for path in _find_notebooks(args.paths):
+            with open(path, 'r', encoding='utf-8') as f:
+                notebook = json.load(f)
+            signature = sign_notebook(notebook)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(notebook, f, ensure_ascii=False, indent=2)
+            kind = "только целостность" if signature['integrity_only'] else f"автор {signature['author']}"
+            print(f"🔏 {path}: {signature['algorithm']}, {kind}")
+        if not config.SIGNING_PARAMS['key']:
+            print("⚠️ Ключ AIMETODOLOG_SIGNING_KEY не задан: подпись без ключа авторство не подтверждает")
+        return
+
+    results = verify_catalog(args.paths, args.workers)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+        if args.verbose or result['status'] not in ACCEPTED_STATUSES:
+            watermark = f", водяной знак: {result['watermark']}" if result['watermark'] else ""
+            print(f"   {result['status']:<9} {result['path']}{watermark}")
+    print(f"🔏 Проверено ноутбуков: {len(results)} за {time.time() - start_time:.2f} сек.: "
+          + ", ".join(f"{status} {count}" for status, count in sorted(counts.items())))
+    if any(result['status'] not in ACCEPTED_STATUSES for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
@@ -35,4 +35,28 @@ def parse_structure(lesson_structure, section='all'):
             "3.1. Домашнее задание"
         ]
     
-    return sections
\ No newline at end of file
+    return sections
+
+def parse_course_outline(course_outline):
+    """
+    Парсит текстовый план курса в список тем занятий.
+    
+    Args:
+        course_outline (str): План курса вида "1. Тема занятия" или "Занятие 1: Тема"
+    
+    Returns:
+        list: Список названий занятий (без нумерации)
+    """
+    lessons = []
+    
+    for line in course_outline.strip().split('\n'):
+        line = line.strip()
+        # Ищем строки вида "1. Тема", "1) Тема" или "Занятие 1: Тема"
+        match = re.match(r'^(?:Занятие\s+)?\d+[.):]\s*(.+)$', line, re.IGNORECASE)
+        # Подразделы вида "1.1." не являются занятиями
+        if match and not re.match(r'^\d+\.\d+', line):
+            title = match.group(1).strip().strip('*').strip()
+            if title:
+                lessons.append(title)
+    
+    return lessons
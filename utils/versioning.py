@@ -6,6 +6,8 @@
 import os
 import shutil
 import json
+import fnmatch
+import hashlib
 from datetime import datetime
 
 def is_colab():
@@ -34,6 +36,129 @@ def mount_google_drive():
         print(f"❌ Ошибка монтирования Google Drive: {e}")
         return None
 
+# Файлы, не попадающие в снимки
+IGNORE_PATTERNS = ('*.pyc', '__pycache__', '.ipynb_checkpoints')
+
+def _objects_dir(base_path):
+    """Хранилище объектов: содержимое файлов, адресуемое по SHA-256."""
+    return os.path.join(base_path, 'objects')
+
+def _manifests_dir(base_path):
+    """Директория манифестов версий."""
+    return os.path.join(base_path, 'manifests')
+
+def _object_path(base_path, digest):
+    """Путь к объекту по его хешу (с разбиением по первым двум символам)."""
+    return os.path.join(_objects_dir(base_path), digest[:2], digest)
+
+def _index_path(base_path):
+    """Путь к индексу версий."""
+    return os.path.join(base_path, 'versions.json')
+
+def _seed_index(base_path, prefix="aimetodolog_v"):
+    """
+    Индекс версий, сохраненных ранее полными копиями в папки <prefix>N.
+    
+    Returns:
+        list: Записи индекса в порядке номеров версий
+    """
+    index = []
+    for item in os.listdir(base_path):
+        path = os.path.join(base_path, item)
+        if not item.startswith(prefix) or not item[len(prefix):].isdigit() or not os.path.isdir(path):
+            continue
+        metadata = {}
+        try:
+            with open(os.path.join(path, 'version_metadata.json'), 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            pass
+        index.append({
+            "name": item,
+            "saved_at": metadata.get('saved_at'),
+            "files_count": metadata.get('files_count'),
+            "new_files": metadata.get('files_count'),
+            "legacy": True
+        })
+    index.sort(key=lambda entry: int(entry['name'][len(prefix):]))
+    return index
+
+def _load_index(base_path):
+    """
+    Загружает индекс версий (список словарей в порядке создания).
+    При первом обращении индекс создается по папкам версий-копий.
+    """
+    index_path = _index_path(base_path)
+    if not os.path.exists(index_path):
+        index = _seed_index(base_path) if os.path.isdir(base_path) else []
+        if index:
+            _write_json(index_path, index)
+        return index
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️  Ошибка чтения индекса версий: {e}")
+        return []
+
+def _write_json(path, data):
+    """Атомарно записывает JSON файл."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def _hash_file(path, chunk_size=1024 * 1024):
+    """Вычисляет SHA-256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _iter_project_files(project_path):
+    """
+    Обходит файлы проекта, пропуская IGNORE_PATTERNS.
+    
+    Yields:
+        tuple: (относительный путь, os.DirEntry)
+    """
+    stack = [project_path]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if any(fnmatch.fnmatch(entry.name, pattern) for pattern in IGNORE_PATTERNS):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    rel_path = os.path.relpath(entry.path, project_path).replace(os.sep, '/')
+                    yield rel_path, entry
+
+def load_manifest(base_path, version_name):
+    """
+    Загружает манифест версии.
+    
+    Returns:
+        dict: Манифест или None, если версии нет
+    """
+    manifest_path = os.path.join(_manifests_dir(base_path), f"{version_name}.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def list_versions(base_path):
+    """
+    Возвращает список сохраненных версий без обхода хранилища.
+    
+    Returns:
+        list: Записи индекса версий (name, saved_at, files_count, new_files)
+    """
+    return _load_index(base_path)
+
 def get_next_version(base_path, prefix="aimetodolog_v"):
     """
     Определяет следующий номер версии.
@@ -41,11 +166,11 @@ def get_next_version(base_path, prefix="aimetodolog_v"):
     os.makedirs(base_path, exist_ok=True)
     
     existing_versions = []
-    for item in os.listdir(base_path):
-        if item.startswith(prefix):
+    for entry in _load_index(base_path):
+        name = entry.get('name', '')
+        if name.startswith(prefix):
             try:
-                version_num = int(item[len(prefix):])
-                existing_versions.append(version_num)
+                existing_versions.append(int(name[len(prefix):]))
             except ValueError:
                 continue
     
@@ -61,13 +186,19 @@ def save_version_to_drive(project_path, drive_base_path, version=None):
     Сохраняет текущую версию проекта в Google Drive (только в Colab).
     В локальном режиме сохраняет в локальную директорию drive_backup.
     
+    Снимок дедуплицируется: содержимое файлов хранится один раз в objects/
+    по SHA-256, а версия описывается манифестом manifests/<версия>.json.
+    Копируются только файлы, которых еще нет в хранилище; для неизменившихся
+    файлов (тот же размер и mtime, что в предыдущей версии) хеш не пересчитывается.
+    
     Args:
         project_path: Путь к исходному проекту
         drive_base_path: Базовая директория в Drive (для Colab) или локальный путь
         version: Номер версии (None для автоопределения)
     
     Returns:
-        str: Путь к сохраненной версии или None при ошибке
+        str: Путь к манифесту сохраненной версии (manifests/<версия>.json;
+            папки версии в этом формате нет) или None при ошибке
     """
     if not is_colab():
         # В локальном режиме используем локальную директорию для бекапа
@@ -80,48 +211,144 @@ def save_version_to_drive(project_path, drive_base_path, version=None):
     # Создаем базовую директорию
     os.makedirs(drive_base_path, exist_ok=True)
     
-    # Определяем путь для сохранения
+    # Определяем имя версии
     if version is None:
-        target_path = get_next_version(drive_base_path)
+        version_name = os.path.basename(get_next_version(drive_base_path))
     else:
-        target_path = os.path.join(drive_base_path, f"aimetodolog_v{version}")
+        version_name = f"aimetodolog_v{version}"
     
-    print(f"   Целевой путь: {target_path}")
+    print(f"   Версия: {version_name}")
     
     try:
-        # Копируем проект
-        if os.path.exists(target_path):
-            print(f"   Версия уже существует, перезаписываем...")
-            shutil.rmtree(target_path)
+        index = _load_index(drive_base_path)
         
-        # Копируем с сохранением метаданных
-        shutil.copytree(
-            project_path, 
-            target_path,
-            ignore=shutil.ignore_patterns('*.pyc', '__pycache__', '.ipynb_checkpoints'),
-            dirs_exist_ok=True
-        )
+        # Метаданные файлов предыдущей версии позволяют не перечитывать неизменные файлы
+        previous_files = {}
+        if index:
+            previous = load_manifest(drive_base_path, index[-1]['name'])
+            if previous:
+                previous_files = previous.get('files', {})
         
-        # Создаем файл метаданных версии
+        files = {}
+        new_files = 0
+        new_bytes = 0
+        
+        for rel_path, entry in _iter_project_files(project_path):
+            stat = entry.stat(follow_symlinks=False)
+            known = previous_files.get(rel_path)
+            
+            if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+                digest = known['sha256']
+            else:
+                digest = _hash_file(entry.path)
+            
+            object_path = _object_path(drive_base_path, digest)
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                tmp_path = f"{object_path}.tmp"
+                shutil.copyfile(entry.path, tmp_path)
+                os.replace(tmp_path, object_path)
+                new_files += 1
+                new_bytes += stat.st_size
+            
+            files[rel_path] = {
+                "sha256": digest,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "mode": stat.st_mode & 0o777
+            }
+        
+        # Создаем манифест версии
         metadata = {
             "project_name": "aimetodolog",
-            "version": os.path.basename(target_path),
+            "version": version_name,
             "saved_at": datetime.now().isoformat(),
             "source_path": project_path,
-            "files_count": sum([len(files) for r, d, files in os.walk(target_path)]),
-            "environment": "Colab" if is_colab() else "Local"
+            "files_count": len(files),
+            "environment": "Colab" if is_colab() else "Local",
+            "files": files
         }
         
-        metadata_file = os.path.join(target_path, "version_metadata.json")
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        manifest_path = os.path.join(_manifests_dir(drive_base_path), f"{version_name}.json")
+        if os.path.exists(manifest_path):
+            print(f"   Версия уже существует, перезаписываем манифест...")
+        _write_json(manifest_path, metadata)
         
-        print(f"✅ Проект сохранен в: {target_path}")
-        print(f"   Файлов: {metadata['files_count']}")
+        # Обновляем индекс версий
+        index = [entry for entry in index if entry.get('name') != version_name]
+        index.append({
+            "name": version_name,
+            "saved_at": metadata['saved_at'],
+            "files_count": len(files),
+            "new_files": new_files
+        })
+        _write_json(_index_path(drive_base_path), index)
+        
+        print(f"✅ Проект сохранен: {manifest_path}")
+        print(f"   Файлов: {metadata['files_count']} (новых объектов: {new_files}, {new_bytes / 1024:.1f} KB)")
         print(f"   Среда: {metadata['environment']}")
         
-        return target_path
+        return manifest_path
         
     except Exception as e:
         print(f"❌ Ошибка сохранения версии: {e}")
         return None
+
+def restore_version(drive_base_path, version_name, target_path, link=False):
+    """
+    Восстанавливает версию проекта из хранилища объектов.
+    
+    Args:
+        drive_base_path: Базовая директория хранилища версий
+        version_name: Имя версии (например, aimetodolog_v3)
+        target_path: Куда восстановить файлы
+        link: Создавать жесткие ссылки на объекты вместо копий (быстро и без
+              лишнего места). Ссылка делит данные с объектом хранилища, общим для
+              всех версий, поэтому такие файлы только для чтения; по умолчанию
+              файлы копируются
+    
+    Returns:
+        str: Путь к восстановленной версии или None при ошибке
+    """
+    manifest = load_manifest(drive_base_path, version_name)
+    if manifest is None:
+        # Версия, сохраненная полной копией папки
+        legacy_path = os.path.join(drive_base_path, version_name)
+        if os.path.isdir(legacy_path):
+            print(f"♻️  Восстановление {version_name} (копия папки) в {target_path}")
+            shutil.copytree(legacy_path, target_path, dirs_exist_ok=True,
+                            ignore=shutil.ignore_patterns('version_metadata.json'))
+            return target_path
+        print(f"❌ Версия не найдена: {version_name}")
+        return None
+    
+    print(f"♻️  Восстановление {version_name} в {target_path}")
+    
+    try:
+        for rel_path, info in manifest['files'].items():
+            object_path = _object_path(drive_base_path, info['sha256'])
+            destination = os.path.join(target_path, *rel_path.split('/'))
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            
+            if os.path.exists(destination):
+                os.remove(destination)
+            
+            if link:
+                try:
+                    os.link(object_path, destination)
+                    # Правка файла на месте изменила бы объект во всех версиях
+                    os.chmod(destination, info.get('mode', 0o644) & ~0o222)
+                    continue
+                except OSError:
+                    # Разные файловые системы или нет поддержки ссылок - копируем
+                    pass
+            
+            shutil.copyfile(object_path, destination)
+            os.chmod(destination, info.get('mode', 0o644))
+        
+        print(f"✅ Восстановлено файлов: {len(manifest['files'])}")
+        return target_path
+        
+    except Exception as e:
+        print(f"❌ Ошибка восстановления версии: {e}")
+        return None